@@ -1,6 +1,14 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, ExerciseList
+from .models import User, ExerciseList, CustomExercise, Template, Job, WorkoutArchive, WorkoutSession, SessionSet
+
+class CustomExerciseInline(admin.TabularInline):
+    model = CustomExercise
+    extra = 0
+
+class TemplateInline(admin.StackedInline):
+    model = Template
+    extra = 0
 
 class CustomUserAdmin(UserAdmin):
     list_display = ('email', 'username', 'created_at', 'is_staff')
@@ -9,12 +17,14 @@ class CustomUserAdmin(UserAdmin):
     
     # Add custom fields to fieldsets
     fieldsets = UserAdmin.fieldsets + (
-        ('Custom Fields', {'fields': ('custom_exercises', 'workouts', 'templates', 'created_at')}),
+        ('Custom Fields', {'fields': ('workouts', 'created_at', 'coaches')}),
     )
+    filter_horizontal = UserAdmin.filter_horizontal + ('coaches',)
+    inlines = [CustomExerciseInline, TemplateInline]
     
     # Add custom fields to add form
     add_fieldsets = UserAdmin.add_fieldsets + (
-        ('Custom Fields', {'fields': ('email', 'custom_exercises', 'workouts', 'templates')}),
+        ('Custom Fields', {'fields': ('email', 'workouts')}),
     )
 
 admin.site.register(User, CustomUserAdmin)
@@ -24,3 +34,27 @@ class ExerciseListAdmin(admin.ModelAdmin):
     list_display = ('name', 'primary_muscle', 'secondary_muscle', 'tertiary_muscle')
     search_fields = ('name', 'primary_muscle')
     list_filter = ('primary_muscle', 'secondary_muscle', 'tertiary_muscle')
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'queue', 'status', 'attempts', 'run_after', 'created_at')
+    list_filter = ('status', 'queue', 'name')
+
+
+@admin.register(WorkoutArchive)
+class WorkoutArchiveAdmin(admin.ModelAdmin):
+    list_display = ('user', 'month', 'workout_count', 'updated_at')
+    search_fields = ('user__email',)
+
+
+class SessionSetInline(admin.TabularInline):
+    model = SessionSet
+    extra = 0
+
+
+@admin.register(WorkoutSession)
+class WorkoutSessionAdmin(admin.ModelAdmin):
+    list_display = ('name', 'user', 'set_count', 'started_at', 'updated_at')
+    search_fields = ('user__email', 'name')
+    inlines = [SessionSetInline]
@@ -0,0 +1,201 @@
+"""
+Per-day rollups of a user's training.
+
+``apply_workout_change`` is called wherever a workout is written
+(api/workouts.py) with the old and the new version of the workout. A new
+workout is added to its day's row without reading the history. An edit or a
+delete recomputes the rows of the days involved from the workouts completed
+on them. The calendar endpoint then reads at most one row per day of the
+year, the muscle dashboard at most two weeks.
+
+Each row also holds the day's weighted sets per muscle as a float32 vector
+over the MUSCLE_CHOICES axis: a set counts 1.0 for the exercise's primary,
+0.5 for its secondary and 0.25 for its tertiary muscle. Muscles are taken
+from the exercises when the row is written, so a day is never left with
+sets of muscles an exercise no longer has, or of a deleted custom exercise,
+once one of its workouts changes.
+"""
+from datetime import datetime, time, timedelta
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_duration
+
+from .models import DailyTrainingAggregate
+from .similarity import EXERCISE_FIELDS, MUSCLE_AXIS, muscle_weights, similarity_index
+from .stats import set_exercise_key, workout_timestamp
+
+# Days after training a muscle before it counts as recovered
+RECOVERY_DAYS = 2
+
+
+def workout_day(workout):
+    """Day a workout was completed on, in the server time zone"""
+    return datetime.fromtimestamp(workout_timestamp(workout), tz=timezone.get_current_timezone()).date()
+
+
+def workout_duration_minutes(workout):
+    """The workout's recorded duration, or the time of its timed sets"""
+    duration = parse_duration(workout.get('workout_duration') or '')
+    if duration is not None:
+        return duration.total_seconds() / 60
+    return sum(set_data.get('duration_minutes') or 0 for set_data in workout.get('exercises', []))
+
+
+def workout_totals(workout):
+    sets = workout.get('exercises', [])
+    return {
+        'sessions': 1,
+        'sets': len(sets),
+        'volume': sum(set_data.get('volume') or 0 for set_data in sets),
+        'duration_minutes': workout_duration_minutes(workout),
+    }
+
+
+def encode_muscle_sets(vector):
+    return vector.astype(np.float32).tobytes()
+
+
+def decode_muscle_sets(data):
+    """Vector over the muscle axis; rows written before a muscle was added are shorter"""
+    vector = np.zeros(len(MUSCLE_AXIS), dtype=np.float32)
+    stored = np.frombuffer(bytes(data or b''), dtype=np.float32)
+    vector[:len(stored)] = stored[:len(vector)]
+    return vector
+
+
+def exercise_muscle_weights(user, workouts):
+    """Muscle weight vector of every exercise in ``workouts``, keyed like personal records"""
+    keys = {
+        set_exercise_key(set_data)
+        for workout in workouts
+        for set_data in workout.get('exercises', [])
+    }
+    index = similarity_index.get()
+    exercises = {}
+    for key in keys:
+        if not key.startswith('custom_'):
+            position = index.positions.get(int(key))
+            if position is not None:
+                exercises[key] = index.entries[position]
+    custom_ids = [int(key[len('custom_'):]) for key in keys if key.startswith('custom_')]
+    if custom_ids:
+        for exercise in user.custom_exercises.filter(pk__in=custom_ids).values(*EXERCISE_FIELDS):
+            exercises[f"custom_{exercise['id']}"] = exercise
+    return dict(zip(exercises, muscle_weights(list(exercises.values()))))
+
+
+def workout_muscle_sets(workout, weights):
+    """Weighted sets per muscle of one workout"""
+    vector = np.zeros(len(MUSCLE_AXIS), dtype=np.float32)
+    for set_data in workout.get('exercises', []):
+        weight = weights.get(set_exercise_key(set_data))
+        if weight is not None:
+            vector += weight
+    return vector
+
+
+def day_workouts(user, day, days=1):
+    """The user's workouts completed in the ``days`` days from ``day``, in the server time zone"""
+    start = timezone.make_aware(datetime.combine(day, time()))
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=days), time()))
+    return user.workout_history(start, end)
+
+
+def rebuild_day(user, day):
+    """Recompute the row of ``day`` from the workouts completed on it"""
+    workouts = day_workouts(user, day)
+    if not workouts:
+        DailyTrainingAggregate.objects.filter(user_id=user.pk, day=day).delete()
+        return
+
+    weights = exercise_muscle_weights(user, workouts)
+    totals = dict.fromkeys(('sessions', 'sets', 'volume', 'duration_minutes'), 0)
+    muscle_sets = np.zeros(len(MUSCLE_AXIS), dtype=np.float32)
+    for workout in workouts:
+        for field, value in workout_totals(workout).items():
+            totals[field] += value
+        muscle_sets += workout_muscle_sets(workout, weights)
+    DailyTrainingAggregate.objects.update_or_create(
+        user_id=user.pk, day=day, defaults={**totals, 'muscle_sets': encode_muscle_sets(muscle_sets)}
+    )
+
+
+def apply_workout_change(user, old=None, new=None):
+    """
+    Bring the daily totals in line after ``old`` was replaced by ``new``
+    (either may be None). The user's history must already hold the change.
+    """
+    with transaction.atomic():
+        if old is not None:
+            for day in sorted({workout_day(workout) for workout in (old, new) if workout is not None}):
+                rebuild_day(user, day)
+            return
+        if new is None:
+            return
+
+        day = workout_day(new)
+        DailyTrainingAggregate.objects.get_or_create(user_id=user.pk, day=day)
+        aggregate = DailyTrainingAggregate.objects.select_for_update().get(user_id=user.pk, day=day)
+        for field, value in workout_totals(new).items():
+            setattr(aggregate, field, getattr(aggregate, field) + value)
+        aggregate.muscle_sets = encode_muscle_sets(
+            decode_muscle_sets(aggregate.muscle_sets)
+            + workout_muscle_sets(new, exercise_muscle_weights(user, [new]))
+        )
+        aggregate.save()
+
+
+def calendar(user, year):
+    """Training totals per day of ``year``, only days with a workout"""
+    return [
+        {
+            'date': aggregate.day.isoformat(),
+            'sessions': aggregate.sessions,
+            'sets': aggregate.sets,
+            'volume': aggregate.volume,
+            'duration_minutes': aggregate.duration_minutes,
+        }
+        for aggregate in user.daily_aggregates.filter(day__year=year).order_by('day').defer('muscle_sets')
+    ]
+
+
+def muscle_dashboard(user, today):
+    """
+    Weighted sets per muscle in the week (Monday to Sunday) of ``today``, and
+    when each muscle was last trained in the seven days up to ``today``
+    """
+    week_start = today - timedelta(days=today.weekday())
+    week_end = week_start + timedelta(days=6)
+    # The week started at most six days ago
+    first_day = today - timedelta(days=6)
+    rows = list(
+        user.daily_aggregates.filter(day__range=(first_day, week_end)).values_list('day', 'muscle_sets')
+    )
+
+    days = np.array([(day - first_day).days for day, _ in rows], dtype=np.int16)
+    matrix = np.zeros(((week_end - first_day).days + 1, len(MUSCLE_AXIS)), dtype=np.float32)
+    if rows:
+        matrix[days] = np.stack([decode_muscle_sets(muscle_sets) for _, muscle_sets in rows])
+
+    week_sets = matrix[(week_start - first_day).days:].sum(axis=0)
+    # Most recent day up to today with sets, per muscle
+    recent = matrix[:(today - first_day).days + 1][::-1] > 0.001
+    days_since = np.where(recent.any(axis=0), recent.argmax(axis=0), -1)
+
+    muscles = []
+    for muscle, column in MUSCLE_AXIS.items():
+        last = int(days_since[column])
+        muscles.append({
+            'muscle': muscle,
+            'sets': round(float(week_sets[column]), 2),
+            'last_trained': (today - timedelta(days=last)).isoformat() if last >= 0 else None,
+            'days_since': last if last >= 0 else None,
+            'recovering': 0 <= last < RECOVERY_DAYS,
+        })
+    return {
+        'week_start': week_start.isoformat(),
+        'week_end': week_end.isoformat(),
+        'muscles': muscles,
+    }
@@ -0,0 +1,94 @@
+"""
+Cold storage for old workout history.
+
+Workouts completed before a cutoff are moved from ``User.workouts`` into one
+WorkoutArchive row per user and month, keeping the user row (read
+on most requests) small. Personal records stay on the user and
+``User.workout_history()`` / ``workouts_in_range`` read through to the
+archive, so stats and date-range queries still see every workout.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import User, WorkoutArchive, month_start
+from .stats import completed_between, workout_timestamp
+
+
+def archive_cutoff(days=None):
+    if days is None:
+        days = settings.WORKOUT_ARCHIVE['AFTER_DAYS']
+    return timezone.now() - timedelta(days=days)
+
+
+def workout_month(workout):
+    return month_start(datetime.fromtimestamp(workout_timestamp(workout), tz=dt_timezone.utc))
+
+
+def archive_user_workouts(user_id, cutoff):
+    """
+    Move a user's workouts completed before ``cutoff`` to the archive.
+    The newest workout always stays so workout ids keep counting up.
+    Returns the number of workouts moved.
+    """
+    with transaction.atomic():
+        user = User.objects.select_for_update().filter(pk=user_id).only('id', 'workouts').first()
+        workouts = (user.workouts or []) if user else []
+        if not workouts:
+            return 0
+        newest_id = max(workout['id'] for workout in workouts)
+        old = [
+            workout for workout in workouts
+            if workout['id'] != newest_id and workout_timestamp(workout) < cutoff.timestamp()
+        ]
+        if not old:
+            return 0
+
+        by_month = defaultdict(list)
+        for workout in old:
+            by_month[workout_month(workout)].append(workout)
+        for month, moved in by_month.items():
+            archive, _ = WorkoutArchive.objects.get_or_create(user_id=user_id, month=month)
+            # Replace copies of the same workouts from an earlier run
+            merged = {workout['id']: workout for workout in archive.workouts}
+            merged.update((workout['id'], workout) for workout in moved)
+            archive.workouts = sorted(merged.values(), key=lambda workout: workout['id'])
+            archive.workout_count = len(archive.workouts)
+            archive.save()
+
+        moved_ids = {workout['id'] for workout in old}
+        user.workouts = [workout for workout in workouts if workout['id'] not in moved_ids]
+        user.save(update_fields=['workouts'])
+    return len(old)
+
+
+def archive_old_workouts(cutoff, batch_size=None):
+    """
+    Archive old workouts of every user, one transaction per user, paging
+    through users ``batch_size`` ids at a time. Yields (user_id, moved).
+    """
+    if batch_size is None:
+        batch_size = settings.WORKOUT_ARCHIVE['BATCH_SIZE']
+    last_id = 0
+    while True:
+        user_ids = list(
+            User.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not user_ids:
+            return
+        for user_id in user_ids:
+            yield user_id, archive_user_workouts(user_id, cutoff)
+        last_id = user_ids[-1]
+
+
+def archived_workouts_in_range(user, start=None, end=None):
+    """Archived workouts completed in [start, end), reading only the months involved"""
+    return [
+        workout
+        for workouts in user.workout_archives.overlapping(start, end).values_list('workouts', flat=True)
+        for workout in workouts
+        if completed_between(workout, start, end)
+    ]
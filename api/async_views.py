@@ -0,0 +1,122 @@
+"""
+Async variants of the read-heavy endpoints, for ASGI deployments.
+
+Enabled with ASYNC_VIEWS=True (see api/urls.py). Each view subclasses its
+synchronous counterpart so behaviour and responses are identical; only GET is
+async. Authentication, permission and throttle checks and all ORM access run
+in worker threads (sync_to_async or the async ORM API), so the event loop
+keeps serving other connections while a request waits on the database, and a
+slow client never holds a thread while it reads the response.
+
+Only endpoints whose responses are small get an async variant: serializing a
+large body (a workout history, the profile) on the event loop would stall
+every other connection, so those stay synchronous and run in a thread anyway.
+
+EventStreamView has no synchronous counterpart and is always routed.
+"""
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .events import event_stream
+from .models import ExerciseList
+from .views import ExerciseListView, PersonalRecordsView
+
+
+class AsyncAPIView:
+    """
+    Mixin for APIView subclasses that dispatches asynchronously. Async
+    handlers are awaited; the synchronous ones (writes) run in a thread.
+    """
+    view_is_async = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            if iscoroutinefunction(handler):
+                response = await handler(request, *args, **kwargs)
+            else:
+                response = await sync_to_async(handler)(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+class AsyncExerciseListView(AsyncAPIView, ExerciseListView):
+    async def get(self, request, *args, **kwargs):
+        # Validating filters may build the muscle index from the database
+        queryset = await sync_to_async(self.get_queryset)()
+        exercises = [exercise async for exercise in queryset]
+        response = Response(self.get_serializer(exercises, many=True).data)
+        response['ETag'] = await sync_to_async(self.catalog_etag)()
+        return response
+
+
+class AsyncPersonalRecordsView(AsyncAPIView, PersonalRecordsView):
+    async def get(self, request):
+        exercise_key = request.query_params.get('exercise')
+        if exercise_key is not None and not self.EXERCISE_KEY_PATTERN.match(exercise_key):
+            return Response({"error": "Invalid exercise key"}, status=status.HTTP_400_BAD_REQUEST)
+        personal_records = await sync_to_async(self.load_personal_records)(request.user, exercise_key)
+
+        exercises = [
+            exercise async for exercise in
+            ExerciseList.objects.filter(id__in=self.catalog_ids(personal_records))
+        ]
+        custom_exercises = [
+            exercise async for exercise in
+            request.user.custom_exercises.filter(id__in=self.custom_ids(personal_records))
+        ]
+        return Response(self.build_records(personal_records, exercises, custom_exercises))
+
+
+class EventStreamView(AsyncAPIView, APIView):
+    """
+    Server-sent events of the user's own training, or with ?athlete=<id> /
+    ?athlete=all of the athletes they coach. Needs an ASGI server: each open
+    stream only holds a coroutine, not a thread.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def perform_content_negotiation(self, request, force=False):
+        # EventSource accepts only text/event-stream; errors are still sent as JSON
+        return super().perform_content_negotiation(request, force=True)
+
+    async def get(self, request):
+        if not isinstance(request._request, ASGIRequest):
+            return Response(
+                {"error": "Event streams are only served by the ASGI application"},
+                status=status.HTTP_501_NOT_IMPLEMENTED
+            )
+
+        athlete = request.query_params.get('athlete')
+        if athlete is None:
+            user_ids = [request.user.pk]
+        elif athlete == 'all':
+            user_ids = [pk async for pk in request.user.athletes.values_list('pk', flat=True)]
+        elif athlete.isdigit() and await request.user.athletes.filter(pk=athlete).aexists():
+            user_ids = [int(athlete)]
+        else:
+            return Response({"error": "Athlete not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        response = StreamingHttpResponse(event_stream(user_ids), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Don't let nginx buffer the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
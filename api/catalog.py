@@ -0,0 +1,91 @@
+"""
+Exercise catalog versioning.
+
+Derived in-memory structures (search index, muscle index, similarity matrix)
+are rebuilt lazily whenever the catalog version changes. The version lives in
+the shared cache and is bumped by the ExerciseList signals in api/signals.py,
+or explicitly after bulk operations that bypass signals.
+"""
+import threading
+import time
+
+from django.core.cache import cache
+
+from .models import ExerciseList
+
+CATALOG_VERSION_KEY = 'exercise-catalog-version'
+CUSTOM_EXERCISES_VERSION_KEY = 'custom-exercises-version:{user_id}'
+
+
+def _new_version():
+    return time.time_ns()
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, _new_version(), None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    cache.set(CATALOG_VERSION_KEY, _new_version(), None)
+
+
+def get_custom_exercises_version(user_id):
+    key = CUSTOM_EXERCISES_VERSION_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_custom_exercises_version(user_id):
+    cache.set(CUSTOM_EXERCISES_VERSION_KEY.format(user_id=user_id), _new_version(), None)
+
+
+class VersionedCache:
+    """
+    Process-local memo of a structure derived from the catalog, rebuilt by
+    ``build()`` the first time it is requested after the version changes
+    """
+
+    def __init__(self, build):
+        self.build = build
+        self.version = None
+        self.value = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        version = get_catalog_version()
+        if self.version != version:
+            with self.lock:
+                if self.version != version:
+                    self.value = self.build()
+                    self.version = version
+        return self.value
+
+
+MUSCLE_SLOTS = ('primary_muscle', 'secondary_muscle', 'tertiary_muscle')
+
+
+def build_muscle_index():
+    """
+    Inverted index from muscle to the ids of catalog exercises working it,
+    in catalog (name) order, for every slot and for any slot
+    """
+    index = {slot: {} for slot in MUSCLE_SLOTS + ('any',)}
+    for row in ExerciseList.objects.values('id', *MUSCLE_SLOTS):
+        for slot in MUSCLE_SLOTS:
+            muscle = row[slot]
+            if muscle:
+                index[slot].setdefault(muscle, []).append(row['id'])
+                any_slot = index['any'].setdefault(muscle, [])
+                if not any_slot or any_slot[-1] != row['id']:
+                    any_slot.append(row['id'])
+    return index
+
+
+muscle_index = VersionedCache(build_muscle_index)
@@ -0,0 +1,116 @@
+"""
+Response body compression codecs and Accept-Encoding negotiation, used by
+CompressionMiddleware (api/middleware.py).
+
+gzip is always available; brotli ("br") and zstd are offered when the
+brotli / zstandard packages are installed. Each codec compresses whole
+bodies in one call, or streams with a flush after every chunk so streamed
+events reach the client without waiting for the next one.
+"""
+import gzip
+import zlib
+
+from django.conf import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_LEVELS = {'zstd': 3, 'br': 4, 'gzip': 6}
+
+
+def level(encoding):
+    return settings.COMPRESSION.get('LEVELS', {}).get(encoding, DEFAULT_LEVELS[encoding])
+
+
+class GzipStream:
+    def __init__(self):
+        self.compressor = zlib.compressobj(level('gzip'), zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, chunk):
+        return self.compressor.compress(chunk) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+class BrotliStream:
+    def __init__(self):
+        self.compressor = brotli.Compressor(quality=level('br'))
+
+    def compress(self, chunk):
+        return self.compressor.process(chunk) + self.compressor.flush()
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+class ZstdStream:
+    def __init__(self):
+        self.compressor = zstandard.ZstdCompressor(level=level('zstd')).compressobj()
+
+    def compress(self, chunk):
+        return self.compressor.compress(chunk) + self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+def compress_gzip(data):
+    return gzip.compress(data, compresslevel=level('gzip'), mtime=0)
+
+
+def compress_brotli(data):
+    return brotli.compress(data, quality=level('br'))
+
+
+def compress_zstd(data):
+    return zstandard.ZstdCompressor(level=level('zstd')).compress(data)
+
+
+# Available codecs as encoding: (compress whole body, streaming compressor),
+# in the order preferred when a client accepts several equally
+CODECS = {}
+if zstandard is not None:
+    CODECS['zstd'] = (compress_zstd, ZstdStream)
+if brotli is not None:
+    CODECS['br'] = (compress_brotli, BrotliStream)
+CODECS['gzip'] = (compress_gzip, GzipStream)
+
+
+def parse_accept_encoding(header):
+    """{encoding: q} from an Accept-Encoding header"""
+    accepted = {}
+    for item in header.split(','):
+        encoding, _, params = item.strip().partition(';')
+        encoding = encoding.strip().lower()
+        if not encoding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[encoding] = quality
+    return accepted
+
+
+def negotiate_encoding(header):
+    """The best available encoding the client accepts, or None for identity"""
+    accepted = parse_accept_encoding(header or '')
+    wildcard = accepted.get('*', 0.0)
+    best, best_quality = None, 0.0
+    for encoding in CODECS:
+        quality = accepted.get(encoding, wildcard)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
@@ -0,0 +1,130 @@
+"""
+Live notifications as server-sent events.
+
+Code that changes a user's training data calls ``publish`` (set logged,
+workout finished, personal record broken). Events are sent once the
+surrounding transaction has committed, to every open stream of that user and
+of their coaches (see EventStreamView in api/async_views.py).
+
+The fanout is in process: a stream receives events published by the process
+serving it, so deployments serving streams run a single ASGI worker process
+(see EVENT_STREAM in settings.py). Each stream has a bounded queue and publishing never waits on a
+client. A client that falls QUEUE_SIZE events behind gets an ``overflow``
+event and its stream is closed, so it reconnects and reloads its state
+instead of holding memory for events it cannot keep up with.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from functools import partial
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+DEFAULTS = {
+    # Events a stream may fall behind before it is closed
+    'QUEUE_SIZE': 100,
+    # Seconds between comments sent on an idle stream, so proxies keep it open
+    'KEEPALIVE_SECONDS': 15,
+}
+
+OVERFLOW = b'event: overflow\ndata: {}\n\n'
+
+
+def stream_setting(name):
+    return getattr(settings, 'EVENT_STREAM', {}).get(name, DEFAULTS[name])
+
+
+def format_event(event, data):
+    payload = json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return f'event: {event}\ndata: {payload}\n\n'.encode()
+
+
+class Subscription:
+    """One open stream: the users it follows and its queue of encoded events"""
+
+    def __init__(self, user_ids, loop, queue_size):
+        self.user_ids = frozenset(user_ids)
+        self.loop = loop
+        self.queue = asyncio.Queue(queue_size)
+        self.overflowed = False
+
+    def deliver(self, message):
+        # Runs on the stream's event loop
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(OVERFLOW)
+
+
+class Broker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.channels = defaultdict(set)
+
+    def subscribe(self, user_ids):
+        """Subscribe the running event loop to the events of ``user_ids``"""
+        subscription = Subscription(user_ids, asyncio.get_running_loop(), stream_setting('QUEUE_SIZE'))
+        with self.lock:
+            for user_id in subscription.user_ids:
+                self.channels[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            for user_id in subscription.user_ids:
+                subscribers = self.channels.get(user_id)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self.channels[user_id]
+
+    def publish(self, user_id, event, data):
+        """Queue an event on every stream following ``user_id``. Safe from any thread."""
+        with self.lock:
+            subscribers = list(self.channels.get(user_id, ()))
+        if not subscribers:
+            return
+        # Encoded once for all streams
+        message = format_event(event, {'user_id': user_id, **data})
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, message)
+            except RuntimeError:
+                # The stream's event loop is gone
+                self.unsubscribe(subscription)
+
+
+broker = Broker()
+
+
+def publish(user_id, event, data):
+    """Send an event to the user's streams once the current transaction commits"""
+    transaction.on_commit(partial(broker.publish, user_id, event, data))
+
+
+async def event_stream(user_ids):
+    """Encoded events for ``user_ids`` until the client disconnects or overflows"""
+    subscription = broker.subscribe(user_ids)
+    keepalive = stream_setting('KEEPALIVE_SECONDS')
+    try:
+        # Reconnect after 3 seconds when the connection drops
+        yield b'retry: 3000\n\n'
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.queue.get(), keepalive)
+            except asyncio.TimeoutError:
+                yield b': keepalive\n\n'
+                continue
+            yield message
+            if message is OVERFLOW:
+                return
+    finally:
+        broker.unsubscribe(subscription)
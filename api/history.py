@@ -0,0 +1,109 @@
+"""
+Queries over the JSON history columns of a user that run in the database.
+
+These return only the part of ``User.workouts`` / ``User.personal_records``
+that was asked for instead of loading the whole column into Python. Backends
+without JSON table functions fall back to filtering in Python.
+"""
+import json
+
+from django.db import connection
+
+from .archive import archived_workouts_in_range
+from .models import User
+from .stats import completed_between
+
+
+def workouts_in_range(user, start=None, end=None):
+    """
+    Workouts completed in [start, end), in logging order, including archived
+    ones. A workout's time is its client supplied completion time, or its
+    creation time.
+    """
+    workouts = live_workouts_in_range(user, start, end)
+    live_ids = {workout['id'] for workout in workouts}
+    archived = [
+        workout for workout in archived_workouts_in_range(user, start, end)
+        if workout['id'] not in live_ids
+    ]
+    if not archived:
+        return workouts
+    return sorted(archived + workouts, key=lambda workout: workout['id'])
+
+
+def live_workouts_in_range(user, start=None, end=None):
+    """Matching workouts still in the user row"""
+    if connection.vendor == 'postgresql':
+        return _postgresql_workouts_in_range(user.pk, start, end)
+    if connection.vendor == 'sqlite':
+        return _sqlite_workouts_in_range(user.pk, start, end)
+
+    workouts = User.objects.filter(pk=user.pk).values_list('workouts', flat=True).first() or []
+    return [workout for workout in workouts if completed_between(workout, start, end)]
+
+
+# Both backends return JSON values as text, decoded here like JSONField does
+
+def _postgresql_workouts_in_range(user_id, start, end):
+    completed = "COALESCE(workout.value->>'time_completed', workout.value->>'created_at')::timestamptz"
+    conditions, params = [f'{User._meta.db_table}.id = %s'], [user_id]
+    if start is not None:
+        conditions.append(f'{completed} >= %s')
+        params.append(start)
+    if end is not None:
+        conditions.append(f'{completed} < %s')
+        params.append(end)
+    sql = (
+        f'SELECT workout.value FROM {User._meta.db_table}, '
+        f'jsonb_array_elements({User._meta.db_table}.workouts) WITH ORDINALITY AS workout(value, position) '
+        f'WHERE {" AND ".join(conditions)} ORDER BY workout.position'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [json.loads(row[0]) for row in cursor.fetchall()]
+
+
+def _sqlite_workouts_in_range(user_id, start, end):
+    # datetime() normalizes ISO 8601 strings with offsets to UTC 'YYYY-MM-DD HH:MM:SS'
+    completed = (
+        "datetime(COALESCE(json_extract(workout.value, '$.time_completed'), "
+        "json_extract(workout.value, '$.created_at')))"
+    )
+    conditions, params = [f'{User._meta.db_table}.id = %s'], [user_id]
+    if start is not None:
+        conditions.append(f'{completed} >= datetime(%s)')
+        params.append(start.isoformat())
+    if end is not None:
+        conditions.append(f'{completed} < datetime(%s)')
+        params.append(end.isoformat())
+    sql = (
+        f'SELECT workout.value FROM {User._meta.db_table}, '
+        f'json_each({User._meta.db_table}.workouts) AS workout '
+        f'WHERE {" AND ".join(conditions)} ORDER BY workout.key'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [json.loads(row[0]) for row in cursor.fetchall()]
+
+
+def personal_records_for(user, keys):
+    """
+    Personal records of only the given exercise keys, extracted in the database
+    """
+    # Not KeyTransform: it treats numeric keys such as "12" as array indexes
+    table = User._meta.db_table
+    if connection.vendor == 'postgresql':
+        sql = f'SELECT record.key, record.value FROM {table}, jsonb_each({table}.personal_records) AS record'
+    elif connection.vendor == 'sqlite':
+        sql = f'SELECT record.key, record.value FROM {table}, json_each({table}.personal_records) AS record'
+    else:
+        records = User.objects.filter(pk=user.pk).values_list('personal_records', flat=True).first() or {}
+        return {key: records[key] for key in keys if key in records}
+
+    placeholders = ', '.join(['%s'] * len(keys))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{sql} WHERE {table}.id = %s AND record.key IN ({placeholders})',
+            [user.pk, *keys]
+        )
+        return {key: json.loads(value) for key, value in cursor.fetchall()}
@@ -0,0 +1,199 @@
+"""
+A small database-backed job queue.
+
+Handlers are registered with the ``@job`` decorator (see api/tasks.py) and
+scheduled with ``enqueue``, which only writes the job once the surrounding
+transaction has committed. Jobs are executed by ``manage.py run_jobs``.
+Successful jobs are deleted, failing jobs are retried with exponential
+backoff and kept with status ``failed`` once they run out of attempts.
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # Run handlers right after commit instead of writing a job (tests, local dev)
+    'ALWAYS_EAGER': False,
+    'MAX_ATTEMPTS': 5,
+    # Seconds before a running job whose worker died is picked up again
+    'LOCK_TIMEOUT': 300,
+    # Upper bound for the retry delay in seconds
+    'MAX_BACKOFF': 600,
+    # Maximum number of concurrently running jobs per queue across all workers
+    'QUEUE_CONCURRENCY': {},
+}
+
+_handlers = {}
+
+
+def queue_setting(name):
+    return getattr(settings, 'JOB_QUEUE', {}).get(name, DEFAULTS[name])
+
+
+def job(name=None, queue='default'):
+    """Register a function as a job handler. The function receives the payload as kwargs."""
+    def decorator(func):
+        func.job_name = name or func.__name__
+        func.job_queue = queue
+        _handlers[func.job_name] = func
+        return func
+    return decorator
+
+
+def get_handler(name):
+    try:
+        return _handlers[name]
+    except KeyError:
+        raise LookupError(f'No job handler registered for "{name}"')
+
+
+def enqueue(name, payload=None, delay=None, max_attempts=None):
+    """
+    Schedule a job once the current transaction commits (immediately in autocommit)
+    """
+    handler = get_handler(name)
+    payload = payload or {}
+
+    if queue_setting('ALWAYS_EAGER'):
+        transaction.on_commit(lambda: handler(**payload))
+        return
+
+    def create():
+        Job.objects.create(
+            name=name,
+            queue=handler.job_queue,
+            payload=payload,
+            max_attempts=max_attempts or queue_setting('MAX_ATTEMPTS'),
+            run_after=timezone.now() + (delay or timedelta()),
+        )
+    transaction.on_commit(create)
+
+
+def claim_jobs(worker_id, limit, queues=None):
+    """
+    Atomically mark up to ``limit`` ready jobs as running for this worker.
+
+    Candidates are locked with SELECT ... FOR UPDATE SKIP LOCKED, so workers
+    polling at the same time claim different rows. Queues with a concurrency
+    limit are locked for the whole claim (``lock_queues``), so no other worker
+    can start jobs between the capacity check and the claim.
+    """
+    if limit <= 0:
+        return []
+    now = timezone.now()
+    stale = now - timedelta(seconds=queue_setting('LOCK_TIMEOUT'))
+    ready = Q(status=Job.STATUS_PENDING, run_after__lte=now) | Q(
+        status=Job.STATUS_RUNNING, locked_at__lt=stale
+    )
+
+    with transaction.atomic():
+        lock_queues(limited_queues(queues))
+        capacity = queue_capacity(queues)
+        candidates = Job.objects.select_for_update(skip_locked=True).filter(ready).exclude(
+            queue__in=[queue for queue, slots in capacity.items() if slots <= 0]
+        )
+        if queues:
+            candidates = candidates.filter(queue__in=queues)
+
+        claimed = []
+        for candidate in candidates.only('id', 'queue')[:limit * 2]:
+            if len(claimed) >= limit:
+                break
+            if capacity.get(candidate.queue, limit) <= 0:
+                continue
+            if candidate.queue in capacity:
+                capacity[candidate.queue] -= 1
+            claimed.append(candidate.pk)
+        Job.objects.filter(pk__in=claimed).update(status=Job.STATUS_RUNNING, locked_by=worker_id, locked_at=now)
+    return list(Job.objects.filter(pk__in=claimed))
+
+
+def limited_queues(queues=None):
+    """{queue: concurrency limit} of the queues with a configured limit"""
+    return {
+        queue: limit for queue, limit in queue_setting('QUEUE_CONCURRENCY').items()
+        if not queues or queue in queues
+    }
+
+
+def lock_queues(queues):
+    """
+    Serialize claims on ``queues`` until the current transaction ends.
+
+    PostgreSQL takes a transaction-level advisory lock per queue. SQLite has
+    a single writer: with the production profile (IMMEDIATE transactions)
+    claims wait for each other, otherwise a concurrent claim fails with
+    "database is locked" and the worker retries on its next poll.
+    """
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        for queue in sorted(queues):
+            cursor.execute('SELECT pg_advisory_xact_lock(hashtext(%s))', [f'job_queue:{queue}'])
+
+
+def queue_capacity(queues=None):
+    """Remaining slots per queue for queues with a configured concurrency limit"""
+    limits = limited_queues(queues)
+    if not limits:
+        return {}
+    running = dict(
+        Job.objects.filter(status=Job.STATUS_RUNNING, queue__in=limits)
+        .values_list('queue').annotate(total=Count('id'))
+    )
+    return {queue: limit - running.get(queue, 0) for queue, limit in limits.items()}
+
+
+def run_job(job_instance):
+    """Execute a claimed job and record the outcome. Returns True on success."""
+    job_instance.attempts += 1
+    try:
+        get_handler(job_instance.name)(**job_instance.payload)
+    except Exception:
+        job_instance.last_error = traceback.format_exc()
+        job_instance.locked_by = ''
+        job_instance.locked_at = None
+        if job_instance.attempts >= job_instance.max_attempts:
+            job_instance.status = Job.STATUS_FAILED
+            logger.error('Job %s (%s) failed permanently', job_instance.pk, job_instance.name)
+        else:
+            backoff = min(2 ** job_instance.attempts, queue_setting('MAX_BACKOFF'))
+            job_instance.status = Job.STATUS_PENDING
+            job_instance.run_after = timezone.now() + timedelta(seconds=backoff)
+            logger.warning(
+                'Job %s (%s) failed, retrying in %ss', job_instance.pk, job_instance.name, backoff
+            )
+        job_instance.save(update_fields=[
+            'attempts', 'last_error', 'locked_by', 'locked_at', 'status', 'run_after'
+        ])
+        return False
+
+    job_instance.delete()
+    return True
+
+
+def queue_metrics():
+    """Queue depth and lag per queue"""
+    now = timezone.now()
+    rows = Job.objects.values('queue').annotate(
+        pending=Count('id', filter=Q(status=Job.STATUS_PENDING)),
+        ready=Count('id', filter=Q(status=Job.STATUS_PENDING, run_after__lte=now)),
+        running=Count('id', filter=Q(status=Job.STATUS_RUNNING)),
+        failed=Count('id', filter=Q(status=Job.STATUS_FAILED)),
+        oldest_ready=Min('run_after', filter=Q(status=Job.STATUS_PENDING, run_after__lte=now)),
+    )
+    metrics = {}
+    for row in rows:
+        oldest = row.pop('oldest_ready')
+        row['lag_seconds'] = (now - oldest).total_seconds() if oldest else 0
+        metrics[row.pop('queue')] = row
+    return metrics
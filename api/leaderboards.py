@@ -0,0 +1,317 @@
+"""
+Cross-user leaderboards per catalog exercise.
+
+Users opt in (LeaderboardMembershipView); only they have LeaderboardEntry
+rows. ``update_leaderboards`` is called wherever a workout is written
+(api/workouts.py) with the old and the new version of the workout:
+
+- ``one_rm`` and ``volume`` copy the user's max_one_rm and max_volume_total
+  personal records of the exercises involved. Rows are only written when a
+  record changed, i.e. when a PR was broken or an edit lowered one, or when
+  the workout holding it was edited.
+- ``weekly_volume`` is the volume of an exercise in a week (Monday to
+  Sunday), recomputed from the workouts completed in the weeks of the old
+  and the new workout.
+
+``achieved_at`` is when the workout that reached the value was completed:
+the first one reaching a record, the last one of the week for weekly
+volume. Ties rank the earlier entry first.
+
+A page is read in rank order from the leaderboard_rank_idx index. Pages
+continue from a cursor holding the last entry's sort key and rank, so
+reading a page costs O(limit) however deep it is.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .aggregates import day_workouts, workout_day
+from .models import ExerciseList, LeaderboardEntry
+from .stats import workout_timestamp
+
+# Personal record behind each all-time metric
+RECORD_METRICS = {
+    'one_rm': 'max_one_rm',
+    'volume': 'max_volume_total',
+}
+# Set field each record is taken from (see User.update_personal_records)
+RECORD_SET_FIELDS = {
+    'one_rm': 'one_rm',
+    'volume': 'total_volume',
+}
+WEEKLY_METRICS = {'weekly_volume'}
+METRICS = [*RECORD_METRICS, *WEEKLY_METRICS]
+
+DEFAULT_LEADERBOARD_LIMIT = 25
+MAX_LEADERBOARD_LIMIT = 100
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def catalog_ids(exercise_ids):
+    """The ids still in the catalog; sets of a removed exercise are not ranked"""
+    return set(ExerciseList.objects.filter(pk__in=exercise_ids).values_list('pk', flat=True))
+
+
+def completed_at(workout):
+    return datetime.fromtimestamp(workout_timestamp(workout), tz=dt_timezone.utc)
+
+
+def record_values(workout):
+    """{(exercise id, metric): best value} of the catalog sets of one workout"""
+    values = {}
+    for set_data in workout.get('exercises', []):
+        if not set_data.get('is_custom'):
+            for metric, field in RECORD_SET_FIELDS.items():
+                key = (int(set_data['exercise_id']), metric)
+                values[key] = max(values.get(key, 0), set_data.get(field) or 0)
+    return values
+
+
+def first_achieved(workouts, records):
+    """{(exercise id, metric): completion time of the first workout reaching the value in ``records``}"""
+    achieved = {}
+    for workout in workouts:
+        for key, value in record_values(workout).items():
+            if key in records and value >= records[key]:
+                at = completed_at(workout)
+                if key not in achieved or at < achieved[key]:
+                    achieved[key] = at
+    return achieved
+
+
+def weekly_volumes(workouts):
+    """
+    ({(exercise id, week): volume}, {(exercise id, week): completion time of
+    the week's last workout of the exercise}) of ``workouts``
+    """
+    volumes = {}
+    achieved = {}
+    for workout in workouts:
+        week = week_start(workout_day(workout))
+        at = completed_at(workout)
+        for set_data in workout.get('exercises', []):
+            if not set_data.get('is_custom'):
+                key = (int(set_data['exercise_id']), week)
+                volumes[key] = volumes.get(key, 0) + (set_data.get('volume') or 0)
+                achieved[key] = max(achieved.get(key, at), at)
+    return volumes, achieved
+
+
+def sync_records(user, exercise_ids, old, new):
+    """Bring the all-time entries of ``exercise_ids`` in line with the personal records"""
+    existing = {
+        (entry.exercise_id, entry.metric): entry
+        for entry in LeaderboardEntry.objects.select_for_update().filter(
+            user_id=user.pk, exercise_id__in=exercise_ids, week__isnull=True
+        )
+    }
+    records = user.personal_records or {}
+    old_values = record_values(old) if old is not None else {}
+    new_values = record_values(new) if new is not None else {}
+
+    changed = {}
+    achieved = {}
+    for exercise_id in exercise_ids:
+        for metric, record in RECORD_METRICS.items():
+            key = (exercise_id, metric)
+            value = records.get(str(exercise_id), {}).get(record) or 0
+            entry = existing.get(key)
+            new_holds = new_values.get(key, 0) >= value
+            if value <= 0:
+                if entry is not None:
+                    entry.delete()
+            elif entry is None or value > entry.value:
+                # Broken by the new workout, or rebuilt by an edit
+                changed[key] = value
+                if new_holds:
+                    achieved[key] = completed_at(new)
+            elif value < entry.value or old_values.get(key, 0) >= value:
+                # Lowered by an edit, or the workout holding it changed
+                changed[key] = value
+            elif new_holds and completed_at(new) < entry.achieved_at:
+                # Tied by a workout completed earlier
+                changed[key] = value
+                achieved[key] = completed_at(new)
+
+    # Records not set by the new workout are looked up in the history
+    lookup = {key: value for key, value in changed.items() if key not in achieved}
+    if lookup:
+        achieved.update(first_achieved(user.workout_history(), lookup))
+
+    for key, value in changed.items():
+        exercise_id, metric = key
+        entry = existing.get(key)
+        if entry is None:
+            LeaderboardEntry.objects.create(
+                user_id=user.pk, exercise_id=exercise_id, metric=metric, value=value,
+                achieved_at=achieved.get(key, timezone.now())
+            )
+        else:
+            entry.value = value
+            entry.achieved_at = achieved.get(key, entry.achieved_at)
+            entry.save(update_fields=['value', 'achieved_at'])
+
+
+def sync_weeks(user, exercise_ids, old, new):
+    """Recompute the weekly entries of ``exercise_ids`` in the weeks of ``old`` and ``new``"""
+    weeks = {week_start(workout_day(workout)) for workout in (old, new) if workout is not None}
+    for week in sorted(weeks):
+        volumes, achieved = weekly_volumes(day_workouts(user, week, days=7))
+        existing = {
+            entry.exercise_id: entry
+            for entry in LeaderboardEntry.objects.select_for_update().filter(
+                user_id=user.pk, exercise_id__in=exercise_ids, metric='weekly_volume', week=week
+            )
+        }
+        for exercise_id in exercise_ids:
+            volume = volumes.get((exercise_id, week), 0)
+            entry = existing.get(exercise_id)
+            if volume <= 0:
+                if entry is not None:
+                    entry.delete()
+            elif entry is None:
+                LeaderboardEntry.objects.create(
+                    user_id=user.pk, exercise_id=exercise_id, metric='weekly_volume', week=week,
+                    value=volume, achieved_at=achieved[(exercise_id, week)]
+                )
+            elif (entry.value, entry.achieved_at) != (volume, achieved[(exercise_id, week)]):
+                entry.value = volume
+                entry.achieved_at = achieved[(exercise_id, week)]
+                entry.save(update_fields=['value', 'achieved_at'])
+
+
+def update_leaderboards(user, old=None, new=None):
+    """
+    Update an opted-in user's entries after ``old`` was replaced by ``new``.
+    The user's history must already hold the change.
+    """
+    if not user.leaderboard_opt_in:
+        return
+    sets = (old or {}).get('exercises', []) + (new or {}).get('exercises', [])
+    # Custom exercises have no leaderboard
+    exercise_ids = {int(set_data['exercise_id']) for set_data in sets if not set_data.get('is_custom')}
+    if not exercise_ids:
+        return
+    exercise_ids = catalog_ids(exercise_ids)
+    with transaction.atomic():
+        sync_records(user, exercise_ids, old, new)
+        sync_weeks(user, exercise_ids, old, new)
+
+
+def rebuild_leaderboards(user):
+    """All of the user's entries from the personal records and the history"""
+    workouts = user.workout_history()
+    volumes, week_achieved = weekly_volumes(workouts)
+    personal_records = {
+        int(key): records for key, records in (user.personal_records or {}).items()
+        if not key.startswith('custom_')
+    }
+    exercise_ids = catalog_ids(set(personal_records) | {exercise_id for exercise_id, _ in volumes})
+    records = {
+        (exercise_id, metric): records[record]
+        for exercise_id, records in personal_records.items() if exercise_id in exercise_ids
+        for metric, record in RECORD_METRICS.items() if records.get(record)
+    }
+    record_achieved = first_achieved(workouts, records)
+
+    now = timezone.now()
+    entries = [
+        LeaderboardEntry(
+            user_id=user.pk, exercise_id=exercise_id, metric=metric, value=value,
+            achieved_at=record_achieved.get((exercise_id, metric), now)
+        )
+        for (exercise_id, metric), value in records.items()
+    ]
+    for (exercise_id, week), volume in volumes.items():
+        if exercise_id in exercise_ids and volume > 0:
+            entries.append(LeaderboardEntry(
+                user_id=user.pk, exercise_id=exercise_id, metric='weekly_volume', week=week,
+                value=volume, achieved_at=week_achieved[(exercise_id, week)]
+            ))
+
+    with transaction.atomic():
+        user.leaderboard_entries.all().delete()
+        LeaderboardEntry.objects.bulk_create(entries)
+
+
+def join_leaderboards(user, name=''):
+    user.leaderboard_opt_in = True
+    user.leaderboard_name = name
+    with transaction.atomic():
+        user.save(update_fields=['leaderboard_opt_in', 'leaderboard_name'])
+        rebuild_leaderboards(user)
+
+
+def leave_leaderboards(user):
+    user.leaderboard_opt_in = False
+    with transaction.atomic():
+        user.save(update_fields=['leaderboard_opt_in'])
+        user.leaderboard_entries.all().delete()
+
+
+def encode_cursor(entry, rank):
+    position = [rank, entry.value, entry.achieved_at.isoformat(), entry.pk]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """(rank, value, achieved_at, id) of the last entry of the previous page; ValueError if invalid"""
+    try:
+        rank, value, achieved_at, entry_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return int(rank), float(value), datetime.fromisoformat(achieved_at), int(entry_id)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as exc:
+        raise ValueError('Invalid cursor') from exc
+
+
+def leaderboard(exercise_id, metric, week=None, limit=DEFAULT_LEADERBOARD_LIMIT, cursor=None):
+    """
+    One page of the leaderboard, best first. ``week`` is any day of the week
+    for weekly metrics and ignored otherwise; ``cursor`` is the previous
+    page's next_cursor.
+    """
+    entries = LeaderboardEntry.objects.filter(exercise_id=exercise_id, metric=metric)
+    if metric in WEEKLY_METRICS:
+        entries = entries.filter(week=week_start(week))
+    else:
+        entries = entries.filter(week__isnull=True)
+
+    rank = 0
+    if cursor is not None:
+        rank, value, achieved_at, entry_id = decode_cursor(cursor)
+        entries = entries.filter(
+            Q(value__lt=value)
+            | Q(value=value, achieved_at__gt=achieved_at)
+            | Q(value=value, achieved_at=achieved_at, id__gt=entry_id)
+        )
+
+    page = list(
+        entries.order_by('-value', 'achieved_at', 'id')
+        .select_related('user')
+        .only('value', 'achieved_at', 'user__id', 'user__leaderboard_name')[:limit + 1]
+    )
+    results = [
+        {
+            'rank': rank + position,
+            'user_id': entry.user.id,
+            'name': entry.user.leaderboard_name or f'Athlete {entry.user.id}',
+            'value': entry.value,
+            'achieved_at': entry.achieved_at,
+        }
+        for position, entry in enumerate(page[:limit], start=1)
+    ]
+    has_more = len(page) > limit
+    return {
+        'exercise_id': exercise_id,
+        'metric': metric,
+        'week': week_start(week).isoformat() if metric in WEEKLY_METRICS else None,
+        'results': results,
+        'next_cursor': encode_cursor(page[limit - 1], rank + limit) if has_more else None,
+    }
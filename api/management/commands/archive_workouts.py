@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.archive import archive_cutoff, archive_old_workouts
+
+
+class Command(BaseCommand):
+    help = 'Move workouts older than the archive age from user rows to the workout archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.WORKOUT_ARCHIVE['AFTER_DAYS'],
+            help='Archive workouts completed more than this many days ago'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.WORKOUT_ARCHIVE['BATCH_SIZE'],
+            help='Users loaded per batch'
+        )
+
+    def handle(self, *args, **options):
+        cutoff = archive_cutoff(options['days'])
+        users = moved = 0
+        for _, count in archive_old_workouts(cutoff, options['batch_size']):
+            if count:
+                users += 1
+                moved += count
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {moved} workouts of {users} users completed before {cutoff:%Y-%m-%d %H:%M}'
+        ))
@@ -0,0 +1,149 @@
+import asyncio
+import importlib.util
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from api.models import User
+
+from .bench_json import build_history
+
+BENCH_EMAIL = 'bench-concurrency@example.com'
+
+
+def deployments(threads):
+    """(name, server module, command line, extra environment) of each deployment compared"""
+    return [
+        ('wsgi', 'gunicorn', [
+            'gunicorn', 'workerback.wsgi:application', '--worker-class', 'gthread',
+            '--workers', '1', '--threads', str(threads), '--log-level', 'warning',
+        ], {}),
+        ('asgi', 'uvicorn', [
+            'uvicorn', 'workerback.asgi:application', '--log-level', 'warning',
+        ], {'ASYNC_VIEWS': 'False'}),
+        ('asgi+async', 'uvicorn', [
+            'uvicorn', 'workerback.asgi:application', '--log-level', 'warning',
+        ], {'ASYNC_VIEWS': 'True'}),
+    ]
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError(f'Server on port {port} did not start')
+
+
+async def slow_client(port, request, pieces, send_delay):
+    """
+    One connection sending its request in ``pieces`` with pauses in between,
+    like a client on a slow mobile uplink. (Slow reads are absorbed by socket
+    buffers on loopback, slow writes hold a WSGI thread.)
+    """
+    started = time.perf_counter()
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    size = -(-len(request) // pieces)
+    for offset in range(0, len(request), size):
+        if offset:
+            await asyncio.sleep(send_delay)
+        writer.write(request[offset:offset + size])
+        await writer.drain()
+    response = await reader.read()
+    writer.close()
+    status = int(response.split(b' ', 2)[1]) if response.startswith(b'HTTP/') else 0
+    return status, len(response), time.perf_counter() - started
+
+
+async def run_clients(port, request, clients, pieces, send_delay):
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(slow_client(port, request, pieces, send_delay) for _ in range(clients)),
+        return_exceptions=True
+    )
+    return results, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = 'Compare WSGI (gunicorn) and ASGI (uvicorn) deployments under many concurrent slow clients'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=500, help='Concurrent connections')
+        parser.add_argument('--path', default='/api/exercises/', help='Endpoint every client requests')
+        parser.add_argument('--workouts', type=int, default=20, help='Workouts in the benchmark user history')
+        parser.add_argument('--threads', type=int, default=32, help='Threads of the WSGI worker')
+        parser.add_argument('--pieces', type=int, default=10, help='Pieces a client sends its request in')
+        parser.add_argument('--send-delay', type=float, default=0.1, help='Seconds a client waits between pieces')
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(email=BENCH_EMAIL).first() or User.objects.create_user(
+            username=BENCH_EMAIL, email=BENCH_EMAIL, password=None
+        )
+        user.workouts = build_history(options['workouts'], 10)
+        user.save()
+        token, _ = Token.objects.get_or_create(user=user)
+        request = (
+            f"GET {options['path']} HTTP/1.1\r\nHost: 127.0.0.1\r\n"
+            f"Authorization: Token {token.key}\r\nAccept-Encoding: identity\r\nConnection: close\r\n\r\n"
+        ).encode()
+
+        self.stdout.write(
+            f"{options['clients']} concurrent clients, GET {options['path']}, "
+            f"request sent in {options['pieces']} pieces {options['send_delay']}s apart"
+        )
+        self.stdout.write(
+            f"{'deployment':<12}{'ok':>6}{'errors':>8}{'seconds':>9}{'req/s':>8}{'p50 s':>8}{'p95 s':>8}"
+        )
+        try:
+            for name, module, command, environment in deployments(options['threads']):
+                if importlib.util.find_spec(module) is None:
+                    self.stdout.write(f'{name:<12}skipped, {module} is not installed')
+                    continue
+                self.bench(name, command, environment, request, options)
+        finally:
+            user.delete()
+
+    def bench(self, name, command, environment, request, options):
+        port = free_port()
+        bind = ['--bind', f'127.0.0.1:{port}'] if command[0] == 'gunicorn' else ['--port', str(port)]
+        server = subprocess.Popen(
+            [sys.executable, '-m', *command, *bind],
+            cwd=settings.BASE_DIR, env={**os.environ, **environment}
+        )
+        try:
+            wait_for_port(port)
+            results, elapsed = asyncio.run(run_clients(
+                port, request, options['clients'], options['pieces'], options['send_delay']
+            ))
+        finally:
+            server.terminate()
+            server.wait()
+
+        latencies = sorted(
+            result[2] for result in results if not isinstance(result, BaseException) and result[0] == 200
+        )
+        errors = len(results) - len(latencies)
+        if not latencies:
+            self.stdout.write(f'{name:<12}{0:>6}{errors:>8}{elapsed:>9.2f}')
+            return
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        self.stdout.write(
+            f'{name:<12}{len(latencies):>6}{errors:>8}{elapsed:>9.2f}{len(latencies) / elapsed:>8.0f}'
+            f'{statistics.median(latencies):>8.2f}{p95:>8.2f}'
+        )
@@ -0,0 +1,113 @@
+import io
+import random
+import time
+import tracemalloc
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from api.parsers import FastJSONParser
+from api.renderers import FastJSONRenderer, orjson
+
+
+def build_history(workouts, sets, seed=0):
+    """A synthetic history shaped like record_workout's output"""
+    rng = random.Random(seed)
+    history = []
+    for workout_id in range(1, workouts + 1):
+        exercises = []
+        for set_number in range(1, sets + 1):
+            reps = rng.randint(3, 15)
+            weight = float(rng.randrange(20, 200, 5))
+            exercises.append({
+                'exercise_id': rng.randint(1, 300),
+                'name': rng.choice(('Bench Press', 'Barbell Back Squat', 'Deadlift', 'Overhead Press', 'Lat Pulldown')),
+                'is_custom': False,
+                'set_number': set_number,
+                'reps': reps,
+                'weight': weight,
+                'duration_minutes': None,
+                'distance_meters': None,
+                'volume': reps * weight,
+                'one_rm': round(weight * (1 + reps / 30), 2),
+                'total_volume': 0,
+                'total_duration': 0,
+            })
+        history.append({
+            'id': workout_id,
+            'name': f'Workout {workout_id}',
+            'description': '',
+            'created_at': f'2025-01-01T{workout_id % 24:02d}:00:00+00:00',
+            'exercises': exercises,
+        })
+    return history
+
+
+def build_profile(workouts, sets):
+    """Shaped like the /api/profile/ response, with the value types serializers produce"""
+    now = timezone.now()
+    return {
+        'id': 1,
+        'email': 'lifter@example.com',
+        'username': 'lifter',
+        'custom_exercises': [
+            {'id': number, 'name': f'Custom {number}', 'primary_muscle': 'Chest',
+             'exercise_type': 'Dumbbell Exercises', 'created_at': now - timedelta(days=number)}
+            for number in range(1, 21)
+        ],
+        'workouts': build_history(workouts, sets),
+        'templates': [],
+        'personal_records': {
+            str(exercise_id): {'max_weight': Decimal('142.5'), 'max_one_rm': 160.3, 'max_reps_single_set': 12}
+            for exercise_id in range(1, 301)
+        },
+        'created_at': now,
+    }
+
+
+def measure(function, repeat):
+    """Best time of ``repeat`` runs and peak traced memory of one run"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, best, peak
+
+
+class Command(BaseCommand):
+    help = 'Compare the stdlib and orjson JSON renderers and parsers on a large profile payload'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workouts', type=int, default=2000, help='Workouts in the payload')
+        parser.add_argument('--sets', type=int, default=15, help='Sets per workout')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement, best is reported')
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING('orjson is not installed, FastJSONRenderer falls back to json'))
+        payload = build_profile(options['workouts'], options['sets'])
+        repeat = options['repeat']
+
+        self.stdout.write(f"{'operation':<20}{'bytes':>12}{'ms':>10}{'peak MB':>10}")
+        for name, renderer, parser in (
+            ('json', JSONRenderer(), JSONParser()),
+            ('orjson', FastJSONRenderer(), FastJSONParser()),
+        ):
+            body, encode_time, encode_peak = measure(lambda: renderer.render(payload), repeat)
+            _, decode_time, decode_peak = measure(lambda: parser.parse(io.BytesIO(body)), repeat)
+            self.stdout.write(
+                f"{name + ' render':<20}{len(body):>12}{encode_time * 1000:>10.1f}{encode_peak / 2**20:>10.1f}"
+            )
+            self.stdout.write(
+                f"{name + ' parse':<20}{len(body):>12}{decode_time * 1000:>10.1f}{decode_peak / 2**20:>10.1f}"
+            )
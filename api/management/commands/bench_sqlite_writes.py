@@ -0,0 +1,117 @@
+import multiprocessing
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+
+# A request-like write: read a row, then update it in the same transaction,
+# the pattern of loading a user and saving it back
+SCHEMA = 'CREATE TABLE profile (id INTEGER PRIMARY KEY, payload TEXT NOT NULL, counter INTEGER NOT NULL)'
+ROWS = 100
+PAYLOAD = 'x' * 4000
+ALIAS = 'bench_sqlite_writes'
+
+
+def default_profile():
+    """What Django does without OPTIONS: rollback journal, deferred transactions, 5s timeout"""
+    return {'OPTIONS': {}, 'CONN_MAX_AGE': 0}
+
+
+def production_profile():
+    return {'OPTIONS': settings.SQLITE_PRODUCTION_OPTIONS, 'CONN_MAX_AGE': None}
+
+
+def add_database(path, profile):
+    """Register ``path`` as the ALIAS database, configured like DATABASES entries are"""
+    databases = connections.configure_settings({
+        DEFAULT_DB_ALIAS: connections.settings[DEFAULT_DB_ALIAS],
+        ALIAS: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': path, **profile},
+    })
+    connections.settings[ALIAS] = databases[ALIAS]
+
+
+def remove_database():
+    connections[ALIAS].close()
+    del connections[ALIAS]
+    del connections.settings[ALIAS]
+
+
+def writer(transactions, worker, results):
+    committed = locked = 0
+    connection = connections[ALIAS]
+    for number in range(transactions):
+        row_id = (worker * transactions + number) % ROWS + 1
+        try:
+            with transaction.atomic(using=ALIAS), connection.cursor() as cursor:
+                cursor.execute('SELECT payload, counter FROM profile WHERE id = %s', [row_id])
+                cursor.fetchone()
+                cursor.execute(
+                    'UPDATE profile SET counter = counter + 1, payload = %s WHERE id = %s', [PAYLOAD, row_id]
+                )
+            committed += 1
+        except OperationalError as exc:
+            if 'locked' not in str(exc) and 'busy' not in str(exc):
+                raise
+            locked += 1
+        finally:
+            # Without persistent connections every request opens a new one
+            if connection.settings_dict['CONN_MAX_AGE'] == 0:
+                connection.close()
+    connection.close()
+    results.put((committed, locked))
+
+
+def run(profile, workers, transactions):
+    with tempfile.TemporaryDirectory() as directory:
+        add_database(str(Path(directory) / 'bench.sqlite3'), profile)
+        try:
+            with connections[ALIAS].cursor() as cursor:
+                cursor.execute(SCHEMA)
+                cursor.executemany(
+                    'INSERT INTO profile (id, payload, counter) VALUES (%s, %s, 0)',
+                    [(row_id, PAYLOAD) for row_id in range(1, ROWS + 1)]
+                )
+            # Each worker opens its own connection from the inherited settings
+            connections[ALIAS].close()
+
+            context = multiprocessing.get_context('fork')
+            results = context.Queue()
+            processes = [
+                context.Process(target=writer, args=(transactions, worker, results))
+                for worker in range(workers)
+            ]
+            started = time.perf_counter()
+            for process in processes:
+                process.start()
+            outcomes = [results.get() for _ in processes]
+            for process in processes:
+                process.join()
+            elapsed = time.perf_counter() - started
+        finally:
+            remove_database()
+
+    committed = sum(outcome[0] for outcome in outcomes)
+    locked = sum(outcome[1] for outcome in outcomes)
+    return committed, locked, elapsed
+
+
+class Command(BaseCommand):
+    help = 'Compare concurrent SQLite write throughput of the default and production database profiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent writer processes')
+        parser.add_argument('--transactions', type=int, default=500, help='Write transactions per worker')
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{options['workers']} writer processes x {options['transactions']} read-then-update transactions"
+        )
+        self.stdout.write(f"{'profile':<12}{'committed':>11}{'locked':>9}{'seconds':>10}{'commits/s':>12}")
+        for name, profile in (('default', default_profile()), ('production', production_profile())):
+            committed, locked, elapsed = run(profile, options['workers'], options['transactions'])
+            self.stdout.write(
+                f'{name:<12}{committed:>11}{locked:>9}{elapsed:>10.2f}{committed / elapsed:>12.0f}'
+            )
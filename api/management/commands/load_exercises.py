@@ -1,120 +1,224 @@
-from django.core.management.base import BaseCommand
+import csv
+import json
+from pathlib import Path
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.catalog import bump_catalog_version
 from api.models import ExerciseList
 
+# Columns that can be loaded; rows are matched to existing exercises by name
+FIELDS = ['name', 'description', 'primary_muscle', 'secondary_muscle', 'tertiary_muscle', 'exercise_type']
+UPDATE_FIELDS = [field for field in FIELDS if field != 'name']
+
+DEFAULT_EXERCISES = [
+    {
+        "name": "Incline Dumbbell Press",
+        "description": "A dumbbell press performed on an incline bench to target the upper portion of the chest.",
+        "primary_muscle": "Upper Chest",
+        "secondary_muscle": "Front Delts",
+        "tertiary_muscle": "Long Head of Triceps",
+        "exercise_type": "Dumbbell Exercises"
+    },
+    {
+        "name": "Flat Barbell Bench Press",
+        "description": "A classic barbell exercise that targets the middle part of the chest.",
+        "primary_muscle": "Middle Chest",
+        "secondary_muscle": "Lateral Head of Triceps",
+        "tertiary_muscle": "Front Delts",
+        "exercise_type": "Barbell Exercises"
+    },
+    {
+        "name": "Decline Machine Press",
+        "description": "A machine-based press performed on a decline bench to focus on the lower chest.",
+        "primary_muscle": "Lower Chest",
+        "secondary_muscle": "Medial Head of Triceps",
+        "tertiary_muscle": "Front Delts",
+        "exercise_type": "Machine-Based Workouts"
+    },
+    {
+        "name": "Push-Ups",
+        "description": "A bodyweight exercise that targets the entire chest, with emphasis on the middle chest.",
+        "primary_muscle": "Middle Chest",
+        "secondary_muscle": "Lateral Head of Triceps",
+        "tertiary_muscle": "Front Delts",
+        "exercise_type": "Bodyweight Training"
+    },
+    {
+        "name": "Chest Fly (Dumbbell)",
+        "description": "A dumbbell fly movement to isolate and stretch the chest muscles.",
+        "primary_muscle": "Middle Chest",
+        "secondary_muscle": "Front Delts",
+        "tertiary_muscle": "Serratus Anterior",
+        "exercise_type": "Dumbbell Exercises"
+    },
+    {
+        "name": "Pull-Ups",
+        "description": "A bodyweight exercise that targets the lats and other back muscles.",
+        "primary_muscle": "Lats",
+        "secondary_muscle": "Short Head of Biceps",
+        "tertiary_muscle": "Rhomboids",
+        "exercise_type": "Bodyweight Training"
+    },
+    {
+        "name": "Bent-Over Barbell Row",
+        "description": "A barbell row performed in a bent-over position to target the upper and middle back.",
+        "primary_muscle": "Lats",
+        "secondary_muscle": "Rhomboids",
+        "tertiary_muscle": "Rear Delts",
+        "exercise_type": "Barbell Exercises"
+    },
+    {
+        "name": "Lat Pulldown (Machine)",
+        "description": "A machine-based exercise where you pull a bar down to target the lats.",
+        "primary_muscle": "Lats",
+        "secondary_muscle": "Short Head of Biceps",
+        "tertiary_muscle": "Rear Delts",
+        "exercise_type": "Machine-Based Workouts"
+    },
+    {
+        "name": "Seated Cable Row",
+        "description": "A cable-based rowing exercise to target the middle back and lats.",
+        "primary_muscle": "Lats",
+        "secondary_muscle": "Rhomboids",
+        "tertiary_muscle": "Rear Delts",
+        "exercise_type": "Machine-Based Workouts"
+    },
+    {
+        "name": "Deadlift (Barbell)",
+        "description": "A compound barbell exercise that targets the entire posterior chain, including the back.",
+        "primary_muscle": "Erector Spinae",
+        "secondary_muscle": "Lats",
+        "tertiary_muscle": "Glutes",
+        "exercise_type": "Barbell Exercises"
+    },
+    {
+        "name": "Face Pulls (Cable)",
+        "description": "A cable-based exercise that targets the rear delts and upper back.",
+        "primary_muscle": "Rear Delts",
+        "secondary_muscle": "Traps",
+        "tertiary_muscle": "Rhomboids",
+        "exercise_type": "Machine-Based Workouts"
+    },
+    {
+        "name": "Shrugs (Dumbbell)",
+        "description": "A dumbbell exercise to target the traps by lifting the shoulders.",
+        "primary_muscle": "Traps",
+        "secondary_muscle": "Rhomboids",
+        "tertiary_muscle": "Rear Delts",
+        "exercise_type": "Dumbbell Exercises"
+    },
+    {
+        "name": "Reverse Fly (Dumbbell)",
+        "description": "A dumbbell exercise to target the rear delts and upper back.",
+        "primary_muscle": "Rear Delts",
+        "secondary_muscle": "Rhomboids",
+        "tertiary_muscle": "Traps",
+        "exercise_type": "Dumbbell Exercises"
+    }
+]
+
 class Command(BaseCommand):
-    help = 'Load predefined exercises into the database'
+    help = (
+        'Load exercises into the catalog from a JSON/CSV file (or the predefined list). '
+        'New names are inserted, changed exercises updated and the rest left alone, '
+        'in a single transaction.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file', type=Path,
+            help='JSON file with a list of exercises, or CSV file with a header row'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report what would change without writing anything'
+        )
+
+    def handle(self, *args, **options):
+        rows = self.read_file(options['file']) if options['file'] else DEFAULT_EXERCISES
+        exercises = self.validate(rows)
+
+        with transaction.atomic():
+            existing = {
+                exercise.name: exercise
+                for exercise in ExerciseList.objects.filter(name__in=exercises)
+            }
+            changed = []
+            inserted = unchanged = 0
+            for name, exercise in exercises.items():
+                current = existing.get(name)
+                if current is None:
+                    inserted += 1
+                elif all(getattr(current, field) == getattr(exercise, field) for field in UPDATE_FIELDS):
+                    unchanged += 1
+                    continue
+                changed.append(exercise)
+            updated = len(changed) - inserted
+
+            if changed and not options['dry_run']:
+                # One upsert for new and modified rows; unchanged rows are not touched
+                ExerciseList.objects.bulk_create(
+                    changed,
+                    batch_size=500,
+                    update_conflicts=True,
+                    unique_fields=['name'],
+                    update_fields=UPDATE_FIELDS + ['updated_at'],
+                )
+
+        # bulk_create bypasses the post_save signals, so invalidate the catalog once
+        if changed and not options['dry_run']:
+            bump_catalog_version()
+
+        prefix = 'Dry run: ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}{inserted} inserted, {updated} updated, {unchanged} unchanged'
+        ))
+
+    def read_file(self, path):
+        if not path.exists():
+            raise CommandError(f'{path} does not exist')
+        if path.suffix.lower() == '.csv':
+            with path.open(newline='', encoding='utf-8') as csv_file:
+                # Empty cells mean "no value" for the optional columns
+                return [
+                    {key: (value or None) for key, value in row.items()}
+                    for row in csv.DictReader(csv_file)
+                ]
+        if path.suffix.lower() == '.json':
+            with path.open(encoding='utf-8') as json_file:
+                rows = json.load(json_file)
+            if not isinstance(rows, list):
+                raise CommandError('The JSON file must contain a list of exercises')
+            return rows
+        raise CommandError('Only .json and .csv files are supported')
 
-    def handle(self, *args, **kwargs):
-      exercises = [
-          {
-              "name": "Incline Dumbbell Press",
-              "description": "A dumbbell press performed on an incline bench to target the upper portion of the chest.",
-              "primary_muscle": "Upper Chest",
-              "secondary_muscle": "Front Delts",
-              "tertiary_muscle": "Long Head of Triceps",
-              "exercise_type": "Dumbbell Exercises"
-          },
-          {
-              "name": "Flat Barbell Bench Press",
-              "description": "A classic barbell exercise that targets the middle part of the chest.",
-              "primary_muscle": "Middle Chest",
-              "secondary_muscle": "Lateral Head of Triceps",
-              "tertiary_muscle": "Front Delts",
-              "exercise_type": "Barbell Exercises"
-          },
-          {
-              "name": "Decline Machine Press",
-              "description": "A machine-based press performed on a decline bench to focus on the lower chest.",
-              "primary_muscle": "Lower Chest",
-              "secondary_muscle": "Medial Head of Triceps",
-              "tertiary_muscle": "Front Delts",
-              "exercise_type": "Machine-Based Workouts"
-          },
-          {
-              "name": "Push-Ups",
-              "description": "A bodyweight exercise that targets the entire chest, with emphasis on the middle chest.",
-              "primary_muscle": "Middle Chest",
-              "secondary_muscle": "Lateral Head of Triceps",
-              "tertiary_muscle": "Front Delts",
-              "exercise_type": "Bodyweight Training"
-          },
-          {
-              "name": "Chest Fly (Dumbbell)",
-              "description": "A dumbbell fly movement to isolate and stretch the chest muscles.",
-              "primary_muscle": "Middle Chest",
-              "secondary_muscle": "Front Delts",
-              "tertiary_muscle": "Serratus Anterior",
-              "exercise_type": "Dumbbell Exercises"
-          },
-          {
-              "name": "Pull-Ups",
-              "description": "A bodyweight exercise that targets the lats and other back muscles.",
-              "primary_muscle": "Lats",
-              "secondary_muscle": "Short Head of Biceps",
-              "tertiary_muscle": "Rhomboids",
-              "exercise_type": "Bodyweight Training"
-          },
-          {
-              "name": "Bent-Over Barbell Row",
-              "description": "A barbell row performed in a bent-over position to target the upper and middle back.",
-              "primary_muscle": "Lats",
-              "secondary_muscle": "Rhomboids",
-              "tertiary_muscle": "Rear Delts",
-              "exercise_type": "Barbell Exercises"
-          },
-          {
-              "name": "Lat Pulldown (Machine)",
-              "description": "A machine-based exercise where you pull a bar down to target the lats.",
-              "primary_muscle": "Lats",
-              "secondary_muscle": "Short Head of Biceps",
-              "tertiary_muscle": "Rear Delts",
-              "exercise_type": "Machine-Based Workouts"
-          },
-          {
-              "name": "Seated Cable Row",
-              "description": "A cable-based rowing exercise to target the middle back and lats.",
-              "primary_muscle": "Lats",
-              "secondary_muscle": "Rhomboids",
-              "tertiary_muscle": "Rear Delts",
-              "exercise_type": "Machine-Based Workouts"
-          },
-          {
-              "name": "Deadlift (Barbell)",
-              "description": "A compound barbell exercise that targets the entire posterior chain, including the back.",
-              "primary_muscle": "Erector Spinae",
-              "secondary_muscle": "Lats",
-              "tertiary_muscle": "Glutes",
-              "exercise_type": "Barbell Exercises"
-          },
-          {
-              "name": "Face Pulls (Cable)",
-              "description": "A cable-based exercise that targets the rear delts and upper back.",
-              "primary_muscle": "Rear Delts",
-              "secondary_muscle": "Traps",
-              "tertiary_muscle": "Rhomboids",
-              "exercise_type": "Machine-Based Workouts"
-          },
-          {
-              "name": "Shrugs (Dumbbell)",
-              "description": "A dumbbell exercise to target the traps by lifting the shoulders.",
-              "primary_muscle": "Traps",
-              "secondary_muscle": "Rhomboids",
-              "tertiary_muscle": "Rear Delts",
-              "exercise_type": "Dumbbell Exercises"
-          },
-          {
-              "name": "Reverse Fly (Dumbbell)",
-              "description": "A dumbbell exercise to target the rear delts and upper back.",
-              "primary_muscle": "Rear Delts",
-              "secondary_muscle": "Rhomboids",
-              "tertiary_muscle": "Traps",
-              "exercise_type": "Dumbbell Exercises"
-          }
-      ]
+    def validate(self, rows):
+        """
+        Build unsaved ExerciseList instances keyed by name, failing on the first
+        invalid rows before anything is written
+        """
+        exercises = {}
+        errors = []
+        for number, row in enumerate(rows, start=1):
+            unknown = set(row) - set(FIELDS)
+            if unknown:
+                errors.append(f'Row {number}: unknown columns {", ".join(sorted(unknown))}')
+                continue
+            exercise = ExerciseList(**row)
+            if exercise.exercise_type is None:
+                exercise.exercise_type = ExerciseList._meta.get_field('exercise_type').default
+            try:
+                exercise.clean_fields(exclude=['created_at', 'updated_at'])
+            except ValidationError as exc:
+                errors.append(f'Row {number} ({row.get("name")}): {exc.message_dict}')
+                continue
+            if exercise.name in exercises:
+                self.stderr.write(f'Row {number}: duplicate name "{exercise.name}", using the last one')
+            exercises[exercise.name] = exercise
 
-      for exercise_data in exercises:
-          ExerciseList.objects.get_or_create(
-              name=exercise_data['name'],
-              defaults=exercise_data
-          )
-          self.stdout.write(f"Added exercise: {exercise_data['name']}") 
\ No newline at end of file
+        if errors:
+            raise CommandError('Invalid exercises:\n' + '\n'.join(errors[:20]))
+        return exercises
@@ -0,0 +1,86 @@
+import os
+import signal
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections
+
+from api.jobs import claim_jobs, queue_metrics, run_job
+
+
+class Command(BaseCommand):
+    help = 'Process background jobs from the database job queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--queue', action='append', dest='queues',
+            help='Only process this queue (can be given multiple times)'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=2,
+            help='Number of jobs this worker runs at the same time'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Seconds to sleep when the queue is empty'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit once no jobs are ready instead of polling forever'
+        )
+
+    def handle(self, *args, **options):
+        worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        concurrency = max(1, options['concurrency'])
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        self.stdout.write(f'Worker {worker_id} started with concurrency {concurrency}')
+        processed = failed = 0
+        running = set()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            while not self.stopping:
+                try:
+                    claimed = claim_jobs(worker_id, concurrency - len(running), options['queues'])
+                except OperationalError as exc:
+                    # e.g. SQLite's "database is locked" while another worker claims
+                    self.stderr.write(f'Claiming jobs failed, retrying: {exc}')
+                    claimed = []
+                for job_instance in claimed:
+                    running.add(executor.submit(self.process, job_instance))
+
+                if not running:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                done, running = wait(running, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.result():
+                        processed += 1
+                    else:
+                        failed += 1
+
+            # Let in-flight jobs finish before exiting
+            for future in running:
+                if future.result():
+                    processed += 1
+                else:
+                    failed += 1
+
+        self.stdout.write(f'Worker {worker_id} stopped: {processed} succeeded, {failed} failed')
+        for queue, metrics in queue_metrics().items():
+            self.stdout.write(f'  {queue}: {metrics}')
+
+    def process(self, job_instance):
+        try:
+            return run_job(job_instance)
+        finally:
+            close_old_connections()
+
+    def stop(self, *args):
+        self.stopping = True
@@ -0,0 +1,180 @@
+import hashlib
+from functools import partial
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+from django.utils.functional import SimpleLazyObject, empty
+from django.utils.deprecation import MiddlewareMixin
+
+from .compression import CODECS, negotiate_encoding
+from .routers import replica_reads
+
+# Set on responses to writes; while present the client reads from the primary
+# so it sees its own changes despite replication lag
+PIN_COOKIE = 'db_primary_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def user_pin_key(user_id):
+    """Cache key set while a user's requests read from the primary, whichever client sends them"""
+    return f'db_primary_pin:user:{user_id}'
+
+
+def request_user(request):
+    """
+    The authenticated user of the request, or None while not known yet. The
+    lazy user of AuthenticationMiddleware is not evaluated here: that would
+    query the database from inside the router.
+    """
+    user = request.__dict__.get('user')
+    if isinstance(user, SimpleLazyObject):
+        user = None if user._wrapped is empty else user._wrapped
+    return user if user is not None and user.is_authenticated else None
+
+
+class ReplicaPinningMiddleware:
+    """
+    Lets safe requests read from replicas, except for clients that wrote in
+    the last DB_REPLICA_PIN_SECONDS. No-op when no replicas are configured.
+
+    Clients are pinned with a cookie, and authenticated users in the cache as
+    well, so a user's other clients (or one that drops cookies) see the write
+    too. The user is only known once DRF authenticated the request, so that
+    check happens at the first read after it, and once per request.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with replica_reads(self.reads_from_replica(request)):
+            response = self.get_response(request)
+        return self.pin(request, response)
+
+    async def __acall__(self, request):
+        with replica_reads(self.reads_from_replica(request)):
+            response = await self.get_response(request)
+        return self.pin(request, response)
+
+    def reads_from_replica(self, request):
+        if not settings.DB_REPLICAS or request.method not in SAFE_METHODS or PIN_COOKIE in request.COOKIES:
+            return False
+        return partial(self.user_not_pinned, request)
+
+    def user_not_pinned(self, request):
+        user = request_user(request)
+        if user is None:
+            return True
+        pinned = request.__dict__.get('_replica_pinned_user')
+        if pinned is None or pinned[0] != user.pk:
+            pinned = (user.pk, cache.get(user_pin_key(user.pk)) is not None)
+            request._replica_pinned_user = pinned
+        return not pinned[1]
+
+    def pin(self, request, response):
+        if settings.DB_REPLICAS and request.method not in SAFE_METHODS and response.status_code < 400:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.DB_REPLICA_PIN_SECONDS, httponly=True, samesite='Lax'
+            )
+            user = request_user(request)
+            if user is not None:
+                cache.set(user_pin_key(user.pk), 1, timeout=settings.DB_REPLICA_PIN_SECONDS)
+        return response
+
+
+# API JSON and event streams only. HTML pages (admin, browsable API) carry
+# CSRF tokens next to reflected input, which compression leaks (BREACH).
+COMPRESSIBLE_TYPES = ('application/json', 'text/event-stream')
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compresses API responses with the best encoding the client accepts (zstd,
+    br or gzip). Bodies under COMPRESSION['MIN_SIZE'] bytes are sent as is,
+    streamed responses are compressed chunk by chunk, and compressed bodies of
+    responses with an ETag (e.g. the exercise catalog) are cached. Paths in
+    COMPRESSION['EXCLUDE_PATHS'] (the auth endpoints, which return tokens)
+    are never compressed.
+    """
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding') or not self.compressible(request, response):
+            return response
+        min_size = settings.COMPRESSION['MIN_SIZE']
+        if response.streaming:
+            # Only skipped when the view announced a small length
+            if int(response.get('Content-Length') or min_size) < min_size:
+                return response
+        elif len(response.content) < min_size:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate_encoding(request.META.get('HTTP_ACCEPT_ENCODING'))
+        if encoding is None:
+            return response
+        compress, stream = CODECS[encoding]
+
+        if response.streaming:
+            response.streaming_content = self.compress_stream(response, stream())
+            del response.headers['Content-Length']
+        else:
+            compressed = self.compress_body(request, response, encoding, compress)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # The compressed body is a different representation of the resource
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def compressible(self, request, response):
+        if request.path.startswith(tuple(settings.COMPRESSION['EXCLUDE_PATHS'])):
+            return False
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        return content_type in COMPRESSIBLE_TYPES
+
+    def compress_body(self, request, response, encoding, compress):
+        etag = response.get('ETag')
+        if request.method != 'GET' or response.status_code != 200 or not etag:
+            return compress(response.content)
+        # Same URL, representation and ETag means the same body
+        digest = hashlib.sha256(
+            f"{request.get_full_path()}|{response.get('Content-Type')}|{etag}".encode()
+        ).hexdigest()
+        cache_key = f'compressed-response:{encoding}:{digest}'
+        compressed = cache.get(cache_key)
+        if compressed is None:
+            compressed = compress(response.content)
+            cache.set(cache_key, compressed, settings.COMPRESSION['CACHE_TIMEOUT'])
+        return compressed
+
+    def compress_stream(self, response, compressor):
+        # Pull the iterator into this scope in case streaming_content is replaced later
+        chunks = response.streaming_content
+        if response.is_async:
+            async def compressed():
+                async for chunk in chunks:
+                    data = compressor.compress(chunk)
+                    if data:
+                        yield data
+                yield compressor.finish()
+        else:
+            def compressed():
+                for chunk in chunks:
+                    data = compressor.compress(chunk)
+                    if data:
+                        yield data
+                yield compressor.finish()
+        return compressed()
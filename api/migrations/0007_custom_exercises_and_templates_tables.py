@@ -0,0 +1,174 @@
+# Generated by Django 5.1.3 on 2026-10-19 14:56
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+
+def parse_timestamp(value):
+    return (parse_datetime(value) if value else None) or timezone.now()
+
+
+def remap_custom_sets(sets, id_map):
+    for set_data in sets or []:
+        if set_data.get('is_custom') and set_data.get('exercise_id') in id_map:
+            set_data['exercise_id'] = id_map[set_data['exercise_id']]
+
+
+def move_to_tables(apps, schema_editor):
+    """
+    Copy custom exercises and templates out of the user row. Their ids become
+    table primary keys, so every reference (workout and template sets, PR keys,
+    workout template ids) is rewritten to the new ids.
+    """
+    User = apps.get_model('api', 'User')
+    CustomExercise = apps.get_model('api', 'CustomExercise')
+    Template = apps.get_model('api', 'Template')
+
+    # In id order, so the new ids follow signup order on every database
+    rows = User.objects.order_by('id').values_list(
+        'id', 'custom_exercises_json', 'templates_json', 'workouts', 'personal_records'
+    )
+    for user_id, custom_exercises, templates, workouts, personal_records in rows:
+        exercise_ids = {}
+        for exercise in custom_exercises or []:
+            created = CustomExercise.objects.create(
+                user_id=user_id,
+                name=exercise['name'],
+                description=exercise.get('description') or '',
+                primary_muscle=exercise['primary_muscle'],
+                secondary_muscle=exercise.get('secondary_muscle'),
+                tertiary_muscle=exercise.get('tertiary_muscle'),
+                exercise_type=exercise['exercise_type'],
+                created_at=parse_timestamp(exercise.get('created_at')),
+                updated_at=parse_timestamp(exercise.get('updated_at')),
+            )
+            # Old ids were not guaranteed unique; the first exercise wins
+            exercise_ids.setdefault(exercise['id'], created.pk)
+
+        template_ids = {}
+        for template in templates or []:
+            remap_custom_sets(template.get('exercises'), exercise_ids)
+            created = Template.objects.create(
+                user_id=user_id,
+                name=template['name'],
+                description=template.get('description') or '',
+                exercises=template.get('exercises') or [],
+                created_at=parse_timestamp(template.get('created_at')),
+                updated_at=parse_datetime(template['updated_at']) if template.get('updated_at') else None,
+            )
+            template_ids.setdefault(template['id'], created.pk)
+
+        for workout in workouts or []:
+            remap_custom_sets(workout.get('exercises'), exercise_ids)
+            if workout.get('template_id') in template_ids:
+                workout['template_id'] = template_ids[workout['template_id']]
+
+        records = {}
+        for key, value in (personal_records or {}).items():
+            if key.startswith('custom_') and int(key[len('custom_'):]) in exercise_ids:
+                key = f"custom_{exercise_ids[int(key[len('custom_'):])]}"
+            records[key] = value
+
+        User.objects.filter(pk=user_id).update(workouts=workouts, personal_records=records)
+
+
+def move_to_user_row(apps, schema_editor):
+    """Reverse of move_to_tables. Table ids are kept as the JSON ids."""
+    User = apps.get_model('api', 'User')
+    CustomExercise = apps.get_model('api', 'CustomExercise')
+    Template = apps.get_model('api', 'Template')
+
+    for user_id in User.objects.values_list('id', flat=True):
+        custom_exercises = [{
+            'id': exercise.pk,
+            'name': exercise.name,
+            'description': exercise.description,
+            'primary_muscle': exercise.primary_muscle,
+            'secondary_muscle': exercise.secondary_muscle,
+            'tertiary_muscle': exercise.tertiary_muscle,
+            'exercise_type': exercise.exercise_type,
+            'created_at': exercise.created_at.isoformat(),
+            'updated_at': exercise.updated_at.isoformat(),
+        } for exercise in CustomExercise.objects.filter(user_id=user_id).order_by('id')]
+        templates = []
+        for template in Template.objects.filter(user_id=user_id).order_by('id'):
+            data = {
+                'id': template.pk,
+                'name': template.name,
+                'description': template.description,
+                'created_at': template.created_at.isoformat(),
+                'exercises': template.exercises,
+            }
+            if template.updated_at:
+                data['updated_at'] = template.updated_at.isoformat()
+            templates.append(data)
+        User.objects.filter(pk=user_id).update(
+            custom_exercises_json=custom_exercises, templates_json=templates
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_job'),
+    ]
+
+    operations = [
+        # Free the names for the reverse relations of the new tables
+        migrations.RenameField(
+            model_name='user',
+            old_name='custom_exercises',
+            new_name='custom_exercises_json',
+        ),
+        migrations.RenameField(
+            model_name='user',
+            old_name='templates',
+            new_name='templates_json',
+        ),
+        migrations.CreateModel(
+            name='CustomExercise',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('description', models.TextField(blank=True, default='')),
+                ('primary_muscle', models.CharField(choices=[('Upper Chest', 'Upper Chest'), ('Middle Chest', 'Middle Chest'), ('Lower Chest', 'Lower Chest'), ('Front Delts', 'Front Delts'), ('Side Delts', 'Side Delts'), ('Rear Delts', 'Rear Delts'), ('Traps', 'Traps'), ('Lats', 'Lats'), ('Rhomboids', 'Rhomboids'), ('Erector Spinae', 'Erector Spinae'), ('Long Head of Triceps', 'Long Head of Triceps'), ('Lateral Head of Triceps', 'Lateral Head of Triceps'), ('Medial Head of Triceps', 'Medial Head of Triceps'), ('Long Head of Biceps', 'Long Head of Biceps'), ('Short Head of Biceps', 'Short Head of Biceps'), ('Forearms', 'Forearms'), ('Abs', 'Abs'), ('Obliques', 'Obliques'), ('Hamstrings', 'Hamstrings'), ('Quadriceps', 'Quadriceps'), ('Calves', 'Calves'), ('Glutes', 'Glutes'), ('Hip Flexors', 'Hip Flexors'), ('Adductors', 'Adductors'), ('Abductors', 'Abductors'), ('Serratus Anterior', 'Serratus Anterior'), ('Transverse Abdominis', 'Transverse Abdominis')], max_length=50)),
+                ('secondary_muscle', models.CharField(blank=True, choices=[('Upper Chest', 'Upper Chest'), ('Middle Chest', 'Middle Chest'), ('Lower Chest', 'Lower Chest'), ('Front Delts', 'Front Delts'), ('Side Delts', 'Side Delts'), ('Rear Delts', 'Rear Delts'), ('Traps', 'Traps'), ('Lats', 'Lats'), ('Rhomboids', 'Rhomboids'), ('Erector Spinae', 'Erector Spinae'), ('Long Head of Triceps', 'Long Head of Triceps'), ('Lateral Head of Triceps', 'Lateral Head of Triceps'), ('Medial Head of Triceps', 'Medial Head of Triceps'), ('Long Head of Biceps', 'Long Head of Biceps'), ('Short Head of Biceps', 'Short Head of Biceps'), ('Forearms', 'Forearms'), ('Abs', 'Abs'), ('Obliques', 'Obliques'), ('Hamstrings', 'Hamstrings'), ('Quadriceps', 'Quadriceps'), ('Calves', 'Calves'), ('Glutes', 'Glutes'), ('Hip Flexors', 'Hip Flexors'), ('Adductors', 'Adductors'), ('Abductors', 'Abductors'), ('Serratus Anterior', 'Serratus Anterior'), ('Transverse Abdominis', 'Transverse Abdominis')], max_length=50, null=True)),
+                ('tertiary_muscle', models.CharField(blank=True, choices=[('Upper Chest', 'Upper Chest'), ('Middle Chest', 'Middle Chest'), ('Lower Chest', 'Lower Chest'), ('Front Delts', 'Front Delts'), ('Side Delts', 'Side Delts'), ('Rear Delts', 'Rear Delts'), ('Traps', 'Traps'), ('Lats', 'Lats'), ('Rhomboids', 'Rhomboids'), ('Erector Spinae', 'Erector Spinae'), ('Long Head of Triceps', 'Long Head of Triceps'), ('Lateral Head of Triceps', 'Lateral Head of Triceps'), ('Medial Head of Triceps', 'Medial Head of Triceps'), ('Long Head of Biceps', 'Long Head of Biceps'), ('Short Head of Biceps', 'Short Head of Biceps'), ('Forearms', 'Forearms'), ('Abs', 'Abs'), ('Obliques', 'Obliques'), ('Hamstrings', 'Hamstrings'), ('Quadriceps', 'Quadriceps'), ('Calves', 'Calves'), ('Glutes', 'Glutes'), ('Hip Flexors', 'Hip Flexors'), ('Adductors', 'Adductors'), ('Abductors', 'Abductors'), ('Serratus Anterior', 'Serratus Anterior'), ('Transverse Abdominis', 'Transverse Abdominis')], max_length=50, null=True)),
+                ('exercise_type', models.CharField(choices=[('Dumbbell Exercises', 'Dumbbell Exercises'), ('Barbell Exercises', 'Barbell Exercises'), ('Machine-Based Workouts', 'Machine-Based Workouts'), ('Bodyweight Training', 'Bodyweight Training'), ('Kettlebell Workouts', 'Kettlebell Workouts'), ('Resistance Band Training', 'Resistance Band Training'), ('Cable Exercises', 'Cable Exercises'), ('Cardiovascular Exercise', 'Cardiovascular Exercise'), ('Yoga and Flexibility Workouts', 'Yoga and Flexibility Workouts')], max_length=100)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='custom_exercises', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Template',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('description', models.TextField(blank=True, default='')),
+                ('exercises', models.JSONField(blank=True, default=list)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='templates', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.RunPython(move_to_tables, move_to_user_row),
+        migrations.RemoveField(
+            model_name='user',
+            name='custom_exercises_json',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='templates_json',
+        ),
+    ]
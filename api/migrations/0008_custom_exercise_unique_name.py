@@ -0,0 +1,40 @@
+# Generated by Django 5.1.3 on 2026-10-19 14:57
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+def rename_duplicate_names(apps, schema_editor):
+    """
+    Exercises created before the constraint may differ only by case or
+    surrounding whitespace; number the later ones so the index can be built
+    """
+    CustomExercise = apps.get_model('api', 'CustomExercise')
+    seen = set()
+    for exercise in CustomExercise.objects.order_by('user_id', 'id'):
+        name = exercise.name.strip()
+        candidate, number = name, 1
+        while (exercise.user_id, candidate.lower()) in seen:
+            number += 1
+            suffix = f' ({number})'
+            # Shorten the name so the numbered one still fits the column
+            candidate = name[:100 - len(suffix)] + suffix
+        seen.add((exercise.user_id, candidate.lower()))
+        if candidate != exercise.name:
+            exercise.name = candidate
+            exercise.save(update_fields=['name'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_custom_exercises_and_templates_tables'),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_duplicate_names, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='customexercise',
+            constraint=models.UniqueConstraint(models.F('user'), django.db.models.functions.text.Lower('name'), name='unique_custom_exercise_name_per_user'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.3 on 2026-10-19 14:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_custom_exercise_unique_name'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='exerciselist',
+            index=models.Index(fields=['primary_muscle', 'name'], name='exercise_primary_muscle_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exerciselist',
+            index=models.Index(fields=['secondary_muscle', 'name'], name='exercise_secondary_muscle_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exerciselist',
+            index=models.Index(fields=['tertiary_muscle', 'name'], name='exercise_tertiary_muscle_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exerciselist',
+            index=models.Index(fields=['exercise_type', 'name'], name='exercise_type_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.3 on 2026-10-19 15:03
+
+import api.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_exerciselist_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', api.models.UserManager()),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.3 on 2026-10-19 15:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_user_manager'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkoutArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('workouts', models.JSONField(blank=True, default=list)),
+                ('workout_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='workout_archives', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['user', 'month'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'month'), name='unique_workout_archive_month')],
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.1.3 on 2026-10-19 15:24
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_workout_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkoutSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('description', models.TextField(blank=True, default='')),
+                ('set_count', models.PositiveIntegerField(default=0)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='workout_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SessionSet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('exercise_id', models.PositiveIntegerField()),
+                ('is_custom', models.BooleanField(default=False)),
+                ('name', models.CharField(max_length=100)),
+                ('set_number', models.PositiveIntegerField()),
+                ('reps', models.PositiveIntegerField(blank=True, null=True)),
+                ('weight', models.FloatField(blank=True, null=True)),
+                ('duration_minutes', models.FloatField(blank=True, null=True)),
+                ('distance_meters', models.FloatField(blank=True, null=True)),
+                ('volume', models.FloatField(default=0)),
+                ('one_rm', models.FloatField(default=0)),
+                ('total_volume', models.FloatField(default=0)),
+                ('total_duration', models.FloatField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sets', to='api.workoutsession')),
+            ],
+            options={
+                'ordering': ['session', 'position'],
+                'indexes': [models.Index(fields=['session', 'is_custom', 'exercise_id', 'position'], name='session_set_exercise_idx')],
+                'constraints': [models.UniqueConstraint(fields=('session', 'position'), name='unique_session_set_position')],
+            },
+        ),
+    ]
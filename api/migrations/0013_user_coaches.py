@@ -0,0 +1,19 @@
+# Generated by Django 5.1.3 on 2026-10-19 15:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_workout_sessions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='coaches',
+            field=models.ManyToManyField(blank=True, related_name='athletes', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
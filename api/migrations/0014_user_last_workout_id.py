@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-19 15:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_user_coaches'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='last_workout_id',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
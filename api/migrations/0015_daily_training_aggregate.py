@@ -0,0 +1,61 @@
+# Generated by Django 5.1.3 on 2026-10-19 15:34
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from api.aggregates import workout_day, workout_totals
+
+
+def build_daily_aggregates(apps, schema_editor):
+    User = apps.get_model('api', 'User')
+    WorkoutArchive = apps.get_model('api', 'WorkoutArchive')
+    DailyTrainingAggregate = apps.get_model('api', 'DailyTrainingAggregate')
+    alias = schema_editor.connection.alias
+    users = User.objects.using(alias)
+    for user_id in list(users.values_list('id', flat=True)):
+        workouts = users.filter(pk=user_id).values_list('workouts', flat=True).get() or []
+        live_ids = {workout['id'] for workout in workouts}
+        for archived in WorkoutArchive.objects.using(alias).filter(user_id=user_id).values_list('workouts', flat=True):
+            workouts += [workout for workout in archived if workout['id'] not in live_ids]
+
+        days = defaultdict(lambda: defaultdict(float))
+        for workout in workouts:
+            for field, value in workout_totals(workout).items():
+                days[workout_day(workout)][field] += value
+        DailyTrainingAggregate.objects.using(alias).bulk_create([
+            DailyTrainingAggregate(
+                user_id=user_id, day=day, sessions=int(totals['sessions']), sets=int(totals['sets']),
+                volume=totals['volume'], duration_minutes=totals['duration_minutes']
+            )
+            for day, totals in days.items()
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_user_last_workout_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyTrainingAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('sessions', models.PositiveIntegerField(default=0)),
+                ('sets', models.PositiveIntegerField(default=0)),
+                ('volume', models.FloatField(default=0)),
+                ('duration_minutes', models.FloatField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_aggregates', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['user', 'day'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'day'), name='unique_daily_training_day')],
+            },
+        ),
+        migrations.RunPython(build_daily_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.1.3 on 2026-10-19 15:36
+
+from collections import defaultdict
+
+import numpy as np
+from django.db import migrations, models
+
+from api.aggregates import encode_muscle_sets, workout_day, workout_muscle_sets
+from api.similarity import EXERCISE_FIELDS, MUSCLE_AXIS, muscle_weights
+
+
+def build_muscle_sets(apps, schema_editor):
+    alias = schema_editor.connection.alias
+    User = apps.get_model('api', 'User')
+    ExerciseList = apps.get_model('api', 'ExerciseList')
+    CustomExercise = apps.get_model('api', 'CustomExercise')
+    WorkoutArchive = apps.get_model('api', 'WorkoutArchive')
+    DailyTrainingAggregate = apps.get_model('api', 'DailyTrainingAggregate')
+
+    catalog = list(ExerciseList.objects.using(alias).values(*EXERCISE_FIELDS))
+    catalog_weights = dict(zip((str(exercise['id']) for exercise in catalog), muscle_weights(catalog)))
+    users = User.objects.using(alias)
+    for user_id in list(users.values_list('id', flat=True)):
+        workouts = users.filter(pk=user_id).values_list('workouts', flat=True).get() or []
+        live_ids = {workout['id'] for workout in workouts}
+        for archived in WorkoutArchive.objects.using(alias).filter(user_id=user_id).values_list('workouts', flat=True):
+            workouts += [workout for workout in archived if workout['id'] not in live_ids]
+        if not workouts:
+            continue
+
+        custom = list(CustomExercise.objects.using(alias).filter(user_id=user_id).values(*EXERCISE_FIELDS))
+        weights = {
+            **catalog_weights,
+            **dict(zip((f"custom_{exercise['id']}" for exercise in custom), muscle_weights(custom))),
+        }
+        days = defaultdict(lambda: np.zeros(len(MUSCLE_AXIS), dtype=np.float32))
+        for workout in workouts:
+            days[workout_day(workout)] += workout_muscle_sets(workout, weights)
+        for day, vector in days.items():
+            DailyTrainingAggregate.objects.using(alias).filter(user_id=user_id, day=day).update(
+                muscle_sets=encode_muscle_sets(vector)
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_daily_training_aggregate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailytrainingaggregate',
+            name='muscle_sets',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.RunPython(build_muscle_sets, migrations.RunPython.noop),
+    ]
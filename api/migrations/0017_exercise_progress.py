@@ -0,0 +1,55 @@
+# Generated by Django 5.1.3 on 2026-10-19 15:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from api.progression import recent_sessions, workout_summaries
+
+
+def build_progress(apps, schema_editor):
+    alias = schema_editor.connection.alias
+    User = apps.get_model('api', 'User')
+    WorkoutArchive = apps.get_model('api', 'WorkoutArchive')
+    ExerciseProgress = apps.get_model('api', 'ExerciseProgress')
+
+    users = User.objects.using(alias)
+    for user_id in list(users.values_list('id', flat=True)):
+        workouts = users.filter(pk=user_id).values_list('workouts', flat=True).get() or []
+        live_ids = {workout['id'] for workout in workouts}
+        for archived in WorkoutArchive.objects.using(alias).filter(user_id=user_id).values_list('workouts', flat=True):
+            workouts += [workout for workout in archived if workout['id'] not in live_ids]
+
+        sessions = {}
+        for workout in workouts:
+            for key, summary in workout_summaries(workout).items():
+                sessions.setdefault(key, []).append(summary)
+        ExerciseProgress.objects.using(alias).bulk_create([
+            ExerciseProgress(user_id=user_id, exercise_key=key, sessions=recent_sessions(summaries))
+            for key, summaries in sessions.items()
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_daily_muscle_sets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExerciseProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('exercise_key', models.CharField(max_length=20)),
+                ('sessions', models.JSONField(blank=True, default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exercise_progress', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['user', 'exercise_key'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'exercise_key'), name='unique_exercise_progress')],
+            },
+        ),
+        migrations.RunPython(build_progress, migrations.RunPython.noop),
+    ]
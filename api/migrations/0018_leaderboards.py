@@ -0,0 +1,43 @@
+# Generated by Django 5.1.3 on 2026-10-19 15:41
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_exercise_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='leaderboard_name',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='leaderboard_opt_in',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(choices=[('one_rm', 'Max 1RM'), ('volume', 'Max volume in a workout'), ('weekly_volume', 'Volume in a week')], max_length=20)),
+                ('week', models.DateField(blank=True, null=True)),
+                ('value', models.FloatField()),
+                ('achieved_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('exercise', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to='api.exerciselist')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['exercise', 'metric', 'week', '-value', 'achieved_at', 'id'],
+                'indexes': [models.Index(fields=['exercise', 'metric', 'week', '-value', 'achieved_at', 'id'], name='leaderboard_rank_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('week__isnull', True)), fields=('user', 'exercise', 'metric'), name='unique_leaderboard_record'), models.UniqueConstraint(condition=models.Q(('week__isnull', False)), fields=('user', 'exercise', 'metric', 'week'), name='unique_leaderboard_week')],
+            },
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.1.3 on 2026-10-19 16:10
+
+from django.db import migrations, models
+
+
+def exercise_name_key(name):
+    # api.models.exercise_name_key as of this migration
+    return name.strip().casefold()
+
+
+def fill_name_keys(apps, schema_editor):
+    """
+    Fold every name in Python. Names that only differed by non-ASCII case
+    passed the old lower(name) index on SQLite; number the later ones like
+    0008 did
+    """
+    CustomExercise = apps.get_model('api', 'CustomExercise')
+    seen = set()
+    for exercise in CustomExercise.objects.order_by('user_id', 'id'):
+        name = exercise.name.strip()
+        candidate, number = name, 1
+        while (exercise.user_id, exercise_name_key(candidate)) in seen:
+            number += 1
+            suffix = f' ({number})'
+            # Shorten the name so the numbered one still fits the column
+            candidate = name[:100 - len(suffix)] + suffix
+        seen.add((exercise.user_id, exercise_name_key(candidate)))
+        exercise.name = candidate
+        exercise.name_key = exercise_name_key(candidate)
+        exercise.save(update_fields=['name', 'name_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_leaderboards'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customexercise',
+            name='name_key',
+            field=models.CharField(default='', editable=False, max_length=100),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_name_keys, migrations.RunPython.noop),
+        migrations.RemoveConstraint(
+            model_name='customexercise',
+            name='unique_custom_exercise_name_per_user',
+        ),
+        migrations.AddConstraint(
+            model_name='customexercise',
+            constraint=models.UniqueConstraint(fields=('user', 'name_key'), name='unique_custom_exercise_name_key_per_user'),
+        ),
+    ]
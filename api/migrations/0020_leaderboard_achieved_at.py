@@ -0,0 +1,47 @@
+# Generated by Django 5.1.3 on 2026-10-19 21:10
+
+from django.db import migrations
+
+from api.leaderboards import first_achieved, weekly_volumes
+
+
+# Entries used to be stamped with the time they were written; they now carry
+# the completion time of the workout that reached their value.
+def date_entries(apps, schema_editor):
+    alias = schema_editor.connection.alias
+    User = apps.get_model('api', 'User')
+    WorkoutArchive = apps.get_model('api', 'WorkoutArchive')
+    LeaderboardEntry = apps.get_model('api', 'LeaderboardEntry')
+
+    entries = LeaderboardEntry.objects.using(alias)
+    users = User.objects.using(alias)
+    for user_id in list(entries.order_by('user_id').values_list('user_id', flat=True).distinct()):
+        workouts = users.filter(pk=user_id).values_list('workouts', flat=True).get() or []
+        live_ids = {workout['id'] for workout in workouts}
+        for archived in WorkoutArchive.objects.using(alias).filter(user_id=user_id).values_list('workouts', flat=True):
+            workouts += [workout for workout in archived if workout['id'] not in live_ids]
+
+        user_entries = list(entries.filter(user_id=user_id))
+        record_achieved = first_achieved(workouts, {
+            (entry.exercise_id, entry.metric): entry.value for entry in user_entries if entry.week is None
+        })
+        _, week_achieved = weekly_volumes(workouts)
+        for entry in user_entries:
+            if entry.week is None:
+                achieved_at = record_achieved.get((entry.exercise_id, entry.metric))
+            else:
+                achieved_at = week_achieved.get((entry.exercise_id, entry.week))
+            if achieved_at is not None and achieved_at != entry.achieved_at:
+                entry.achieved_at = achieved_at
+                entry.save(update_fields=['achieved_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_custom_exercise_name_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(date_entries, migrations.RunPython.noop),
+    ]
@@ -1,15 +1,36 @@
+from datetime import date, timezone as dt_timezone
+
 from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager as BaseUserManager
 from django.utils import timezone
 
+from .stats import completed_between
+
+# JSON columns holding a user's whole training history. They can be megabytes,
+# so they are only loaded when accessed (or queried in the database, see
+# api/history.py) instead of on every authentication lookup.
+HISTORY_FIELDS = ('workouts', 'personal_records')
+
+class UserManager(BaseUserManager):
+    def get_queryset(self):
+        return super().get_queryset().defer(*HISTORY_FIELDS)
+
 class User(AbstractUser):
     email = models.EmailField(unique=True)
     google_id = models.CharField(max_length=255, null=True, blank=True)
-    custom_exercises = models.JSONField(default=list, blank=True)
     workouts = models.JSONField(default=list, blank=True)
-    templates = models.JSONField(default=list, blank=True)
     personal_records = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(default=timezone.now)
+    # Highest workout id handed out, so ids of deleted workouts are not reused
+    last_workout_id = models.PositiveIntegerField(default=0)
+    # Coaches can follow this user's training live (see api/events.py). Set in
+    # the Django admin; there is no API to manage coaches.
+    coaches = models.ManyToManyField('self', symmetrical=False, related_name='athletes', blank=True)
+    # Opted in to the public leaderboards (see api/leaderboards.py), under this name
+    leaderboard_opt_in = models.BooleanField(default=False)
+    leaderboard_name = models.CharField(max_length=50, blank=True)
+
+    objects = UserManager()
 
     # Make email the required field instead of username
     USERNAME_FIELD = 'email'
@@ -18,6 +39,25 @@ class User(AbstractUser):
     def __str__(self):
         return self.email
 
+    def workout_history(self, start=None, end=None):
+        """
+        Workouts completed in [start, end), all of them by default, in logging
+        order, including those moved to the archive (see api/archive.py). Only
+        the archive months overlapping the range are read.
+        """
+        workouts = self.workouts or []
+        live_ids = {workout['id'] for workout in workouts}
+        archived = [
+            workout
+            for archive in self.workout_archives.overlapping(start, end)
+            for workout in archive.workouts
+            # A copy saved back into the row after archiving wins
+            if workout['id'] not in live_ids and completed_between(workout, start, end)
+        ]
+        if start is not None or end is not None:
+            workouts = [workout for workout in workouts if completed_between(workout, start, end)]
+        return sorted(archived, key=lambda workout: workout['id']) + workouts
+
     # Update personal records for a given exercise if any records are broken
     def update_personal_records(self, exercise_id, exercise_data):
         """
@@ -117,6 +157,337 @@ class ExerciseList(models.Model):
         ordering = ['name']
         verbose_name = 'Exercise'
         verbose_name_plural = 'Exercises'
+        # Filters of the exercise picker (see ExerciseListView)
+        indexes = [
+            models.Index(fields=['primary_muscle', 'name'], name='exercise_primary_muscle_idx'),
+            models.Index(fields=['secondary_muscle', 'name'], name='exercise_secondary_muscle_idx'),
+            models.Index(fields=['tertiary_muscle', 'name'], name='exercise_tertiary_muscle_idx'),
+            models.Index(fields=['exercise_type', 'name'], name='exercise_type_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+def exercise_name_key(name):
+    """
+    Case-insensitive form of a custom exercise name. Folded in Python rather
+    than with the database's lower(), which only folds ASCII on SQLite.
+    """
+    return name.strip().casefold()
+
+
+# A user's own exercise, referenced from workouts and templates as
+# {"exercise_id": <id>, "is_custom": true}
+class CustomExercise(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='custom_exercises')
+    name = models.CharField(max_length=100)
+    # exercise_name_key(name), set on save
+    name_key = models.CharField(max_length=100, editable=False)
+    description = models.TextField(blank=True, default='')
+    primary_muscle = models.CharField(max_length=50, choices=MUSCLE_CHOICES)
+    secondary_muscle = models.CharField(max_length=50, choices=MUSCLE_CHOICES, blank=True, null=True)
+    tertiary_muscle = models.CharField(max_length=50, choices=MUSCLE_CHOICES, blank=True, null=True)
+    exercise_type = models.CharField(
+        max_length=100,
+        choices=[(t, t) for t in EXERCISE_TYPE_CHOICES]
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['id']
+        constraints = [
+            # Names are unique per user regardless of case; the index also
+            # serves the duplicate name check in CustomExerciseSerializer
+            models.UniqueConstraint(
+                fields=['user', 'name_key'], name='unique_custom_exercise_name_key_per_user'
+            ),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    def save(self, *args, **kwargs):
+        self.name_key = exercise_name_key(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'name_key'}
+        super().save(*args, **kwargs)
+
+
+class Template(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='templates')
+    name = models.CharField(max_length=100)
+    description = models.TextField(blank=True, default='')
+    # Sets in the same format as workout sets, without the calculated values
+    exercises = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return self.name
+
+    def to_dict(self):
+        """API representation of the template"""
+        data = {
+            'id': self.pk,
+            'name': self.name,
+            'description': self.description,
+            'created_at': self.created_at.isoformat(),
+            'exercises': self.exercises,
+        }
+        if self.updated_at:
+            data['updated_at'] = self.updated_at.isoformat()
+        return data
+
+
+class WorkoutSession(models.Model):
+    """
+    A workout in progress. Sets are logged one at a time as SessionSet rows and
+    the session becomes a workout in User.workouts when it is finished.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='workout_sessions')
+    name = models.CharField(max_length=100)
+    description = models.TextField(blank=True, default='')
+    set_count = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['id']
 
     def __str__(self):
         return self.name
+
+    def to_dict(self):
+        """API representation of the session with its sets so far"""
+        return {
+            'id': self.pk,
+            'name': self.name,
+            'description': self.description,
+            'started_at': self.started_at.isoformat(),
+            'updated_at': self.updated_at.isoformat(),
+            'exercises': [session_set.to_dict() for session_set in self.sets.all()],
+        }
+
+
+class SessionSet(models.Model):
+    """
+    One logged set of a WorkoutSession, with the same values as a set stored
+    in a workout
+    """
+    session = models.ForeignKey(WorkoutSession, on_delete=models.CASCADE, related_name='sets')
+    # Order in which the sets were logged, from 1
+    position = models.PositiveIntegerField()
+    exercise_id = models.PositiveIntegerField()
+    is_custom = models.BooleanField(default=False)
+    name = models.CharField(max_length=100)
+    set_number = models.PositiveIntegerField()
+    reps = models.PositiveIntegerField(null=True, blank=True)
+    weight = models.FloatField(null=True, blank=True)
+    duration_minutes = models.FloatField(null=True, blank=True)
+    distance_meters = models.FloatField(null=True, blank=True)
+    volume = models.FloatField(default=0)
+    one_rm = models.FloatField(default=0)
+    # Running totals of the exercise in this session, up to and including this set
+    total_volume = models.FloatField(default=0)
+    total_duration = models.FloatField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['session', 'position']
+        constraints = [
+            models.UniqueConstraint(fields=['session', 'position'], name='unique_session_set_position'),
+        ]
+        indexes = [
+            # Previous set of the same exercise, to continue numbering and totals
+            models.Index(fields=['session', 'is_custom', 'exercise_id', 'position'], name='session_set_exercise_idx'),
+        ]
+
+    def to_dict(self):
+        """The set in workout storage format"""
+        return {
+            'exercise_id': self.exercise_id,
+            'name': self.name,
+            'is_custom': self.is_custom,
+            'set_number': self.set_number,
+            'reps': self.reps,
+            'weight': self.weight,
+            'duration_minutes': self.duration_minutes,
+            'distance_meters': self.distance_meters,
+            'volume': self.volume,
+            'one_rm': self.one_rm,
+            'total_volume': self.total_volume,
+            'total_duration': self.total_duration,
+        }
+
+
+class Job(models.Model):
+    """
+    A unit of deferred work processed by the `run_jobs` worker (see api/jobs.py)
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100)
+    queue = models.CharField(max_length=50, default='default')
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['run_after', 'id']
+        indexes = [
+            models.Index(fields=['status', 'queue', 'run_after'], name='job_ready_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.status})'
+
+
+def month_start(moment):
+    """First day of the UTC month of ``moment``, which WorkoutArchive rows are keyed by"""
+    moment = moment.astimezone(dt_timezone.utc)
+    return date(moment.year, moment.month, 1)
+
+
+class WorkoutArchiveQuerySet(models.QuerySet):
+    def overlapping(self, start=None, end=None):
+        """Months that can hold workouts completed in [start, end), oldest first"""
+        archives = self.order_by('month')
+        if start is not None:
+            archives = archives.filter(month__gte=month_start(start))
+        if end is not None:
+            archives = archives.filter(month__lte=month_start(end))
+        return archives
+
+
+class WorkoutArchive(models.Model):
+    """
+    Workouts of one user and calendar month (UTC) moved out of User.workouts
+    by the archive_workouts command. Personal records are not affected.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='workout_archives')
+    month = models.DateField()
+    workouts = models.JSONField(default=list, blank=True)
+    workout_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = WorkoutArchiveQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['user', 'month']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'month'], name='unique_workout_archive_month'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} {self.month:%Y-%m}'
+
+
+class DailyTrainingAggregate(models.Model):
+    """
+    Totals of one user's workouts completed on one day (UTC), kept up to date
+    on every workout write (see api/aggregates.py)
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_aggregates')
+    day = models.DateField()
+    sessions = models.PositiveIntegerField(default=0)
+    sets = models.PositiveIntegerField(default=0)
+    volume = models.FloatField(default=0)
+    duration_minutes = models.FloatField(default=0)
+    # Weighted sets per muscle, float32 over the MUSCLE_CHOICES axis
+    muscle_sets = models.BinaryField(default=b'')
+
+    class Meta:
+        ordering = ['user', 'day']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day'], name='unique_daily_training_day'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} {self.day}'
+
+
+class ExerciseProgress(models.Model):
+    """
+    Summaries of a user's most recent sessions of one exercise, kept up to
+    date on every workout write, for next-session suggestions (see
+    api/progression.py)
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='exercise_progress')
+    # Keyed like personal records, e.g. "12" or "custom_3"
+    exercise_key = models.CharField(max_length=20)
+    # Oldest first
+    sessions = models.JSONField(default=list, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['user', 'exercise_key']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'exercise_key'], name='unique_exercise_progress'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} {self.exercise_key}'
+
+
+class LeaderboardEntry(models.Model):
+    """
+    One opted-in user's standing on the leaderboard of a catalog exercise,
+    kept up to date on every workout write (see api/leaderboards.py)
+    """
+    METRIC_CHOICES = [
+        ('one_rm', 'Max 1RM'),
+        ('volume', 'Max volume in a workout'),
+        ('weekly_volume', 'Volume in a week'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='leaderboard_entries')
+    exercise = models.ForeignKey(ExerciseList, on_delete=models.CASCADE, related_name='leaderboard_entries')
+    metric = models.CharField(max_length=20, choices=METRIC_CHOICES)
+    # Monday of the week for weekly metrics, empty for all-time records
+    week = models.DateField(null=True, blank=True)
+    value = models.FloatField()
+    # Completion time of the workout that reached the value; the earlier entry ranks first on ties
+    achieved_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['exercise', 'metric', 'week', '-value', 'achieved_at', 'id']
+        indexes = [
+            models.Index(
+                fields=['exercise', 'metric', 'week', '-value', 'achieved_at', 'id'],
+                name='leaderboard_rank_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'exercise', 'metric'],
+                condition=models.Q(week__isnull=True),
+                name='unique_leaderboard_record',
+            ),
+            models.UniqueConstraint(
+                fields=['user', 'exercise', 'metric', 'week'],
+                condition=models.Q(week__isnull=False),
+                name='unique_leaderboard_week',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user} {self.exercise_id} {self.metric}'
@@ -0,0 +1,202 @@
+"""
+Progressive-overload suggestions for the next session of an exercise.
+
+For every exercise a user trains, ExerciseProgress keeps a summary of the
+last RECENT_SESSIONS sessions: top weight, reps achieved on every set at that
+weight, reps missed against the best of those sets, and best estimated 1RM.
+``update_progress`` maintains it on every workout write (api/workouts.py),
+so suggesting needs one query and no history scan.
+
+The rules are a double progression:
+- every top set reached the target reps without missed reps: add weight
+- e1RM fell over the last three sessions, or the last two sessions at the
+  same weight both fell short: deload by DELOAD_FACTOR
+- otherwise: keep the weight and add a rep, up to the target
+"""
+import numpy as np
+from django.db import transaction
+
+from .models import ExerciseProgress
+from .stats import set_exercise_key, workout_timestamp
+
+RECENT_SESSIONS = 5
+DELOAD_FACTOR = 0.9
+# Relative weight increase, rounded to the plate step and at least one step
+INCREASE_FACTOR = 0.025
+WEIGHT_STEP = 0.5
+
+
+def round_weight(weight):
+    return round(round(weight / WEIGHT_STEP) * WEIGHT_STEP, 2)
+
+
+def session_summary(workout, sets):
+    """Summary of the sets of one exercise in one workout, or None without weighted sets"""
+    weighted = [set_data for set_data in sets if set_data.get('weight')]
+    if not weighted:
+        return None
+    top_weight = max(set_data['weight'] for set_data in weighted)
+    top_reps = [set_data.get('reps') or 0 for set_data in weighted if set_data['weight'] == top_weight]
+    best_reps = max(top_reps)
+    return {
+        'workout_id': workout['id'],
+        'timestamp': workout_timestamp(workout),
+        'top_weight': top_weight,
+        'reps': min(top_reps),
+        'best_reps': best_reps,
+        'sets': len(top_reps),
+        'missed_reps': sum(best_reps - reps for reps in top_reps),
+        'e1rm': max(set_data.get('one_rm') or 0 for set_data in weighted),
+    }
+
+
+def workout_summaries(workout):
+    """{exercise key: session summary} of a workout's weighted exercises"""
+    by_exercise = {}
+    for set_data in workout.get('exercises', []):
+        by_exercise.setdefault(set_exercise_key(set_data), []).append(set_data)
+    summaries = {key: session_summary(workout, sets) for key, sets in by_exercise.items()}
+    return {key: summary for key, summary in summaries.items() if summary is not None}
+
+
+def recent_sessions(sessions):
+    """The newest RECENT_SESSIONS summaries, oldest first"""
+    ordered = sorted(sessions, key=lambda session: (session['timestamp'], session['workout_id']))
+    return ordered[-RECENT_SESSIONS:]
+
+
+def rebuild_sessions(user, key):
+    """Summaries of one exercise from the whole history"""
+    sessions = []
+    for workout in user.workout_history():
+        summary = workout_summaries(workout).get(key)
+        if summary is not None:
+            sessions.append(summary)
+    return recent_sessions(sessions)
+
+
+def update_progress(user, old=None, new=None):
+    """
+    Replace ``old``'s sessions (either may be None) with ``new``'s. An
+    exercise is rebuilt from the history only when removing a session would
+    leave fewer than RECENT_SESSIONS while older ones may exist.
+    """
+    old_summaries = workout_summaries(old) if old is not None else {}
+    new_summaries = workout_summaries(new) if new is not None else {}
+    keys = set(old_summaries) | set(new_summaries)
+    if not keys:
+        return
+
+    with transaction.atomic():
+        existing = {
+            progress.exercise_key: progress
+            for progress in ExerciseProgress.objects.select_for_update().filter(
+                user_id=user.pk, exercise_key__in=keys
+            )
+        }
+        for key in keys:
+            progress = existing.get(key) or ExerciseProgress(user_id=user.pk, exercise_key=key)
+            sessions = progress.sessions
+            if key in old_summaries:
+                remaining = [session for session in sessions if session['workout_id'] != old['id']]
+                if len(remaining) < len(sessions) and len(sessions) >= RECENT_SESSIONS:
+                    # A session dropped out of a full window; an older one may move up
+                    progress.sessions = rebuild_sessions(user, key)
+                    progress.save()
+                    continue
+                sessions = remaining
+            if key in new_summaries:
+                sessions = sessions + [new_summaries[key]]
+            progress.sessions = recent_sessions(sessions)
+            if progress.sessions:
+                progress.save()
+            elif progress.pk:
+                progress.delete()
+
+
+def e1rm_trend(sessions):
+    """Least-squares slope of e1RM per session"""
+    if len(sessions) < 2:
+        return 0.0
+    e1rm = np.array([session['e1rm'] for session in sessions], dtype=np.float64)
+    return float(np.polyfit(np.arange(len(e1rm)), e1rm, 1)[0])
+
+
+def suggest(sessions, target_reps=None):
+    """
+    Top-set weight and reps for the next session, or None without history.
+    ``target_reps`` defaults to the best reps of the last session.
+    """
+    if not sessions:
+        return None
+    last = sessions[-1]
+    target = target_reps or last['best_reps']
+    weight = last['top_weight']
+
+    recent_e1rm = [session['e1rm'] for session in sessions[-3:]]
+    declining = len(recent_e1rm) == 3 and recent_e1rm[0] > recent_e1rm[1] > recent_e1rm[2]
+    stalled = len(sessions) >= 2 and all(
+        session['top_weight'] == weight and (session['reps'] < target or session['missed_reps'])
+        for session in sessions[-2:]
+    )
+
+    if last['reps'] >= target and not last['missed_reps']:
+        weight = round_weight(max(weight * (1 + INCREASE_FACTOR), weight + WEIGHT_STEP))
+        reps, reason = target, 'increase_weight'
+    elif declining or stalled:
+        weight = round_weight(weight * DELOAD_FACTOR)
+        reps, reason = target, 'deload'
+    else:
+        reps, reason = min(target, last['reps'] + 1), 'add_reps'
+
+    return {
+        'weight': weight,
+        'reps': reps,
+        'reason': reason,
+        'last_weight': last['top_weight'],
+        'last_reps': last['reps'],
+        'e1rm_trend': round(e1rm_trend(sessions), 2),
+    }
+
+
+def template_suggestions(user, template_sets):
+    """
+    Suggested weight and reps for every weighted set of a template. One
+    suggestion is made per exercise, from its top set in the template (the
+    first of the heaviest). Sets at that weight take the suggested reps;
+    lighter sets (warm-ups, back-off sets) keep their template reps and their
+    weight ratio to the top set.
+    """
+    keys = {set_exercise_key(set_data) for set_data in template_sets}
+    sessions = dict(
+        ExerciseProgress.objects.filter(user_id=user.pk, exercise_key__in=keys).values_list(
+            'exercise_key', 'sessions'
+        )
+    )
+    top_sets = {}
+    for set_data in template_sets:
+        key = set_exercise_key(set_data)
+        if set_data.get('weight') and set_data['weight'] > top_sets.get(key, {}).get('weight', 0):
+            top_sets[key] = set_data
+    exercise_suggestions = {
+        key: suggest(sessions[key], top_set.get('reps'))
+        for key, top_set in top_sets.items()
+        if key in sessions
+    }
+
+    suggestions = []
+    for index, set_data in enumerate(template_sets):
+        key = set_exercise_key(set_data)
+        suggestion = exercise_suggestions.get(key)
+        if not set_data.get('weight') or suggestion is None:
+            continue
+        top_weight = top_sets[key]['weight']
+        suggestions.append({
+            'index': index,
+            'exercise_id': set_data['exercise_id'],
+            'is_custom': set_data.get('is_custom', False),
+            **suggestion,
+            'weight': round_weight(suggestion['weight'] * set_data['weight'] / top_weight),
+            'reps': suggestion['reps'] if set_data['weight'] == top_weight else set_data.get('reps'),
+        })
+    return suggestions
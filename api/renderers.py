@@ -0,0 +1,39 @@
+"""
+JSON rendering with orjson, several times faster than the stdlib json module
+on large responses such as the profile and workout history. Falls back to
+DRF's renderer when orjson is not installed or for output it cannot produce
+(indented or ASCII-only, integers beyond 64 bits). NaN and Infinity, which
+strict mode rejects, are written as null.
+"""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    # Non-string keys (e.g. per-set error indexes) become strings like in json.dumps;
+    # aware UTC datetimes end in "Z" like DRF's encoder writes them
+    options = (orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z) if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        if (
+            orjson is None or self.ensure_ascii
+            or self.get_indent(accepted_media_type, renderer_context) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Types orjson does not know (Decimal, lazy strings, timedelta...)
+        # are converted the same way as by DRF's encoder
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=self.options)
+        except TypeError:
+            # orjson.JSONEncodeError, e.g. for an int beyond 64 bits such as unbounded reps
+            return super().render(data, accepted_media_type, renderer_context)
+        # Keep the output a strict JavaScript subset, like JSONRenderer
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
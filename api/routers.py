@@ -0,0 +1,57 @@
+"""
+Primary/replica database routing.
+
+Reads go to a random replica only while replica reads are allowed, which
+ReplicaPinningMiddleware (api/middleware.py) does for safe requests of
+clients and users that have not written recently. Writes, reads inside a transaction
+and everything outside a request (job worker, management commands) use the
+primary.
+"""
+import contextvars
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias.startswith('replica_')]
+
+
+@contextmanager
+def replica_reads(allowed=True):
+    """
+    Allow (or forbid) reading from replicas in this block. ``allowed`` can be a
+    callable, asked at every read, for conditions only known later in the
+    request (such as who the user is).
+    """
+    token = _replica_reads.set(allowed)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        allowed = _replica_reads.get()
+        # A transaction on the primary must see its own uncommitted writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block or not (allowed() if callable(allowed) else allowed):
+            return DEFAULT_DB_ALIAS
+        replicas = replica_aliases()
+        return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the schema through replication (or, for local SQLite
+        # stand-ins, by copying the migrated primary file)
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,157 @@
+"""
+In-memory name search over the exercise catalog and users' custom exercises.
+
+The catalog index is built once per catalog version; each user's custom
+exercises get a small overlay index rebuilt when they change. A query is
+matched by, in order of preference: whole-name prefix, prefix of every query
+word against the name's words, and trigram similarity for typos.
+"""
+import re
+import threading
+from bisect import bisect_left
+from collections import OrderedDict, defaultdict
+
+from .catalog import VersionedCache, get_custom_exercises_version
+from .models import ExerciseList
+
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+# Minimum share of the query's trigrams found in a name for a fuzzy match
+FUZZY_THRESHOLD = 0.5
+
+SCORE_EXACT = 1.0
+SCORE_PREFIX = 0.9
+SCORE_TOKEN = 0.8
+# Fuzzy matches score their trigram similarity scaled into (0, SCORE_FUZZY]
+SCORE_FUZZY = 0.7
+
+EXERCISE_FIELDS = (
+    'id', 'name', 'primary_muscle', 'secondary_muscle', 'tertiary_muscle', 'exercise_type'
+)
+
+
+def normalize(text):
+    """Case-fold like exercise_name_key and collapse all but letters and digits of any script to spaces"""
+    return ' '.join(re.findall(r'\w+', text.casefold()))
+
+
+def trigrams(text):
+    grams = set()
+    for word in text.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def prefix_range(sorted_keys, prefix):
+    """Slice bounds of the keys starting with ``prefix``"""
+    start = bisect_left(sorted_keys, prefix)
+    end = bisect_left(sorted_keys, prefix + '\uffff', lo=start)
+    return start, end
+
+
+class ExerciseSearchIndex:
+    def __init__(self, exercises, is_custom=False):
+        self.entries = [dict(exercise, is_custom=is_custom) for exercise in exercises]
+        self.names = [normalize(entry['name']) for entry in self.entries]
+
+        # Sorted (name, position) and (word, position) pairs for prefix lookups
+        names = sorted((name, position) for position, name in enumerate(self.names))
+        self.name_keys = [name for name, _ in names]
+        self.name_positions = [position for _, position in names]
+        tokens = sorted(
+            (token, position)
+            for position, name in enumerate(self.names)
+            for token in set(name.split())
+        )
+        self.token_keys = [token for token, _ in tokens]
+        self.token_positions = [position for _, position in tokens]
+
+        self.name_trigrams = [trigrams(name) for name in self.names]
+        self.trigram_postings = defaultdict(list)
+        for position, grams in enumerate(self.name_trigrams):
+            for gram in grams:
+                self.trigram_postings[gram].append(position)
+
+    def search(self, query):
+        """Best score per matching entry as {position: (score, match)}"""
+        matches = {}
+        if not query:
+            return matches
+
+        start, end = prefix_range(self.name_keys, query)
+        for position in self.name_positions[start:end]:
+            exact = self.names[position] == query
+            matches[position] = (SCORE_EXACT, 'exact') if exact else (SCORE_PREFIX, 'prefix')
+
+        # Every query word must prefix some word of the name
+        candidates = None
+        for word in query.split():
+            start, end = prefix_range(self.token_keys, word)
+            found = set(self.token_positions[start:end])
+            candidates = found if candidates is None else candidates & found
+            if not candidates:
+                break
+        for position in candidates or ():
+            matches.setdefault(position, (SCORE_TOKEN, 'token'))
+
+        # Typo tolerance: count shared trigrams through the postings lists
+        query_grams = trigrams(query)
+        shared = defaultdict(int)
+        for gram in query_grams:
+            for position in self.trigram_postings.get(gram, ()):
+                shared[position] += 1
+        for position, count in shared.items():
+            if position in matches:
+                continue
+            # Names are usually longer than the query, so rank mainly on how much
+            # of the query was found and break ties on overall (Jaccard) overlap
+            containment = count / len(query_grams)
+            if containment >= FUZZY_THRESHOLD:
+                jaccard = count / (len(query_grams) + len(self.name_trigrams[position]) - count)
+                matches[position] = (SCORE_FUZZY * (0.8 * containment + 0.2 * jaccard), 'fuzzy')
+        return matches
+
+    def results(self, query):
+        return [
+            {**self.entries[position], 'score': round(score, 3), 'match': match}
+            for position, (score, match) in self.search(query).items()
+        ]
+
+
+def build_catalog_index():
+    return ExerciseSearchIndex(ExerciseList.objects.values(*EXERCISE_FIELDS))
+
+
+catalog_index = VersionedCache(build_catalog_index)
+
+# Most recently used custom exercise overlays, keyed by user id
+MAX_CUSTOM_OVERLAYS = 512
+_custom_overlays = OrderedDict()
+_custom_overlays_lock = threading.Lock()
+
+
+def get_custom_index(user):
+    version = get_custom_exercises_version(user.pk)
+    with _custom_overlays_lock:
+        cached = _custom_overlays.get(user.pk)
+        if cached and cached[0] == version:
+            _custom_overlays.move_to_end(user.pk)
+            return cached[1]
+
+    index = ExerciseSearchIndex(user.custom_exercises.values(*EXERCISE_FIELDS), is_custom=True)
+    with _custom_overlays_lock:
+        _custom_overlays[user.pk] = (version, index)
+        _custom_overlays.move_to_end(user.pk)
+        while len(_custom_overlays) > MAX_CUSTOM_OVERLAYS:
+            _custom_overlays.popitem(last=False)
+    return index
+
+
+def search_exercises(user, query, limit=DEFAULT_SEARCH_LIMIT):
+    """Catalog and custom exercises matching ``query``, best matches first"""
+    query = normalize(query)
+    results = catalog_index.get().results(query) + get_custom_index(user).results(query)
+    results.sort(key=lambda result: (-result['score'], result['name'].lower()))
+    return results[:limit]
@@ -1,14 +1,32 @@
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.duration import duration_iso_string
 from rest_framework import serializers
-from .models import User, ExerciseList, MUSCLE_CHOICES, EXERCISE_TYPE_CHOICES
+from rest_framework.fields import empty
+from .models import User, ExerciseList, CustomExercise, MUSCLE_CHOICES, EXERCISE_TYPE_CHOICES, exercise_name_key
 from dj_rest_auth.registration.serializers import RegisterSerializer
 from dj_rest_auth.serializers import LoginSerializer as BaseLoginSerializer
 
 class UserSerializer(serializers.ModelSerializer):
+    custom_exercises = serializers.SerializerMethodField()
+    templates = serializers.SerializerMethodField()
+    workouts = serializers.SerializerMethodField()
+
     class Meta:
         model = User
         fields = ('id', 'email', 'username', 'custom_exercises', 
-                 'workouts', 'templates', 'personal_records', 'created_at')
-        read_only_fields = ('id', 'created_at')
+                 'workouts', 'templates', 'personal_records', 'created_at',
+                 'leaderboard_opt_in', 'leaderboard_name')
+        read_only_fields = ('id', 'created_at', 'leaderboard_opt_in', 'leaderboard_name')
+
+    def get_custom_exercises(self, obj):
+        return CustomExerciseSerializer(obj.custom_exercises.all(), many=True).data
+
+    def get_templates(self, obj):
+        return [template.to_dict() for template in obj.templates.all()]
+
+    def get_workouts(self, obj):
+        return obj.workout_history()
 
 
 # TODO: Be able to verify emails!
@@ -52,6 +70,115 @@ class ExerciseListSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'description', 'primary_muscle', 
                  'secondary_muscle', 'tertiary_muscle', 'exercise_type') 
 
+def calculate_set_metrics(exercise_type, data):
+    """
+    Validate a set against its exercise type and fill in `volume` and `one_rm`
+    """
+    # Validate based on exercise type
+    if exercise_type in ['Dumbbell Exercises', 'Barbell Exercises', 'Machine-Based Workouts', 
+                       'Kettlebell Workouts', 'Resistance Band Training', 'Cable Exercises']:
+        if not data.get('reps'):
+            raise serializers.ValidationError("Reps are required for this exercise type")
+        
+        # Calculate volume and one_rm for weight-based exercises
+        if data.get('weight'):
+            # Volume = reps × weight
+            data['volume'] = float(data['reps']) * float(data['weight'])
+            
+            # Epley Formula for 1RM
+            # 1RM = weight × (36 / (37 - reps))
+            data['one_rm'] = float(data['weight']) * (36 / (37 - float(data['reps'])))
+        else:
+            data['volume'] = 0
+            data['one_rm'] = 0
+
+    elif exercise_type in ['Cardiovascular Exercise', 'Yoga and Flexibility Workouts']:
+        if not data.get('duration_minutes'):
+            raise serializers.ValidationError("Duration is required for this exercise type")
+        data['volume'] = 0
+        data['one_rm'] = 0
+    elif exercise_type == 'Bodyweight Training':
+        if not data.get('reps'):
+            raise serializers.ValidationError("Reps are required for bodyweight exercises")
+        # For bodyweight, volume is just the number of reps
+        data['volume'] = float(data['reps'])
+        data['one_rm'] = 0
+    return data
+
+def get_set_exercise(context, data):
+    """
+    Exercise referenced by a set: a catalog exercise or one of the user's custom
+    exercises. Lookups are by primary key and remembered on the serializer
+    context, so repeated sets of the same exercise only hit the database once.
+    """
+    exercises = context.setdefault('set_exercises', {})
+    key = (bool(data.get('is_custom')), data['exercise_id'])
+    if key not in exercises:
+        if data.get('is_custom'):
+            # Get the user from the context
+            user = context['request'].user
+            exercises[key] = user.custom_exercises.filter(pk=data['exercise_id']).first()
+        else:
+            exercises[key] = ExerciseList.objects.filter(pk=data['exercise_id']).first()
+    return exercises[key]
+
+def accumulate_set_totals(exercises):
+    """
+    Number the sets of each exercise and add the running total volume and
+    duration of that exercise to every set
+    """
+    exercise_sets = {}
+    exercise_volumes = {}
+    exercise_durations = {}
+    processed_exercises = []
+
+    for exercise in exercises:
+        exercise_id = exercise['exercise_id']
+        is_custom = exercise.get('is_custom', False)
+        
+        # Create unique key that includes custom status
+        exercise_key = f"{'custom_' if is_custom else ''}{exercise_id}"
+        
+        # Initialize tracking for new exercise
+        if exercise_key not in exercise_sets:
+            exercise_sets[exercise_key] = 1
+            exercise_volumes[exercise_key] = 0
+            exercise_durations[exercise_key] = 0
+        else:
+            exercise_sets[exercise_key] += 1
+
+        # Add set number to exercise
+        exercise['set_number'] = exercise_sets[exercise_key]
+        
+        # Add current set's volume to total if it exists
+        if 'volume' in exercise and exercise['volume'] is not None:
+            exercise_volumes[exercise_key] += exercise['volume']
+        
+        # Add current set's duration to total if it exists
+        if 'duration_minutes' in exercise and exercise['duration_minutes'] is not None:
+            exercise_durations[exercise_key] += exercise['duration_minutes']
+        
+        # Add total volume and duration for this exercise to each set
+        exercise['total_volume'] = exercise_volumes[exercise_key]
+        exercise['total_duration'] = exercise_durations[exercise_key]
+        
+        processed_exercises.append(exercise)
+
+    return processed_exercises
+
+class WholeListSerializer(serializers.ListSerializer):
+    """
+    Nested list whose items are validated with all their fields even in a
+    partial update: a PATCH that includes the list replaces it whole
+    """
+    def run_validation(self, data=empty):
+        is_empty, data = self.validate_empty_values(data)
+        if is_empty:
+            return data
+        serializer = type(self.child)(data=data, many=True, context=self.context)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
 class WorkoutExerciseSerializer(serializers.Serializer):
     exercise_id = serializers.IntegerField(
         help_text="ID of the exercise (from either exercise list or custom exercises)"
@@ -88,64 +215,28 @@ class WorkoutExerciseSerializer(serializers.Serializer):
     one_rm = serializers.FloatField(read_only=True)
 
     def validate(self, data):
-        try:
-            if data.get('is_custom'):
-                # Get the user from the context
-                user = self.context['request'].user
-                # Look for the exercise in user's custom exercises
-                custom_exercises = user.custom_exercises or []
-                exercise = next(
-                    (ex for ex in custom_exercises if ex['id'] == data['exercise_id']),
-                    None
-                )
-                if not exercise:
-                    raise serializers.ValidationError("Custom exercise not found")
-                # For custom exercises, exercise_type is accessed from dictionary
-                exercise_type = exercise['exercise_type']
-            else:
-                # Look for the exercise in the normal exercise list
-                exercise = ExerciseList.objects.get(id=data['exercise_id'])
-                # For regular exercises, exercise_type is accessed from model instance
-                exercise_type = exercise.exercise_type
-
-        except ExerciseList.DoesNotExist:
-            raise serializers.ValidationError("Exercise not found")
+        exercise = get_set_exercise(self.context, data)
+        if exercise is None:
+            raise serializers.ValidationError(
+                "Custom exercise not found" if data.get('is_custom') else "Exercise not found"
+            )
+        exercise_type = exercise.exercise_type
 
         # TODO: Deal with type in the frontend
-        # Validate based on exercise type
-        if exercise_type in ['Dumbbell Exercises', 'Barbell Exercises', 'Machine-Based Workouts', 
-                           'Kettlebell Workouts', 'Resistance Band Training', 'Cable Exercises']:
-            if not data.get('reps'):
-                raise serializers.ValidationError("Reps are required for this exercise type")
-            
-            # Calculate volume and one_rm for weight-based exercises
-            if data.get('weight'):
-                # Volume = reps × weight
-                data['volume'] = float(data['reps']) * float(data['weight'])
-                
-                # Epley Formula for 1RM
-                # 1RM = weight × (36 / (37 - reps))
-                data['one_rm'] = float(data['weight']) * (36 / (37 - float(data['reps'])))
-            else:
-                data['volume'] = 0
-                data['one_rm'] = 0
-
-        elif exercise_type in ['Cardiovascular Exercise', 'Yoga and Flexibility Workouts']:
-            if not data.get('duration_minutes'):
-                raise serializers.ValidationError("Duration is required for this exercise type")
-            data['volume'] = 0
-            data['one_rm'] = 0
-        elif exercise_type == 'Bodyweight Training':
-            if not data.get('reps'):
-                raise serializers.ValidationError("Reps are required for bodyweight exercises")
-            # For bodyweight, volume is just the number of reps
-            data['volume'] = float(data['reps'])
-            data['one_rm'] = 0
+        calculate_set_metrics(exercise_type, data)
 
         data['exercise'] = exercise
         return data
 
+class StoredDurationField(serializers.DurationField):
+    """Duration stored in workouts as an ISO 8601 string (see api/workouts.py)"""
+    def to_representation(self, value):
+        if isinstance(value, str):
+            return value
+        return duration_iso_string(value)
+
 class WorkoutSerializer(serializers.Serializer):
+    id = serializers.IntegerField(read_only=True)
     name = serializers.CharField(
         max_length=100,
         help_text="Name of your workout"
@@ -155,8 +246,8 @@ class WorkoutSerializer(serializers.Serializer):
         allow_blank=True,
         help_text="Optional description of your workout"
     )
-    exercises = WorkoutExerciseSerializer(
-        many=True,
+    exercises = WholeListSerializer(
+        child=WorkoutExerciseSerializer(),
         help_text="""List of exercises in your workout. Example format:
         [
             {
@@ -176,7 +267,7 @@ class WorkoutSerializer(serializers.Serializer):
         help_text="Time of the workout (format: YYYY-MM-DDThh:mm:ssZ, e.g., 2024-03-20T14:30:00Z)"
     )
 
-    workout_duration = serializers.DurationField(
+    workout_duration = StoredDurationField(
         required=False,
         allow_null=True,
         help_text="Duration of the workout (format: PT1H20M30S, e.g., PT1H20M30S) which means 1 hour 20 minutes and 30 seconds"
@@ -187,47 +278,10 @@ class WorkoutSerializer(serializers.Serializer):
         allow_blank=True,
         help_text="Notes about the workout"
     )
-    
+    created_at = serializers.DateTimeField(read_only=True)
 
     def validate_exercises(self, exercises):
-        exercise_sets = {}
-        exercise_volumes = {}
-        exercise_durations = {}
-        processed_exercises = []
-
-        for exercise in exercises:
-            exercise_id = exercise['exercise_id']
-            is_custom = exercise.get('is_custom', False)
-            
-            # Create unique key that includes custom status
-            exercise_key = f"{'custom_' if is_custom else ''}{exercise_id}"
-            
-            # Initialize tracking for new exercise
-            if exercise_key not in exercise_sets:
-                exercise_sets[exercise_key] = 1
-                exercise_volumes[exercise_key] = 0
-                exercise_durations[exercise_key] = 0
-            else:
-                exercise_sets[exercise_key] += 1
-
-            # Add set number to exercise
-            exercise['set_number'] = exercise_sets[exercise_key]
-            
-            # Add current set's volume to total if it exists
-            if 'volume' in exercise and exercise['volume'] is not None:
-                exercise_volumes[exercise_key] += exercise['volume']
-            
-            # Add current set's duration to total if it exists
-            if 'duration_minutes' in exercise and exercise['duration_minutes'] is not None:
-                exercise_durations[exercise_key] += exercise['duration_minutes']
-            
-            # Add total volume and duration for this exercise to each set
-            exercise['total_volume'] = exercise_volumes[exercise_key]
-            exercise['total_duration'] = exercise_durations[exercise_key]
-            
-            processed_exercises.append(exercise)
-
-        return processed_exercises
+        return accumulate_set_totals(exercises)
 
 class TemplateExerciseSerializer(serializers.Serializer):
     exercise_id = serializers.IntegerField(
@@ -266,58 +320,14 @@ class TemplateExerciseSerializer(serializers.Serializer):
     one_rm = serializers.FloatField(read_only=True) #Calculated automatically
 
     def validate(self, data):
-        try:
-            if data.get('is_custom'):
-                # Get the user from the context
-                user = self.context['request'].user
-                # Look for the exercise in user's custom exercises
-                custom_exercises = user.custom_exercises or []
-                exercise = next(
-                    (ex for ex in custom_exercises if ex['id'] == data['exercise_id']),
-                    None
-                )
-                if not exercise:
-                    raise serializers.ValidationError("Custom exercise not found")
-                # For custom exercises, exercise_type is accessed from dictionary
-                exercise_type = exercise['exercise_type']
-            else:
-                # Look for the exercise in the normal exercise list
-                exercise = ExerciseList.objects.get(id=data['exercise_id'])
-                # For regular exercises, exercise_type is accessed from model instance
-                exercise_type = exercise.exercise_type
-
-        except ExerciseList.DoesNotExist:
-            raise serializers.ValidationError("Exercise not found")
-
-        # Validate based on exercise type
-        if exercise_type in ['Dumbbell Exercises', 'Barbell Exercises', 'Machine-Based Workouts', 
-                           'Kettlebell Workouts', 'Resistance Band Training', 'Cable Exercises']:
-            if not data.get('reps'):
-                raise serializers.ValidationError("Reps are required for this exercise type")
-            
-            # Calculate volume and one_rm for weight-based exercises
-            if data.get('weight'):
-                # Volume = reps × weight
-                data['volume'] = float(data['reps']) * float(data['weight'])
-                
-                # TODO: Epley Formula for 1RM
-                # 1RM = weight × (36 / (37 - reps))
-                data['one_rm'] = float(data['weight']) * (36 / (37 - float(data['reps'])))
-            else:
-                data['volume'] = 0
-                data['one_rm'] = 0
-
-        elif exercise_type in ['Cardiovascular Exercise', 'Yoga and Flexibility Workouts']:
-            if not data.get('duration_minutes'):
-                raise serializers.ValidationError("Duration is required for this exercise type")
-            data['volume'] = 0
-            data['one_rm'] = 0
-        elif exercise_type == 'Bodyweight Training':
-            if not data.get('reps'):
-                raise serializers.ValidationError("Reps are required for bodyweight exercises")
-            # For bodyweight, volume is just the number of reps
-            data['volume'] = float(data['reps'])
-            data['one_rm'] = 0
+        exercise = get_set_exercise(self.context, data)
+        if exercise is None:
+            raise serializers.ValidationError(
+                "Custom exercise not found" if data.get('is_custom') else "Exercise not found"
+            )
+        exercise_type = exercise.exercise_type
+
+        calculate_set_metrics(exercise_type, data)
 
         data['exercise'] = exercise
         return data
@@ -338,44 +348,7 @@ class TemplateSerializer(serializers.Serializer):
     )
 
     def validate_exercises(self, exercises):
-        exercise_sets = {}  # Track sets per exercise
-        exercise_volumes = {}  # Track total volume per exercise
-        exercise_durations = {}  # Track total duration per exercise
-        processed_exercises = []
-
-        for exercise in exercises:
-            exercise_id = exercise['exercise_id']
-            is_custom = exercise.get('is_custom', False)
-            
-            # Create unique key that includes custom status
-            exercise_key = f"{'custom_' if is_custom else ''}{exercise_id}"
-            
-            # Initialize tracking for new exercise
-            if exercise_key not in exercise_sets:
-                exercise_sets[exercise_key] = 1
-                exercise_volumes[exercise_key] = 0
-                exercise_durations[exercise_key] = 0
-            else:
-                exercise_sets[exercise_key] += 1
-
-            # Add set number to exercise
-            exercise['set_number'] = exercise_sets[exercise_key]
-            
-            # Add current set's volume to total
-            if 'volume' in exercise:
-                exercise_volumes[exercise_key] += exercise['volume']
-            
-            # Add current set's duration to total
-            if 'duration_minutes' in exercise:
-                exercise_durations[exercise_key] += exercise['duration_minutes']
-            
-            # Add total volume and duration for this exercise to each set
-            exercise['total_volume'] = exercise_volumes[exercise_key]
-            exercise['total_duration'] = exercise_durations[exercise_key]
-            
-            processed_exercises.append(exercise)
-
-        return processed_exercises
+        return accumulate_set_totals(exercises)
     
     
 class CustomExerciseSerializer(serializers.Serializer):
@@ -427,30 +400,125 @@ class CustomExerciseSerializer(serializers.Serializer):
         exercise_id = self.context.get('exercise_id')  # This will now be available during PUT requests
         
         if request and request.user:
-            existing_exercises = request.user.custom_exercises or []
             value = value.strip()
+            # Compare on the folded name so the lookup uses the unique index
+            existing_exercises = request.user.custom_exercises.filter(name_key=exercise_name_key(value))
             
-            # For new exercises (POST)
-            if not exercise_id:
-                if any(ex['name'].lower() == value.lower() for ex in existing_exercises):
-                    raise serializers.ValidationError(
-                        "You already have an exercise with this name"
-                    )
-            # For updates (PUT)
-            else:
-                if any(ex['name'].lower() == value.lower() and ex['id'] != exercise_id 
-                      for ex in existing_exercises):
-                    raise serializers.ValidationError(
-                        "You already have an exercise with this name"
-                    )
+            # For updates (PUT) the exercise may keep its own name
+            if exercise_id:
+                existing_exercises = existing_exercises.exclude(pk=exercise_id)
+            if existing_exercises.exists():
+                raise serializers.ValidationError(
+                    "You already have an exercise with this name"
+                )
         return value
 
-    def to_representation(self, instance):
+    def create(self, validated_data):
+        try:
+            with transaction.atomic():
+                return CustomExercise.objects.create(**validated_data)
+        except IntegrityError:
+            # Lost a race against a concurrent create with the same name
+            raise serializers.ValidationError({'name': ["You already have an exercise with this name"]})
+
+    def update(self, instance, validated_data):
+        # Keep the existing created_at and id, update the rest
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        instance.updated_at = timezone.now()
+        try:
+            with transaction.atomic():
+                instance.save()
+        except IntegrityError:
+            raise serializers.ValidationError({'name': ["You already have an exercise with this name"]})
+        return instance
+
+
+class TemplateSetOverrideSerializer(serializers.Serializer):
+    index = serializers.IntegerField(
+        min_value=0,
+        help_text="Position of the set in the template's exercises list"
+    )
+    reps = serializers.IntegerField(
+        required=False, 
+        allow_null=True,
+        help_text="Number of repetitions",
+        min_value=0
+    )
+    weight = serializers.FloatField(
+        required=False, 
+        allow_null=True,
+        help_text="Weight in kg",
+        min_value=0
+    )
+    duration_minutes = serializers.FloatField(
+        required=False, 
+        allow_null=True,
+        help_text="Duration in minutes (cardio/yoga exercises)",
+        min_value=0
+    )
+    distance_meters = serializers.FloatField(
+        required=False, 
+        allow_null=True,
+        help_text="Distance in meters (optional for cardio exercises)",
+        min_value=0
+    )
+
+class TemplateInstantiateSerializer(serializers.Serializer):
+    name = serializers.CharField(
+        required=False,
+        max_length=100,
+        help_text="Name of the workout (defaults to the template name)"
+    )
+    description = serializers.CharField(
+        required=False, 
+        allow_blank=True,
+        help_text="Optional description of the workout (defaults to the template description)"
+    )
+    apply_suggestions = serializers.BooleanField(
+        default=False,
+        help_text="Use the suggested weight and reps (see the template's suggestions) before applying overrides"
+    )
+    overrides = TemplateSetOverrideSerializer(
+        many=True,
+        required=False,
+        help_text="""Values that differ from the template, per set. Example format:
+        [
+            {
+                "index": 0,
+                "reps": 10,
+                "weight": 22.5
+            }
+        ]"""
+    )
+
+    def validate_overrides(self, overrides):
         """
-        Convert the exercise instance to a dictionary for response.
+        Return the overrides keyed by set index
         """
-        data = super().to_representation(instance)
-        if isinstance(instance, dict):
-            data['created_at'] = instance.get('created_at', '')
-            data['updated_at'] = instance.get('updated_at', '')
-        return data 
\ No newline at end of file
+        by_index = {}
+        for override in overrides:
+            index = override.pop('index')
+            if index in by_index:
+                raise serializers.ValidationError(f"Set {index} is overridden more than once")
+            by_index[index] = override
+        return by_index
+
+class WorkoutSessionSerializer(serializers.Serializer):
+    name = serializers.CharField(
+        max_length=100,
+        help_text="Name of the workout"
+    )
+    description = serializers.CharField(
+        required=False, 
+        allow_blank=True,
+        help_text="Optional description of the workout"
+    )
+
+class LeaderboardMembershipSerializer(serializers.Serializer):
+    name = serializers.CharField(
+        required=False,
+        allow_blank=True,
+        max_length=50,
+        help_text="Name shown on the leaderboards (defaults to \"Athlete <id>\")"
+    )
@@ -0,0 +1,23 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .catalog import bump_catalog_version, bump_custom_exercises_version
+from .models import CustomExercise, ExerciseList
+
+
+# Any change to the global catalog invalidates the structures derived from it.
+# Versions are bumped once the change is committed: bumped earlier, a rebuild
+# running in between would cache the old rows under the new version.
+@receiver(post_save, sender=ExerciseList)
+@receiver(post_delete, sender=ExerciseList)
+def exercise_list_changed(sender, **kwargs):
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=CustomExercise)
+@receiver(post_delete, sender=CustomExercise)
+def custom_exercise_changed(sender, instance, **kwargs):
+    transaction.on_commit(partial(bump_custom_exercises_version, instance.user_id))
@@ -0,0 +1,138 @@
+"""
+Exercise substitution suggestions.
+
+Every exercise is a vector over the MUSCLE_CHOICES axis with its primary,
+secondary and tertiary muscles weighted 1.0/0.5/0.25. The cosine similarity
+matrix of the catalog is precomputed once per catalog version; a user's
+custom exercises are scored against it at request time.
+"""
+import numpy as np
+
+from .catalog import MUSCLE_SLOTS, VersionedCache
+from .models import ExerciseList, MUSCLE_CHOICES, EXERCISE_TYPE_CHOICES
+
+MUSCLE_AXIS = {muscle: position for position, (muscle, _) in enumerate(MUSCLE_CHOICES)}
+SLOT_WEIGHTS = dict(zip(MUSCLE_SLOTS, (1.0, 0.5, 0.25)))
+EXERCISE_TYPES = {exercise_type: position for position, exercise_type in enumerate(EXERCISE_TYPE_CHOICES)}
+
+# Share of the score coming from muscle overlap vs. a matching exercise type
+MUSCLE_WEIGHT = 0.75
+TYPE_WEIGHT = 0.25
+
+DEFAULT_SIMILAR_LIMIT = 5
+MAX_SIMILAR_LIMIT = 50
+
+EXERCISE_FIELDS = ('id', 'name', 'exercise_type') + MUSCLE_SLOTS
+
+
+def muscle_weights(exercises):
+    """Muscle weights (1.0/0.5/0.25 by slot), one row per exercise"""
+    vectors = np.zeros((len(exercises), len(MUSCLE_AXIS)), dtype=np.float32)
+    for row, exercise in enumerate(exercises):
+        for slot, weight in SLOT_WEIGHTS.items():
+            muscle = exercise.get(slot)
+            if muscle in MUSCLE_AXIS:
+                column = MUSCLE_AXIS[muscle]
+                vectors[row, column] = max(vectors[row, column], weight)
+    return vectors
+
+
+def muscle_vectors(exercises):
+    """Unit-length muscle vectors, one row per exercise"""
+    vectors = muscle_weights(exercises)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+def type_codes(exercises):
+    return np.array(
+        [EXERCISE_TYPES.get(exercise['exercise_type'], -1) for exercise in exercises],
+        dtype=np.int8
+    )
+
+
+class SimilarityIndex:
+    def __init__(self, exercises):
+        self.entries = [dict(exercise, is_custom=False) for exercise in exercises]
+        self.positions = {entry['id']: position for position, entry in enumerate(self.entries)}
+        self.vectors = muscle_vectors(self.entries)
+        self.types = type_codes(self.entries)
+        # Pairwise muscle similarity of the whole catalog
+        self.similarity = self.vectors @ self.vectors.T
+
+
+def build_similarity_index():
+    return SimilarityIndex(list(ExerciseList.objects.values(*EXERCISE_FIELDS)))
+
+
+similarity_index = VersionedCache(build_similarity_index)
+
+
+def find_target(user, index, exercise_key):
+    """The exercise being replaced, from the catalog or the user's custom exercises"""
+    if exercise_key.startswith('custom_'):
+        return user.custom_exercises.filter(
+            pk=int(exercise_key[len('custom_'):])
+        ).values(*EXERCISE_FIELDS).first()
+    position = index.positions.get(int(exercise_key))
+    return index.entries[position] if position is not None else None
+
+
+def similar_exercises(user, exercise_key, limit=DEFAULT_SIMILAR_LIMIT, type_filter=None):
+    """
+    Top ``limit`` exercises most similar to ``exercise_key`` ("12" or "custom_3").
+
+    ``type_filter`` is None, "same" or "different" to restrict candidates to the
+    target's exercise type or to other types (e.g. other equipment).
+    Returns None when the exercise does not exist.
+    """
+    index = similarity_index.get()
+    target = find_target(user, index, exercise_key)
+    if target is None:
+        return None
+    target_is_custom = exercise_key.startswith('custom_')
+
+    custom = list(user.custom_exercises.values(*EXERCISE_FIELDS))
+    custom_vectors = muscle_vectors(custom)
+
+    if target_is_custom:
+        target_vector = muscle_vectors([target])[0]
+        catalog_scores = index.vectors @ target_vector
+        target_position = len(index.entries) + next(
+            position for position, exercise in enumerate(custom) if exercise['id'] == target['id']
+        )
+    else:
+        target_position = index.positions[target['id']]
+        target_vector = index.vectors[target_position]
+        catalog_scores = index.similarity[target_position]
+
+    entries = index.entries + [dict(exercise, is_custom=True) for exercise in custom]
+    muscle_scores = np.concatenate((catalog_scores, custom_vectors @ target_vector))
+    types = np.concatenate((index.types, type_codes(custom)))
+    target_type = EXERCISE_TYPES.get(target['exercise_type'], -1)
+    same_type = types == target_type
+    scores = MUSCLE_WEIGHT * muscle_scores + TYPE_WEIGHT * same_type
+
+    # Never suggest the exercise itself or exercises sharing no muscle
+    eligible = muscle_scores > 0
+    eligible[target_position] = False
+    if type_filter == 'same':
+        eligible &= same_type
+    elif type_filter == 'different':
+        eligible &= ~same_type
+
+    candidates = np.flatnonzero(eligible)
+    if len(candidates) > limit:
+        top = np.argpartition(-scores[candidates], limit - 1)[:limit]
+        candidates = candidates[top]
+    candidates = candidates[np.lexsort((
+        [entries[position]['name'].lower() for position in candidates], -scores[candidates]
+    ))]
+
+    return {
+        'exercise': dict(target, is_custom=target_is_custom),
+        'results': [
+            {**entries[position], 'score': round(float(scores[position]), 3)}
+            for position in candidates
+        ],
+    }
@@ -0,0 +1,152 @@
+"""
+Training statistics derived from a user's workout history.
+
+Per-exercise history is kept as compact NumPy columns (one entry per logged
+set) so trend lines can be computed without walking ``User.workouts`` on
+every request. The columns are cached per user and exercise and dropped
+whenever a new workout touches that exercise.
+"""
+import numpy as np
+from django.core.cache import cache
+from django.utils.dateparse import parse_datetime
+
+# Cached series live until a workout touching the exercise invalidates them
+TREND_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
+DEFAULT_TREND_WINDOW = 4
+MAX_TREND_WINDOW = 52
+
+
+def exercise_key(exercise_id, is_custom=False):
+    """Key used for personal records and stats, e.g. '12' or 'custom_3'"""
+    return f"{'custom_' if is_custom else ''}{exercise_id}"
+
+
+def set_exercise_key(set_data):
+    return exercise_key(set_data['exercise_id'], set_data.get('is_custom', False))
+
+
+def workout_timestamp(workout):
+    """
+    Unix timestamp of a workout, preferring the client supplied completion time
+    """
+    value = workout.get('time_completed') or workout.get('created_at')
+    parsed = parse_datetime(value) if value else None
+    return int(parsed.timestamp()) if parsed else 0
+
+
+def completed_between(workout, start=None, end=None):
+    """Whether a workout was completed in [start, end); a None bound is open"""
+    timestamp = workout_timestamp(workout)
+    return (start is None or timestamp >= start.timestamp()) and (end is None or timestamp < end.timestamp())
+
+
+def trend_cache_key(user_id, key):
+    return f'exercise-series:{user_id}:{key}'
+
+
+def build_exercise_series(workouts, key):
+    """
+    Collect every set of one exercise into columnar arrays.
+
+    ``session`` holds the index of the workout each set belongs to, so sets can
+    be grouped back into sessions with ``reduceat``.
+    """
+    sessions, timestamps, weights, reps, volumes = [], [], [], [], []
+    for index, workout in enumerate(workouts or []):
+        timestamp = None
+        for set_data in workout.get('exercises', []):
+            if set_exercise_key(set_data) != key:
+                continue
+            if timestamp is None:
+                timestamp = workout_timestamp(workout)
+            sessions.append(index)
+            timestamps.append(timestamp)
+            weights.append(set_data.get('weight') or 0)
+            reps.append(set_data.get('reps') or 0)
+            volumes.append(set_data.get('volume') or 0)
+
+    series = {
+        'session': np.array(sessions, dtype=np.int32),
+        'timestamp': np.array(timestamps, dtype=np.int64),
+        'weight': np.array(weights, dtype=np.float32),
+        'reps': np.array(reps, dtype=np.int64),
+        'volume': np.array(volumes, dtype=np.float32),
+    }
+
+    # Workouts are appended in creation order, but a back-dated completion
+    # time can put sessions out of order; keep sets of a session together
+    if len(sessions) and np.any(np.diff(series['timestamp']) < 0):
+        order = np.lexsort((series['session'], series['timestamp']))
+        series = {name: column[order] for name, column in series.items()}
+    return series
+
+
+def get_exercise_series(user, key):
+    """Cached columnar history for one exercise of a user"""
+    cache_key = trend_cache_key(user.pk, key)
+    series = cache.get(cache_key)
+    if series is None:
+        series = build_exercise_series(user.workout_history(), key)
+        cache.set(cache_key, series, TREND_CACHE_TIMEOUT)
+    return series
+
+
+def invalidate_exercise_series(user_id, keys):
+    """Drop cached series for the given exercise keys of a user"""
+    cache.delete_many([trend_cache_key(user_id, key) for key in keys])
+
+
+def estimated_one_rm(weight, reps):
+    """
+    Vectorized version of the 1RM formula used by the workout serializers:
+    1RM = weight × (36 / (37 - reps)). Sets without reps or with 37+ reps
+    do not produce an estimate.
+    """
+    reps = reps.astype(np.float64)
+    valid = (reps > 0) & (reps < 37)
+    denominator = np.where(valid, 37 - reps, 1)
+    return np.where(valid, weight * (36 / denominator), 0.0)
+
+
+def rolling_mean(values, window):
+    """
+    Trailing moving average. The first ``window - 1`` points average over the
+    points available so far instead of being dropped.
+    """
+    if not len(values):
+        return values.astype(np.float64)
+    cumulative = np.cumsum(values, dtype=np.float64)
+    shifted = np.concatenate((np.zeros(window), cumulative[:-window]))[:len(values)]
+    counts = np.minimum(np.arange(1, len(values) + 1), window)
+    return (cumulative - shifted) / counts
+
+
+def exercise_trend(series, window=DEFAULT_TREND_WINDOW):
+    """
+    Per-session e1RM and volume with moving averages, as parallel lists
+    """
+    session = series['session']
+    if not len(session):
+        return {
+            'timestamps': [], 'sets': [], 'top_weight': [],
+            'e1rm': [], 'e1rm_avg': [], 'volume': [], 'volume_avg': [],
+        }
+
+    # Index of the first set of every session
+    starts = np.flatnonzero(np.concatenate(([True], session[1:] != session[:-1])))
+    set_counts = np.diff(np.append(starts, len(session)))
+
+    e1rm = np.maximum.reduceat(estimated_one_rm(series['weight'], series['reps']), starts)
+    volume = np.add.reduceat(series['volume'].astype(np.float64), starts)
+    top_weight = np.maximum.reduceat(series['weight'], starts)
+
+    return {
+        'timestamps': series['timestamp'][starts].tolist(),
+        'sets': set_counts.tolist(),
+        'top_weight': np.round(top_weight, 2).tolist(),
+        'e1rm': np.round(e1rm, 2).tolist(),
+        'e1rm_avg': np.round(rolling_mean(e1rm, window), 2).tolist(),
+        'volume': np.round(volume, 2).tolist(),
+        'volume_avg': np.round(rolling_mean(volume, window), 2).tolist(),
+    }
@@ -0,0 +1,25 @@
+"""
+Background job handlers. Registered on import from ApiConfig.ready().
+"""
+from django.core.cache import cache
+
+from .jobs import job
+from .models import User
+from .stats import build_exercise_series, trend_cache_key, TREND_CACHE_TIMEOUT
+
+
+@job()
+def process_workout(user_id, workout_id, exercise_keys):
+    """
+    Derived work after a workout is logged: rebuild the cached trend series of
+    the exercises it touched so the next stats request is a cache hit.
+    """
+    user = User.objects.filter(pk=user_id).only('id', 'workouts').first()
+    if user is None:
+        return
+    for key in exercise_keys:
+        cache.set(
+            trend_cache_key(user.pk, key),
+            build_exercise_series(user.workout_history(), key),
+            TREND_CACHE_TIMEOUT
+        )
@@ -1,3 +1,2138 @@
-from django.test import TestCase
+import gzip
+import importlib
+import json
+import random
+import tempfile
+import zlib
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.dispatch import receiver
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import (
+    AsyncClient, Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+)
+from django.test.signals import setting_changed
+from django.urls import clear_url_caches
+from django.utils import timezone
+from django.utils.dateparse import parse_duration
+from django.utils.functional import SimpleLazyObject
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from . import urls as api_urls
+from .catalog import get_catalog_version
+from .compression import CODECS, GzipStream, brotli, compress_gzip, negotiate_encoding, zstandard
+from .history import live_workouts_in_range, personal_records_for, workouts_in_range
+from .jobs import claim_jobs, enqueue, job, run_job
+from .middleware import PIN_COOKIE, CompressionMiddleware, ReplicaPinningMiddleware, user_pin_key
+from .models import (
+    CustomExercise, ExerciseList, ExerciseProgress, Job, LeaderboardEntry, User, WorkoutArchive, month_start
+)
+from .parsers import FastJSONParser
+from .progression import suggest
+from .renderers import FastJSONRenderer, orjson
+from .routers import PrimaryReplicaRouter, replica_reads
+from .stats import completed_between, trend_cache_key
+from .throttling import TokenBucketThrottle
+from .tasks import process_workout
+from .workouts import personal_records_from, record_workout, update_workout
+
+
+def full_rebuild(user):
+    """Personal records recomputed from every set in the user's history"""
+    return personal_records_from(
+        set_data for workout in user.workout_history() for set_data in workout['exercises']
+    )
+
+
+# Tests get a private in-memory cache, so nothing cached by one test run
+# (keyed by user ids the test database hands out again) is seen by the next
+# or by the development server
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class APITestCase(TestCase):
+    """Starts every test with an empty cache"""
+
+    def setUp(self):
+        cache.clear()
+
+    def login(self, email):
+        user = User.objects.create_user(username=email, email=email)
+        client = APIClient()
+        client.force_authenticate(user)
+        return user, client
+
+    def log_workout(self, client, sets, **fields):
+        """Log (exercise, reps, weight) sets through the API, returns the workout"""
+        response = client.post('/api/workouts/', {
+            'name': 'Workout',
+            **fields,
+            'exercises': [
+                {'exercise_id': exercise.id, 'reps': reps, 'weight': weight}
+                for exercise, reps, weight in sets
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()
+
+
+class WorkoutEditTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.squat = ExerciseList.objects.create(
+            name='Squat', primary_muscle='Quadriceps', exercise_type='Barbell Exercises'
+        )
+        self.bench = ExerciseList.objects.create(
+            name='Bench Press', primary_muscle='Middle Chest', exercise_type='Barbell Exercises'
+        )
+        self.user = User.objects.create_user(username='lifter@example.com', email='lifter@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def log(self, *sets):
+        response = self.client.post('/api/workouts/', {
+            'name': 'Workout',
+            'exercises': [
+                {'exercise_id': exercise.id, 'reps': reps, 'weight': weight}
+                for exercise, reps, weight in sets
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return self.user.workouts[-1]['id']
+
+    def records(self):
+        user = User.objects.get(pk=self.user.pk)
+        return user.personal_records, full_rebuild(user)
+
+    def assertRecordsMatchRebuild(self):
+        records, rebuilt = self.records()
+        self.assertEqual(records, rebuilt)
+        return records
+
+    def test_delete_workout_holding_record(self):
+        self.log((self.squat, 5, 100), (self.bench, 5, 60))
+        heaviest = self.log((self.squat, 3, 140))
+        self.log((self.squat, 5, 120))
+
+        response = self.client.delete(f'/api/workouts/{heaviest}/')
+
+        self.assertEqual(response.status_code, 204)
+        records = self.assertRecordsMatchRebuild()
+        self.assertEqual(records[str(self.squat.id)]['max_weight'], 120)
+        self.assertEqual(records[str(self.bench.id)]['max_weight'], 60)
+
+    def test_delete_only_workout_of_exercise(self):
+        self.log((self.squat, 5, 100))
+        only_bench = self.log((self.bench, 5, 60))
+
+        self.client.delete(f'/api/workouts/{only_bench}/')
+
+        records = self.assertRecordsMatchRebuild()
+        self.assertNotIn(str(self.bench.id), records)
+
+    def test_put_lowers_records(self):
+        self.log((self.squat, 5, 100))
+        workout_id = self.log((self.squat, 5, 150), (self.bench, 5, 80))
+
+        response = self.client.put(f'/api/workouts/{workout_id}/', {
+            'name': 'Typo fixed',
+            'exercises': [{'exercise_id': self.squat.id, 'reps': 5, 'weight': 105}],
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['name'], 'Typo fixed')
+        records = self.assertRecordsMatchRebuild()
+        self.assertEqual(records[str(self.squat.id)]['max_weight'], 105)
+        self.assertNotIn(str(self.bench.id), records)
+
+    def test_patch_raises_records(self):
+        workout_id = self.log((self.squat, 5, 100))
+        self.log((self.squat, 5, 110))
+
+        self.client.patch(f'/api/workouts/{workout_id}/', {
+            'exercises': [{'exercise_id': self.squat.id, 'reps': 8, 'weight': 130}],
+        }, format='json')
+
+        records = self.assertRecordsMatchRebuild()
+        self.assertEqual(records[str(self.squat.id)]['max_weight'], 130)
+
+    def test_patch_name_keeps_sets(self):
+        workout_id = self.log((self.squat, 5, 100))
+        before = self.user.workouts[-1]['exercises']
+
+        response = self.client.patch(f'/api/workouts/{workout_id}/', {'name': 'Leg day'}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        workout = User.objects.get(pk=self.user.pk).workouts[-1]
+        self.assertEqual(workout['name'], 'Leg day')
+        self.assertEqual(workout['exercises'], before)
+        self.assertRecordsMatchRebuild()
+
+    def test_patch_validates_every_set(self):
+        workout_id = self.log((self.squat, 5, 100))
+        before = User.objects.get(pk=self.user.pk).workouts
+
+        response = self.client.patch(
+            f'/api/workouts/{workout_id}/', {'exercises': [{'reps': 5, 'weight': 50}]}, format='json'
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'exercises': {'0': {'exercise_id': ['This field is required.']}}})
+        self.assertEqual(User.objects.get(pk=self.user.pk).workouts, before)
+
+    def test_workouts_are_represented_alike(self):
+        response = self.client.post('/api/workouts/', {
+            'name': 'Workout', 'exercises': [{'exercise_id': self.squat.id, 'reps': 5, 'weight': 100}],
+        }, format='json')
+        created = response.json()
+        stored = User.objects.get(pk=self.user.pk).workouts[-1]
+        self.assertEqual((created['id'], created['created_at']), (stored['id'], stored['created_at']))
+
+        detail = self.client.get(f"/api/workouts/{created['id']}/").json()
+        self.assertEqual(detail, created)
+        self.assertEqual(self.client.get('/api/workouts/').json(), [created])
+        patched = self.client.patch(f"/api/workouts/{created['id']}/", {'name': 'Renamed'}, format='json').json()
+        self.assertEqual(patched, {**created, 'name': 'Renamed'})
+
+    def test_edit_and_delete_archived_workout(self):
+        archived = {
+            'id': 1, 'name': 'Old', 'description': '', 'created_at': '2020-01-06T10:00:00+00:00',
+            'exercises': [{
+                'exercise_id': self.squat.id, 'name': 'Squat', 'is_custom': False, 'set_number': 1,
+                'reps': 1, 'weight': 200.0, 'duration_minutes': None, 'distance_meters': None,
+                'volume': 200.0, 'one_rm': 206.67, 'total_volume': 200.0, 'total_duration': 0,
+            }],
+        }
+        WorkoutArchive.objects.create(user=self.user, month=date(2020, 1, 1), workouts=[archived], workout_count=1)
+        self.user.personal_records = personal_records_from(archived['exercises'])
+        self.user.last_workout_id = 1
+        self.user.save()
+        self.log((self.squat, 5, 100))
+
+        response = self.client.patch('/api/workouts/1/', {
+            'exercises': [{'exercise_id': self.squat.id, 'reps': 1, 'weight': 180}],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        records = self.assertRecordsMatchRebuild()
+        self.assertEqual(records[str(self.squat.id)]['max_weight'], 180)
+
+        self.client.delete('/api/workouts/1/')
+        records = self.assertRecordsMatchRebuild()
+        self.assertEqual(records[str(self.squat.id)]['max_weight'], 100)
+        self.assertFalse(WorkoutArchive.objects.filter(user=self.user).exists())
+
+    def test_deleted_newest_id_is_not_reused(self):
+        self.log((self.squat, 5, 100))
+        newest = self.log((self.squat, 5, 110))
+
+        self.client.delete(f'/api/workouts/{newest}/')
+
+        self.assertEqual(self.log((self.squat, 5, 120)), newest + 1)
+
+    def test_other_users_workout_not_found(self):
+        workout_id = self.log((self.squat, 5, 100))
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user(username='other@example.com', email='other@example.com'))
+
+        self.assertEqual(other.delete(f'/api/workouts/{workout_id}/').status_code, 404)
+        self.assertEqual(other.patch(f'/api/workouts/{workout_id}/', {'name': 'x'}, format='json').status_code, 404)
+        self.assertEqual(len(User.objects.get(pk=self.user.pk).workouts), 1)
+
+    def test_random_edits_match_full_rebuild(self):
+        rng = random.Random(45)
+        exercises = [self.squat, self.bench]
+        for _ in range(8):
+            self.log(*[
+                (rng.choice(exercises), rng.randint(1, 12), rng.choice([40, 60, 80, 100, 120]))
+                for _ in range(rng.randint(1, 4))
+            ])
+
+        for _ in range(12):
+            workout_ids = [workout['id'] for workout in self.user.workouts]
+            workout_id = rng.choice(workout_ids)
+            if rng.random() < 0.3 and len(workout_ids) > 1:
+                self.client.delete(f'/api/workouts/{workout_id}/')
+            else:
+                self.client.put(f'/api/workouts/{workout_id}/', {
+                    'name': 'Edited',
+                    'exercises': [
+                        {
+                            'exercise_id': rng.choice(exercises).id,
+                            'reps': rng.randint(1, 12),
+                            'weight': rng.choice([40, 60, 80, 100, 120, 140]),
+                        }
+                        for _ in range(rng.randint(1, 4))
+                    ],
+                }, format='json')
+            self.assertRecordsMatchRebuild()
+
+
+@job(name='test_failing_job')
+def failing_job():
+    raise ValueError('Failed on purpose')
+
+
+@override_settings(JOB_QUEUE={**settings.JOB_QUEUE, 'ALWAYS_EAGER': False, 'QUEUE_CONCURRENCY': {}})
+class JobQueueTests(APITestCase):
+    def test_enqueue_writes_job_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue('process_workout', {'user_id': 1, 'workout_id': 1, 'exercise_keys': []})
+            self.assertFalse(Job.objects.exists())
+
+        created = Job.objects.get()
+        self.assertEqual(created.name, 'process_workout')
+        self.assertEqual(created.status, Job.STATUS_PENDING)
+        self.assertEqual(created.max_attempts, settings.JOB_QUEUE['MAX_ATTEMPTS'])
+
+    def test_enqueue_unknown_job(self):
+        with self.assertRaises(LookupError):
+            enqueue('no_such_job')
+
+    def test_claim_ready_jobs_only(self):
+        ready = Job.objects.create(name='test_failing_job')
+        Job.objects.create(name='test_failing_job', run_after=timezone.now() + timedelta(hours=1))
+
+        claimed = claim_jobs('worker-1', 5)
+
+        self.assertEqual([claimed_job.pk for claimed_job in claimed], [ready.pk])
+        self.assertEqual(claimed[0].status, Job.STATUS_RUNNING)
+        self.assertEqual(claimed[0].locked_by, 'worker-1')
+        self.assertEqual(claim_jobs('worker-2', 5), [])
+
+    def test_claim_limit(self):
+        for _ in range(3):
+            Job.objects.create(name='test_failing_job')
+        self.assertEqual(len(claim_jobs('worker-1', 2)), 2)
+        self.assertEqual(len(claim_jobs('worker-2', 2)), 1)
+
+    def test_claim_respects_queue_concurrency(self):
+        Job.objects.create(name='test_failing_job', status=Job.STATUS_RUNNING, locked_at=timezone.now())
+        for _ in range(3):
+            Job.objects.create(name='test_failing_job')
+        Job.objects.create(name='test_failing_job', queue='other')
+
+        with override_settings(JOB_QUEUE={**settings.JOB_QUEUE, 'QUEUE_CONCURRENCY': {'default': 2}}):
+            claimed = claim_jobs('worker-1', 5)
+            self.assertEqual(sorted(claimed_job.queue for claimed_job in claimed), ['default', 'other'])
+            self.assertEqual(claim_jobs('worker-2', 5), [])
+
+    def test_stale_running_job_is_claimed_again(self):
+        stale = Job.objects.create(
+            name='test_failing_job', status=Job.STATUS_RUNNING, locked_by='dead-worker',
+            locked_at=timezone.now() - timedelta(seconds=settings.JOB_QUEUE['LOCK_TIMEOUT'] + 1)
+        )
+        Job.objects.create(
+            name='test_failing_job', status=Job.STATUS_RUNNING, locked_by='busy-worker', locked_at=timezone.now()
+        )
+
+        claimed = claim_jobs('worker-1', 5)
+
+        self.assertEqual([claimed_job.pk for claimed_job in claimed], [stale.pk])
+        self.assertEqual(claimed[0].locked_by, 'worker-1')
+
+    def test_failing_job_is_retried_then_failed(self):
+        Job.objects.create(name='test_failing_job', max_attempts=2)
+
+        with self.assertLogs('api.jobs', 'WARNING'):
+            self.assertFalse(run_job(claim_jobs('worker-1', 1)[0]))
+        retried = Job.objects.get()
+        self.assertEqual(retried.status, Job.STATUS_PENDING)
+        self.assertEqual(retried.attempts, 1)
+        self.assertEqual(retried.locked_by, '')
+        self.assertIn('Failed on purpose', retried.last_error)
+        self.assertGreater(retried.run_after, timezone.now())
+
+        Job.objects.update(run_after=timezone.now())
+        with self.assertLogs('api.jobs', 'ERROR'):
+            self.assertFalse(run_job(claim_jobs('worker-1', 1)[0]))
+        failed = Job.objects.get()
+        self.assertEqual(failed.status, Job.STATUS_FAILED)
+        self.assertEqual(failed.attempts, 2)
+        self.assertEqual(claim_jobs('worker-1', 1), [])
+
+    def test_successful_job_is_deleted(self):
+        user = User.objects.create_user(username='jobs@example.com', email='jobs@example.com')
+        Job.objects.create(
+            name='process_workout', payload={'user_id': user.pk, 'workout_id': 1, 'exercise_keys': []}
+        )
+        self.assertTrue(run_job(claim_jobs('worker-1', 1)[0]))
+        self.assertFalse(Job.objects.exists())
+
+    def test_process_workout_caches_series(self):
+        squat = ExerciseList.objects.create(
+            name='Squat', primary_muscle='Quadriceps', exercise_type='Barbell Exercises'
+        )
+        user = User.objects.create_user(username='jobs@example.com', email='jobs@example.com')
+        client = APIClient()
+        client.force_authenticate(user)
+        client.post('/api/workouts/', {
+            'name': 'Workout',
+            'exercises': [{'exercise_id': squat.id, 'reps': 5, 'weight': 100}] * 2,
+        }, format='json')
+        key = str(squat.id)
+        cache.delete(trend_cache_key(user.pk, key))
+
+        process_workout(user_id=user.pk, workout_id=1, exercise_keys=[key])
+
+        series = cache.get(trend_cache_key(user.pk, key))
+        self.assertEqual(series['weight'].tolist(), [100, 100])
+        self.assertEqual(series['reps'].tolist(), [5, 5])
+
+
+class ExerciseTrendTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.squat = ExerciseList.objects.create(
+            name='Squat', primary_muscle='Quadriceps', exercise_type='Barbell Exercises'
+        )
+        self.user, self.client = self.login('trend@example.com')
+        self.url = f'/api/stats/exercise/{self.squat.id}/trend/'
+
+    def test_sessions_and_moving_averages(self):
+        self.log_workout(self.client, [(self.squat, 5, 100), (self.squat, 3, 110)],
+                         time_completed='2026-01-05T10:00:00Z')
+        self.log_workout(self.client, [(self.squat, 5, 105)], time_completed='2026-01-08T10:00:00Z')
+
+        trend = self.client.get(f'{self.url}?window=2').json()
+
+        self.assertEqual(trend['sets'], [2, 1])
+        self.assertEqual(trend['top_weight'], [110, 105])
+        # 1RM = weight × 36 / (37 - reps)
+        self.assertEqual(trend['e1rm'], [116.47, 118.12])
+        self.assertEqual(trend['e1rm_avg'], [116.47, 117.3])
+        self.assertEqual(trend['volume'], [830, 525])
+        self.assertEqual(trend['volume_avg'], [830, 677.5])
+
+    def test_back_dated_workout_sorts_by_completion(self):
+        self.log_workout(self.client, [(self.squat, 5, 100)], time_completed='2026-01-08T10:00:00Z')
+        self.log_workout(self.client, [(self.squat, 5, 90)], time_completed='2026-01-01T10:00:00Z')
+
+        trend = self.client.get(self.url).json()
+
+        self.assertEqual(trend['top_weight'], [90, 100])
+        self.assertEqual(trend['timestamps'], sorted(trend['timestamps']))
+
+    def test_new_workout_invalidates_cached_series(self):
+        self.log_workout(self.client, [(self.squat, 5, 100)])
+        self.assertEqual(self.client.get(self.url).json()['sets'], [1])
+
+        # Invalidated when the workout commits
+        with self.captureOnCommitCallbacks(execute=True):
+            self.log_workout(self.client, [(self.squat, 5, 100)])
+
+        self.assertEqual(self.client.get(self.url).json()['sets'], [1, 1])
+
+    def test_reps_beyond_16_bits(self):
+        # Timed and bodyweight sets are not capped; 65538 used to wrap to 2 reps
+        self.log_workout(self.client, [(self.squat, 65538, 10)])
+
+        trend = self.client.get(self.url).json()
+
+        self.assertEqual(trend['e1rm'], [0])
+        self.assertEqual(trend['volume'], [655380])
+
+    def test_no_sets(self):
+        trend = self.client.get(self.url).json()
+        self.assertEqual(trend['timestamps'], [])
+        self.assertEqual(trend['e1rm_avg'], [])
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get('/api/stats/exercise/squat/trend/').status_code, 404)
+        self.assertEqual(self.client.get(f'{self.url}?window=x').status_code, 400)
+        self.assertEqual(self.client.get(f'{self.url}?window=0').status_code, 400)
+        self.assertEqual(self.client.get(f'{self.url}?window=53').status_code, 400)
+
+
+class TemplateInstantiateTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.squat = ExerciseList.objects.create(
+            name='Squat', primary_muscle='Quadriceps', exercise_type='Barbell Exercises'
+        )
+        self.bench = ExerciseList.objects.create(
+            name='Bench Press', primary_muscle='Middle Chest', exercise_type='Barbell Exercises'
+        )
+        self.user, self.client = self.login('template@example.com')
+        response = self.client.post('/api/templates/', {
+            'name': 'Push Legs',
+            'description': 'Twice a week',
+            'exercises': [
+                {'exercise_id': self.squat.id, 'reps': 5, 'weight': 100},
+                {'exercise_id': self.squat.id, 'reps': 5, 'weight': 100},
+                {'exercise_id': self.bench.id, 'reps': 8, 'weight': 60},
+            ],
+        }, format='json')
+        self.template_id = response.json()['id']
+        self.url = f'/api/templates/{self.template_id}/instantiate/'
+
+    def test_instantiate_template(self):
+        response = self.client.post(self.url, {}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        workout = response.json()
+        self.assertEqual(workout['name'], 'Push Legs')
+        self.assertEqual(workout['description'], 'Twice a week')
+        self.assertEqual(workout['template_id'], self.template_id)
+        self.assertEqual(
+            [(set_data['set_number'], set_data['volume'], set_data['total_volume']) for set_data in workout['exercises']],
+            [(1, 500, 500), (2, 500, 1000), (1, 480, 480)]
+        )
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual(len(user.workouts), 1)
+        self.assertEqual(user.personal_records[str(self.squat.id)]['max_weight'], 100)
+
+    def test_sets_without_duration(self):
+        sets = [
+            {'exercise_id': self.squat.id, 'reps': 5, 'weight': 100, 'duration_minutes': None},
+            {'exercise_id': self.squat.id, 'reps': 5, 'weight': 100, 'duration_minutes': 2},
+        ]
+        response = self.client.post('/api/templates/', {'name': 'Legs', 'exercises': sets}, format='json')
+
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual([set_data['set_number'] for set_data in response.json()['exercises']], [1, 2])
+
+    def test_overrides_change_single_sets(self):
+        response = self.client.post(self.url, {
+            'name': 'Heavy day',
+            'overrides': [{'index': 1, 'weight': 110, 'reps': 3}, {'index': 2, 'reps': 10}],
+        }, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        workout = response.json()
+        self.assertEqual(workout['name'], 'Heavy day')
+        self.assertEqual(
+            [(set_data['weight'], set_data['reps'], set_data['volume']) for set_data in workout['exercises']],
+            [(100, 5, 500), (110, 3, 330), (60, 10, 600)]
+        )
+        self.assertEqual(workout['exercises'][1]['total_volume'], 830)
+        # The template itself is unchanged
+        template = self.client.get(f'/api/templates/{self.template_id}/').json()
+        self.assertEqual(template['exercises'][1]['weight'], 100)
+
+    def test_out_of_range_override(self):
+        response = self.client.post(self.url, {'overrides': [{'index': 0, 'reps': 6}, {'index': 3, 'reps': 6}]},
+                                    format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'overrides': ['Set 3 does not exist in this template']})
+        self.assertEqual(User.objects.get(pk=self.user.pk).workouts, [])
+
+    def test_duplicate_override(self):
+        response = self.client.post(self.url, {'overrides': [{'index': 0, 'reps': 6}, {'index': 0, 'reps': 7}]},
+                                    format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('overrides', response.json())
+
+    def test_deleted_exercise(self):
+        self.bench.delete()
+
+        response = self.client.post(self.url, {}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'exercises': {'2': ['Exercise not found']}})
+
+    def test_other_users_template(self):
+        _, other = self.login('other@example.com')
+        self.assertEqual(other.post(self.url, {}, format='json').status_code, 404)
+
+
+class CustomExerciseTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user, self.client = self.login('custom@example.com')
+
+    def create(self, **fields):
+        return self.client.post('/api/custom-exercises/', {
+            'name': 'Band Pull Apart',
+            'primary_muscle': 'Rear Delts',
+            'exercise_type': 'Resistance Band Training',
+            **fields,
+        }, format='json')
+
+    def test_read_only_fields_are_ignored(self):
+        response = self.create(id=999, created_at='2000-01-01T00:00:00Z', updated_at='2000-01-01T00:00:00Z')
+
+        self.assertEqual(response.status_code, 201)
+        exercise = CustomExercise.objects.get()
+        self.assertEqual(response.json()['id'], exercise.pk)
+        self.assertNotEqual(exercise.pk, 999)
+        self.assertGreater(exercise.created_at.year, 2000)
+
+    def test_update_keeps_id_and_created_at(self):
+        created = self.create().json()
+
+        response = self.client.put(f"/api/custom-exercises/{created['id']}/", {
+            'id': 999,
+            'name': 'Face Pull',
+            'primary_muscle': 'Rear Delts',
+            'exercise_type': 'Cable Exercises',
+            'created_at': '2000-01-01T00:00:00Z',
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        updated = response.json()
+        self.assertEqual(updated['id'], created['id'])
+        self.assertEqual(updated['name'], 'Face Pull')
+        self.assertEqual(updated['created_at'], created['created_at'])
+        self.assertGreaterEqual(updated['updated_at'], created['updated_at'])
+
+    def test_template_set_metrics_are_read_only(self):
+        exercise = self.create().json()
+
+        response = self.client.post('/api/templates/', {
+            'name': 'Shoulders',
+            'exercises': [{
+                'exercise_id': exercise['id'], 'is_custom': True, 'reps': 15, 'weight': 10,
+                'volume': 1, 'one_rm': 1,
+            }],
+        }, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        stored = response.json()['exercises'][0]
+        self.assertEqual(stored['name'], 'Band Pull Apart')
+        self.assertNotIn('volume', stored)
+        self.assertNotIn('one_rm', stored)
+
+    def test_name_differing_only_by_case(self):
+        self.assertEqual(self.create(name='Band Pull Apart').status_code, 201)
+        self.assertEqual(self.create(name='Élan Row').status_code, 201)
+        self.assertEqual(self.create(name='Straße Curl').status_code, 201)
+
+        for name in ('band pull apart', ' BAND PULL APART ', 'élan row', 'STRASSE CURL'):
+            response = self.create(name=name)
+            self.assertEqual(response.status_code, 400, name)
+            self.assertEqual(response.json(), {'name': ['You already have an exercise with this name']})
+        self.assertEqual(CustomExercise.objects.count(), 3)
+
+    def test_rename_to_own_name_in_other_case(self):
+        created = self.create(name='Élan Row').json()
+
+        response = self.client.put(f"/api/custom-exercises/{created['id']}/", {
+            'name': 'ÉLAN ROW', 'primary_muscle': 'Rear Delts', 'exercise_type': 'Cable Exercises',
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(CustomExercise.objects.get().name_key, 'élan row')
+
+    def test_other_users_exercise(self):
+        created = self.create().json()
+        _, other = self.login('other@example.com')
+
+        self.assertEqual(other.get(f"/api/custom-exercises/{created['id']}/").status_code, 404)
+        self.assertEqual(other.delete(f"/api/custom-exercises/{created['id']}/").status_code, 404)
+        self.assertTrue(CustomExercise.objects.filter(pk=created['id']).exists())
+
+
+@override_settings(CACHES=TEST_CACHES)
+class MigrationTestCase(TransactionTestCase):
+    """Migrates back and forth, and to the latest state again after each test"""
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+
+class CustomExerciseTableMigrationTests(MigrationTestCase):
+    """0007 moves custom exercises and templates out of the user row"""
+    before = [('api', '0006_job')]
+    after = [('api', '0007_custom_exercises_and_templates_tables')]
+
+    def custom_exercise(self, exercise_id, name):
+        return {
+            'id': exercise_id, 'name': name, 'description': '', 'primary_muscle': 'Rear Delts',
+            'secondary_muscle': None, 'tertiary_muscle': None, 'exercise_type': 'Cable Exercises',
+            'created_at': '2025-01-01T00:00:00+00:00', 'updated_at': '2025-01-01T00:00:00+00:00',
+        }
+
+    def test_data_is_moved_and_references_rewritten(self):
+        apps = self.migrate(self.before)
+        User = apps.get_model('api', 'User')
+        # Takes table ids 1 and 2, so the second user's exercises get new ids
+        User.objects.create(
+            username='first@example.com', email='first@example.com',
+            custom_exercises=[self.custom_exercise(1, 'Face Pull'), self.custom_exercise(2, 'Rope Row')],
+        )
+        custom_set = {'exercise_id': 1, 'name': 'Band Pull Apart', 'is_custom': True, 'reps': 15, 'weight': 5}
+        catalog_set = {'exercise_id': 1, 'name': 'Squat', 'is_custom': False, 'reps': 5, 'weight': 100}
+        user = User.objects.create(
+            username='second@example.com', email='second@example.com',
+            custom_exercises=[self.custom_exercise(1, 'Band Pull Apart')],
+            templates=[{
+                'id': 1, 'name': 'Pull', 'description': '', 'created_at': '2025-01-02T00:00:00+00:00',
+                'exercises': [dict(custom_set), dict(catalog_set)],
+            }],
+            workouts=[{
+                'id': 1, 'name': 'Pull', 'created_at': '2025-01-03T00:00:00+00:00', 'template_id': 1,
+                'exercises': [dict(custom_set), dict(catalog_set)],
+            }],
+            personal_records={'custom_1': {'max_weight': 5}, '1': {'max_weight': 100}},
+        )
+
+        apps = self.migrate(self.after)
+        CustomExercise = apps.get_model('api', 'CustomExercise')
+        Template = apps.get_model('api', 'Template')
+        user = apps.get_model('api', 'User').objects.get(pk=user.pk)
+
+        exercise = CustomExercise.objects.get(user_id=user.pk)
+        self.assertEqual(exercise.name, 'Band Pull Apart')
+        self.assertEqual(exercise.pk, 3)
+        template = Template.objects.get(user_id=user.pk)
+        self.assertEqual([set_data['exercise_id'] for set_data in template.exercises], [3, 1])
+        workout = user.workouts[0]
+        self.assertEqual([set_data['exercise_id'] for set_data in workout['exercises']], [3, 1])
+        self.assertEqual(workout['template_id'], template.pk)
+        self.assertEqual(user.personal_records, {'custom_3': {'max_weight': 5}, '1': {'max_weight': 100}})
+
+        apps = self.migrate(self.before)
+        user = apps.get_model('api', 'User').objects.get(pk=user.pk)
+        self.assertEqual([exercise['id'] for exercise in user.custom_exercises], [3])
+        self.assertEqual(user.templates[0]['exercises'][0]['exercise_id'], 3)
+
+
+class CustomExerciseNameMigrationTests(MigrationTestCase):
+    """0008 and 0019 number names that only differ by case"""
+
+    def create_exercises(self, apps, *names):
+        user = apps.get_model('api', 'User').objects.create(username='names@example.com', email='names@example.com')
+        CustomExercise = apps.get_model('api', 'CustomExercise')
+        return [
+            CustomExercise.objects.create(
+                user_id=user.pk, name=name, primary_muscle='Rear Delts', exercise_type='Cable Exercises'
+            ).pk
+            for name in names
+        ]
+
+    def test_numbered_names_fit_the_column(self):
+        apps = self.migrate([('api', '0007_custom_exercises_and_templates_tables')])
+        ids = self.create_exercises(apps, 'R' * 100, 'r' * 100)
+        apps = self.migrate([('api', '0008_custom_exercise_unique_name')])
+        names = apps.get_model('api', 'CustomExercise').objects.in_bulk(ids)
+        self.assertEqual([names[pk].name for pk in ids], ['R' * 100, 'r' * 96 + ' (2)'])
+
+        apps.get_model('api', 'CustomExercise').objects.all().delete()
+        apps.get_model('api', 'User').objects.all().delete()
+        # casefold() turns the final sigma into σ; lower() leaves it alone
+        apps = self.migrate([('api', '0018_leaderboards')])
+        ids = self.create_exercises(apps, 'x' * 99 + 'σ', 'x' * 99 + 'ς')
+        apps = self.migrate([('api', '0019_custom_exercise_name_key')])
+        exercises = apps.get_model('api', 'CustomExercise').objects.in_bulk(ids)
+        self.assertEqual([exercises[pk].name for pk in ids], ['x' * 99 + 'σ', 'x' * 96 + ' (2)'])
+        self.assertEqual(exercises[ids[1]].name_key, 'x' * 96 + ' (2)')
+
+
+class ExerciseSearchTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        for name in ('Bench Press', 'Incline Bench Press', 'Dumbbell Bench Press', 'Squat', 'Romanian Deadlift'):
+            ExerciseList.objects.create(name=name, primary_muscle='Quadriceps', exercise_type='Barbell Exercises')
+        self.user, self.client = self.login('search@example.com')
+
+    def search(self, query, client=None):
+        response = (client or self.client).get('/api/exercises/search/', {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [(result['name'], result['match']) for result in response.json()['results']]
+
+    def test_exact_then_prefix_then_word_matches(self):
+        self.assertEqual(self.search('Bench press'), [
+            ('Bench Press', 'exact'),
+            ('Dumbbell Bench Press', 'token'),
+            ('Incline Bench Press', 'token'),
+        ])
+        self.assertEqual(self.search('ben')[0], ('Bench Press', 'prefix'))
+
+    def test_every_word_prefixes_a_name_word(self):
+        self.assertEqual(self.search('inc ben'), [('Incline Bench Press', 'token')])
+        # "db" prefixes no word, so only fuzzy matches are left
+        self.assertEqual({match for _, match in self.search('press db')}, {'fuzzy'})
+
+    def test_typos(self):
+        response = self.client.get('/api/exercises/search/', {'q': 'deadlfit'})
+
+        result, = response.json()['results']
+        self.assertEqual((result['name'], result['match']), ('Romanian Deadlift', 'fuzzy'))
+        self.assertLess(result['score'], 0.7)
+
+    def test_custom_exercises(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            created = self.client.post('/api/custom-exercises/', {
+                'name': 'Banded Squat', 'primary_muscle': 'Quadriceps', 'exercise_type': 'Resistance Band Training',
+            }, format='json').json()
+
+        results = self.client.get('/api/exercises/search/', {'q': 'squat'}).json()['results']
+        self.assertEqual([(result['name'], result['is_custom']) for result in results],
+                         [('Squat', False), ('Banded Squat', True)])
+        _, other = self.login('other@example.com')
+        self.assertEqual(self.search('squat', other), [('Squat', 'exact')])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f"/api/custom-exercises/{created['id']}/")
+        self.assertEqual(self.search('squat'), [('Squat', 'exact')])
+
+    def test_names_in_any_script(self):
+        ExerciseList.objects.create(name='Développé Couché', primary_muscle='Middle Chest')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/custom-exercises/', {
+                'name': 'Жим лёжа', 'primary_muscle': 'Middle Chest', 'exercise_type': 'Barbell Exercises',
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        self.assertEqual(self.search('Жим'), [('Жим лёжа', 'prefix')])
+        self.assertEqual(self.search('ЛЁЖА'), [('Жим лёжа', 'token')])
+        self.assertEqual(self.search('couché'), [('Développé Couché', 'token')])
+        self.assertEqual(self.search('DÉVELOPPÉ couché'), [('Développé Couché', 'exact')])
+
+    def test_catalog_version_is_bumped_on_commit(self):
+        self.assertEqual(self.search('hack'), [])
+        version = get_catalog_version()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ExerciseList.objects.create(name='Hack Squat', primary_muscle='Quadriceps', exercise_type='Machine-Based Workouts')
+            self.assertEqual(get_catalog_version(), version)
+
+        self.assertNotEqual(get_catalog_version(), version)
+        self.assertEqual(self.search('hack'), [('Hack Squat', 'prefix')])
+
+    def test_limit_and_query(self):
+        self.assertEqual(len(self.client.get('/api/exercises/search/', {'q': 'b', 'limit': 1}).json()['results']), 1)
+        self.assertEqual(self.client.get('/api/exercises/search/', {'q': ' '}).status_code, 400)
+        self.assertEqual(self.client.get('/api/exercises/search/', {'q': 'b', 'limit': 'x'}).status_code, 400)
+
+
+class ExerciseCatalogFilterTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        for name, primary, secondary, tertiary, exercise_type in (
+            ('Squat', 'Quadriceps', 'Glutes', 'Erector Spinae', 'Barbell Exercises'),
+            ('Leg Press', 'Quadriceps', 'Glutes', None, 'Machine-Based Workouts'),
+            ('Romanian Deadlift', 'Hamstrings', 'Glutes', 'Erector Spinae', 'Barbell Exercises'),
+            ('Bench Press', 'Middle Chest', 'Front Delts', 'Lateral Head of Triceps', 'Barbell Exercises'),
+        ):
+            ExerciseList.objects.create(
+                name=name, primary_muscle=primary, secondary_muscle=secondary, tertiary_muscle=tertiary,
+                exercise_type=exercise_type
+            )
+        self.user, self.client = self.login('catalog@example.com')
+
+    def names(self, params):
+        response = self.client.get('/api/exercises/', params)
+        self.assertEqual(response.status_code, 200)
+        return {exercise['name'] for exercise in response.json()}
+
+    def test_slot_filters(self):
+        self.assertEqual(self.names({'primary_muscle': 'Quadriceps'}), {'Squat', 'Leg Press'})
+        self.assertEqual(self.names({'tertiary_muscle': 'Erector Spinae'}), {'Squat', 'Romanian Deadlift'})
+
+    def test_repeated_values_match_any(self):
+        self.assertEqual(
+            self.names({'primary_muscle': ['Hamstrings', 'Middle Chest']}),
+            {'Romanian Deadlift', 'Bench Press'}
+        )
+
+    def test_filters_combine(self):
+        self.assertEqual(
+            self.names({'secondary_muscle': 'Glutes', 'exercise_type': 'Barbell Exercises'}),
+            {'Squat', 'Romanian Deadlift'}
+        )
+
+    def test_muscle_in_any_slot(self):
+        self.assertEqual(self.names({'muscle': 'Glutes'}), {'Squat', 'Leg Press', 'Romanian Deadlift'})
+        self.assertEqual(
+            self.names({'muscle': ['Front Delts', 'Hamstrings'], 'exercise_type': 'Barbell Exercises'}),
+            {'Bench Press', 'Romanian Deadlift'}
+        )
+        self.assertEqual(self.names({'muscle': 'Calves'}), set())
+
+    def test_muscle_index_follows_catalog_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ExerciseList.objects.filter(name='Leg Press').get().delete()
+
+        self.assertEqual(self.names({'muscle': 'Glutes'}), {'Squat', 'Romanian Deadlift'})
+
+    def test_invalid_values(self):
+        response = self.client.get('/api/exercises/', {'primary_muscle': ['Quadriceps', 'Quads'], 'exercise_type': 'Yoga'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('primary_muscle', response.json())
+
+    def test_etag_changes_with_catalog(self):
+        etag = self.client.get('/api/exercises/')['ETag']
+        self.assertEqual(self.client.get('/api/exercises/', {'muscle': 'Glutes'})['ETag'], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ExerciseList.objects.create(name='Calf Raise', primary_muscle='Calves', exercise_type='Machine-Based Workouts')
+
+        self.assertNotEqual(self.client.get('/api/exercises/')['ETag'], etag)
+
+
+class SimilarExerciseTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.exercises = {}
+        for name, primary, secondary, tertiary, exercise_type in (
+            ('Bench Press', 'Middle Chest', 'Front Delts', 'Lateral Head of Triceps', 'Barbell Exercises'),
+            ('Dumbbell Bench Press', 'Middle Chest', 'Front Delts', 'Lateral Head of Triceps', 'Dumbbell Exercises'),
+            ('Close-Grip Bench Press', 'Lateral Head of Triceps', 'Middle Chest', None, 'Barbell Exercises'),
+            ('Incline Bench Press', 'Upper Chest', 'Front Delts', 'Lateral Head of Triceps', 'Barbell Exercises'),
+            ('Squat', 'Quadriceps', 'Glutes', None, 'Barbell Exercises'),
+        ):
+            self.exercises[name] = ExerciseList.objects.create(
+                name=name, primary_muscle=primary, secondary_muscle=secondary, tertiary_muscle=tertiary,
+                exercise_type=exercise_type
+            )
+        self.user, self.client = self.login('similar@example.com')
+        self.url = f"/api/exercises/{self.exercises['Bench Press'].id}/similar/"
+
+    def similar(self, url=None, client=None, **params):
+        response = (client or self.client).get(url or self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return [(result['name'], result['score']) for result in response.json()['results']]
+
+    def test_ranked_by_muscles_and_type(self):
+        # 0.75 × cosine of the 1.0/0.5/0.25 muscle vectors + 0.25 for the same type
+        self.assertEqual(self.similar(), [
+            ('Dumbbell Bench Press', 0.75),
+            ('Close-Grip Bench Press', 0.689),
+            ('Incline Bench Press', 0.429),
+        ])
+
+    def test_type_filter_and_limit(self):
+        self.assertEqual([name for name, _ in self.similar(type='same')], ['Close-Grip Bench Press', 'Incline Bench Press'])
+        self.assertEqual([name for name, _ in self.similar(type='different')], ['Dumbbell Bench Press'])
+        self.assertEqual([name for name, _ in self.similar(k=1)], ['Dumbbell Bench Press'])
+
+    def test_custom_exercises(self):
+        custom = CustomExercise.objects.create(
+            user=self.user, name='Machine Chest Press', primary_muscle='Middle Chest', secondary_muscle='Front Delts',
+            tertiary_muscle='Lateral Head of Triceps', exercise_type='Machine-Based Workouts'
+        )
+
+        results = self.client.get(self.url, {'k': 1, 'type': 'different'}).json()['results']
+        self.assertEqual([(result['name'], result['is_custom']) for result in results], [('Dumbbell Bench Press', False)])
+        self.assertIn(('Machine Chest Press', 0.75), self.similar(k=10))
+        _, other = self.login('other@example.com')
+        self.assertNotIn('Machine Chest Press', [name for name, _ in self.similar(client=other, k=10)])
+
+        response = self.client.get(f'/api/exercises/custom_{custom.id}/similar/', {'k': 2})
+        self.assertEqual(response.json()['exercise']['is_custom'], True)
+        self.assertEqual(
+            [(result['name'], result['score']) for result in response.json()['results']],
+            [('Bench Press', 0.75), ('Dumbbell Bench Press', 0.75)]
+        )
+
+    def test_not_found_and_invalid_parameters(self):
+        self.assertEqual(self.client.get('/api/exercises/999999/similar/').status_code, 404)
+        self.assertEqual(self.client.get('/api/exercises/custom_999999/similar/').status_code, 404)
+        self.assertEqual(self.client.get('/api/exercises/bench/similar/').status_code, 404)
+        self.assertEqual(self.client.get(self.url, {'type': 'other'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'k': 'x'}).status_code, 400)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class LoadExercisesCommandTests(TestCase):
+    def load(self, *args):
+        out = StringIO()
+        call_command('load_exercises', *args, stdout=out, stderr=StringIO())
+        return out.getvalue().strip()
+
+    def write_file(self, name, rows):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / name
+        path.write_text(json.dumps(rows), encoding='utf-8')
+        return str(path)
+
+    def test_dry_run_writes_nothing(self):
+        version = get_catalog_version()
+        self.assertEqual(self.load('--dry-run'), 'Dry run: 13 inserted, 0 updated, 0 unchanged')
+        self.assertFalse(ExerciseList.objects.exists())
+        self.assertEqual(get_catalog_version(), version)
+
+        self.load()
+        path = self.write_file('exercises.json', [
+            {'name': 'Pull-Ups', 'description': 'Changed', 'primary_muscle': 'Lats'},
+            {'name': 'Chin-Ups', 'primary_muscle': 'Lats'},
+        ])
+        version = get_catalog_version()
+        self.assertEqual(self.load('--file', path, '--dry-run'), 'Dry run: 1 inserted, 1 updated, 0 unchanged')
+        self.assertFalse(ExerciseList.objects.filter(name='Chin-Ups').exists())
+        self.assertNotEqual(ExerciseList.objects.get(name='Pull-Ups').description, 'Changed')
+        self.assertEqual(get_catalog_version(), version)
+
+    def test_loading_twice_changes_nothing(self):
+        self.assertEqual(self.load(), '13 inserted, 0 updated, 0 unchanged')
+        updated_at = dict(ExerciseList.objects.values_list('name', 'updated_at'))
+        version = get_catalog_version()
+
+        self.assertEqual(self.load(), '0 inserted, 0 updated, 13 unchanged')
+        self.assertEqual(dict(ExerciseList.objects.values_list('name', 'updated_at')), updated_at)
+        self.assertEqual(get_catalog_version(), version)
+
+    def test_updates_changed_rows_only(self):
+        self.load()
+        path = self.write_file('exercises.json', [
+            {'name': 'Pull-Ups', 'description': 'Changed', 'primary_muscle': 'Lats'},
+            {'name': 'Push-Ups', 'description': ExerciseList.objects.get(name='Push-Ups').description,
+             'primary_muscle': 'Middle Chest', 'secondary_muscle': 'Lateral Head of Triceps',
+             'tertiary_muscle': 'Front Delts', 'exercise_type': 'Bodyweight Training'},
+        ])
+        self.assertEqual(self.load('--file', path), '0 inserted, 1 updated, 1 unchanged')
+        pull_ups = ExerciseList.objects.get(name='Pull-Ups')
+        self.assertEqual((pull_ups.description, pull_ups.secondary_muscle), ('Changed', None))
+        self.assertEqual(ExerciseList.objects.count(), 13)
+
+    def test_invalid_rows_write_nothing(self):
+        path = self.write_file('exercises.json', [
+            {'name': 'Chin-Ups', 'primary_muscle': 'Lats'},
+            {'name': 'Curl', 'primary_muscle': 'Forearms and elbows'},
+            {'name': 'Row', 'grip': 'wide'},
+        ])
+        with self.assertRaisesMessage(CommandError, 'Row 2 (Curl)'):
+            self.load('--file', path)
+        self.assertFalse(ExerciseList.objects.exists())
+
+
+@override_settings(DB_REPLICAS=['replica.sqlite3'], DB_REPLICA_PIN_SECONDS=10)
+@override_settings(CACHES=TEST_CACHES)
+class ReplicaRoutingTests(SimpleTestCase):
+    """Routing decisions only; SimpleTestCase also proves they make no queries"""
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch('api.routers.replica_aliases', return_value=['replica_1'])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.router = PrimaryReplicaRouter()
+
+    def request(self, method='get', user=None, cookies=None):
+        """(alias a read in the view went to, response) of a request through the middleware"""
+        routed = []
+
+        def view(request):
+            # DRF sets the user on the request once it authenticated it
+            if user is not None:
+                request.user = user
+            routed.append(self.router.db_for_read(User))
+            return HttpResponse()
+
+        request = getattr(RequestFactory(), method)('/api/workouts/')
+        request.COOKIES.update(cookies or {})
+        response = ReplicaPinningMiddleware(view)(request)
+        return routed[0], response
+
+    def test_router(self):
+        self.assertEqual(self.router.db_for_read(User), 'default')
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(User), 'replica_1')
+            self.assertEqual(self.router.db_for_write(User), 'default')
+            with replica_reads(lambda: False):
+                self.assertEqual(self.router.db_for_read(User), 'default')
+            with mock.patch.object(connection, 'in_atomic_block', True):
+                self.assertEqual(self.router.db_for_read(User), 'default')
+        self.assertTrue(self.router.allow_migrate('default', 'api'))
+        self.assertFalse(self.router.allow_migrate('replica_1', 'api'))
+
+    def test_writes_pin_the_client(self):
+        self.assertEqual(self.request()[0], 'replica_1')
+        alias, response = self.request('post')
+        self.assertEqual(alias, 'default')
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 10)
+        self.assertEqual(self.request(cookies={PIN_COOKIE: '1'})[0], 'default')
+
+    def test_writes_pin_the_user(self):
+        user, other = User(pk=1), User(pk=2)
+        self.request('post', user=user)
+        self.assertIsNotNone(cache.get(user_pin_key(1)))
+
+        # From another client, without the cookie
+        self.assertEqual(self.request(user=user)[0], 'default')
+        self.assertEqual(self.request(user=other)[0], 'replica_1')
+        self.assertEqual(self.request()[0], 'replica_1')
+
+        cache.delete(user_pin_key(1))
+        self.assertEqual(self.request(user=user)[0], 'replica_1')
+
+    def test_failed_writes_do_not_pin(self):
+        def view(request):
+            request.user = User(pk=1)
+            return HttpResponse(status=400)
+
+        response = ReplicaPinningMiddleware(view)(RequestFactory().post('/api/workouts/'))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        self.assertIsNone(cache.get(user_pin_key(1)))
+
+    def test_lazy_user_is_not_evaluated(self):
+        def view(request):
+            request.user = SimpleLazyObject(lambda: self.fail('evaluated the lazy user'))
+            return HttpResponse(self.router.db_for_read(User))
+
+        response = ReplicaPinningMiddleware(view)(RequestFactory().get('/api/workouts/'))
+        self.assertEqual(response.content, b'replica_1')
+
+    @override_settings(DB_REPLICAS=[])
+    def test_without_replicas(self):
+        alias, response = self.request('post', user=User(pk=1))
+        self.assertEqual(alias, 'default')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(self.request()[0], 'default')
+
+
+class WorkoutRangeTests(APITestCase):
+    def test_filters_on_completion_time_in_the_database(self):
+        user, client = self.login('range@example.com')
+        bench = ExerciseList.objects.create(name='Bench Press', primary_muscle='Middle Chest')
+        for completed in ('2025-03-01T23:30:00-02:00', '2025-03-02T10:00:00+00:00', '2025-03-03T00:00:00+00:00'):
+            self.log_workout(client, [(bench, 5, 100)], time_completed=completed)
+        # Completion time falls back to the creation time
+        self.log_workout(client, [(bench, 5, 100)])
+        *ids, latest = [workout['id'] for workout in User.objects.get(pk=user.pk).workouts]
+
+        def between(start=None, end=None):
+            return [workout['id'] for workout in workouts_in_range(user, start, end)]
+
+        march_2 = datetime(2025, 3, 2, tzinfo=dt_timezone.utc)
+        self.assertEqual(between(march_2, march_2 + timedelta(days=1)), ids[:2])
+        self.assertEqual(between(march_2 + timedelta(days=1)), [ids[2], latest])
+        self.assertEqual(between(end=march_2), [])
+        self.assertEqual(between(), [*ids, latest])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'jsonb queries of api/history.py')
+class PostgreSQLHistoryTests(APITestCase):
+    def test_range_filter_matches_python(self):
+        completed = [
+            '2025-03-01T23:30:00-02:00', '2025-03-02T01:00:00+00:00', '2025-03-02T10:00:00Z',
+            None, '2025-03-03T00:00:00+00:00', '2025-03-02T12:00:00.250000+05:30',
+        ]
+        # Stored order differs from id order; results keep the stored order
+        workouts = [
+            {
+                'id': workout_id, 'name': f'Workout {workout_id}', 'created_at': '2025-03-02T18:00:00+00:00',
+                **({'time_completed': time_completed} if time_completed else {}),
+                'exercises': [{'exercise_id': 1, 'reps': 5, 'weight': 100.5, 'is_custom': False}],
+            }
+            for workout_id, time_completed in zip([3, 1, 6, 2, 5, 4], completed)
+        ]
+        user = User.objects.create_user(username='jsonb@example.com', email='jsonb@example.com', workouts=workouts)
+
+        march_2 = datetime(2025, 3, 2, tzinfo=dt_timezone.utc)
+        for start, end in (
+            (None, None),
+            (march_2, march_2 + timedelta(days=1)),
+            (march_2 + timedelta(hours=6), None),
+            (None, march_2 + timedelta(hours=1)),
+            (march_2 + timedelta(days=2), None),
+        ):
+            with self.subTest(start=start, end=end):
+                self.assertEqual(
+                    live_workouts_in_range(user, start, end),
+                    [workout for workout in workouts if completed_between(workout, start, end)],
+                )
+        self.assertEqual(
+            [workout['id'] for workout in live_workouts_in_range(user, march_2, march_2 + timedelta(days=1))],
+            [3, 1, 6, 2, 4],
+        )
+
+    def test_personal_records_of_some_exercises(self):
+        records = {
+            '1': {'max_weight': 100}, '12': {'max_weight': 120}, 'custom_3': {'max_weight': 20.5},
+        }
+        user = User.objects.create_user(username='records@example.com', email='records@example.com',
+                                        personal_records=records)
+
+        # Numeric keys are object keys, not array indexes
+        self.assertEqual(personal_records_for(user, ['12', 'custom_3', '99']),
+                         {'12': records['12'], 'custom_3': records['custom_3']})
+        self.assertEqual(personal_records_for(user, ['1']), {'1': records['1']})
+        self.assertEqual(personal_records_for(user, ['0']), {})
+
+        squat = ExerciseList.objects.create(name='Squat', primary_muscle='Quadriceps')
+        user.personal_records = {**records, str(squat.id): {'max_weight': 140}}
+        user.save()
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get('/api/personal-records/', {'exercise': str(squat.id)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.json()), [str(squat.id)])
+        self.assertEqual(response.json()[str(squat.id)]['max_weight'], 140)
+
+
+class WorkoutArchiveTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.bench = ExerciseList.objects.create(name='Bench Press', primary_muscle='Middle Chest')
+        self.user, self.client = self.login('archive@example.com')
+        # Two old months and a recent workout
+        recent = (timezone.now() - timedelta(days=10)).isoformat()
+        for completed in ('2024-01-10T10:00:00Z', '2024-01-20T10:00:00Z', '2024-03-05T10:00:00Z', recent):
+            self.log_workout(self.client, [(self.bench, 5, 100)], time_completed=completed)
+
+    def archive(self):
+        out = StringIO()
+        call_command('archive_workouts', '--days', '180', stdout=out)
+        return out.getvalue().strip()
+
+    def history_ids(self, *bounds):
+        return [workout['id'] for workout in User.objects.get(pk=self.user.pk).workout_history(*bounds)]
+
+    def test_archive_command(self):
+        self.assertTrue(self.archive().startswith('Archived 3 workouts of 1 users'))
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual([workout['id'] for workout in user.workouts], [4])
+        archives = list(user.workout_archives.order_by('month'))
+        self.assertEqual([archive.workout_count for archive in archives], [2, 1])
+        self.assertEqual([[workout['id'] for workout in archive.workouts] for archive in archives], [[1, 2], [3]])
+        self.assertEqual(self.history_ids(), [1, 2, 3, 4])
+
+        self.assertTrue(self.archive().startswith('Archived 0 workouts of 0 users'))
+        self.assertEqual(self.history_ids(), [1, 2, 3, 4])
+
+    def test_newest_workout_stays(self):
+        call_command('archive_workouts', '--days', '0', stdout=StringIO())
+        self.assertEqual([workout['id'] for workout in User.objects.get(pk=self.user.pk).workouts], [4])
+
+    def test_ranges_read_only_their_months(self):
+        self.archive()
+        now = timezone.now()
+        start, end = datetime(2024, 3, 1, tzinfo=dt_timezone.utc), now - timedelta(days=5)
+        self.assertEqual(
+            list(WorkoutArchive.objects.overlapping(start, end).values_list('month', flat=True)),
+            [month_start(start)]
+        )
+        self.assertEqual(self.history_ids(start, end), [3, 4])
+        self.assertEqual(self.history_ids(None, start), [1, 2])
+        self.assertEqual(self.history_ids(now - timedelta(days=30)), [4])
+
+    def test_list_includes_archived_workouts(self):
+        self.archive()
+        # The test client reuses one user object, which still holds the archived workouts
+        self.client.force_authenticate(User.objects.get(pk=self.user.pk))
+        for _ in range(2):
+            self.log_workout(self.client, [(self.bench, 5, 100)])
+
+        # A plain array by default
+        workouts = self.client.get('/api/workouts/').json()
+        self.assertIsInstance(workouts, list)
+        self.assertEqual([workout['id'] for workout in workouts], [1, 2, 3, 4, 5, 6])
+        self.assertEqual(
+            [workout['id'] for workout in self.client.get('/api/workouts/', {'end': '2024-01-31'}).json()], [1, 2]
+        )
+
+        # Pages on request
+        page = self.client.get('/api/workouts/', {'page_size': 4}).json()
+        self.assertEqual(page['count'], 6)
+        self.assertEqual([workout['id'] for workout in page['results']], [1, 2, 3, 4])
+        self.assertEqual([workout['id'] for workout in self.client.get(page['next']).json()['results']], [5, 6])
+        self.assertEqual(self.client.get('/api/workouts/', {'start': '2024-01-01', 'page': 1}).json()['count'], 6)
+
+    def test_concurrent_save_writes_archived_workouts_back(self):
+        # Loaded by a request before the archive run, saved after it
+        stale = User.objects.get(pk=self.user.pk)
+        sets = stale.workouts[-1]['exercises']
+        self.archive()
+        record_workout(stale, 'Late', sets)
+
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual([workout['id'] for workout in user.workouts], [1, 2, 3, 4, 5])
+        self.assertEqual(self.history_ids(), [1, 2, 3, 4, 5])
+        self.assertEqual(self.history_ids(None, datetime(2024, 2, 1, tzinfo=dt_timezone.utc)), [1, 2])
+
+        # Edits go to the copy in the row, which replaces the archived one next run
+        update_workout(user, 1, {'name': 'Renamed'})
+        self.assertTrue(self.archive().startswith('Archived 3 workouts of 1 users'))
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual([workout['id'] for workout in user.workouts], [4, 5])
+        archives = list(user.workout_archives.order_by('month'))
+        self.assertEqual([archive.workout_count for archive in archives], [2, 1])
+        self.assertEqual(archives[0].workouts[0]['name'], 'Renamed')
+        self.assertEqual(self.history_ids(), [1, 2, 3, 4, 5])
+
+
+class CompressionTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        for number in range(30):
+            ExerciseList.objects.create(
+                name=f'Exercise {number}', description='Long enough to compress. ' * 4, primary_muscle='Middle Chest'
+            )
+        self.user, self.client = self.login('compression@example.com')
+
+    def respond(self, path, content_type, body=b'{"value": "compressible"}' * 100):
+        request = RequestFactory().get(path, HTTP_ACCEPT_ENCODING='gzip')
+        return CompressionMiddleware(lambda request: HttpResponse(body, content_type=content_type))(request)
+
+    def test_negotiation(self):
+        self.assertEqual(negotiate_encoding('gzip'), 'gzip')
+        self.assertEqual(negotiate_encoding('gzip;q=0.5, br;q=0.8'), 'br' if brotli else 'gzip')
+        self.assertEqual(negotiate_encoding('*'), next(iter(CODECS)))
+        self.assertEqual(negotiate_encoding('*, gzip;q=0'), next((name for name in CODECS if name != 'gzip'), None))
+        self.assertEqual(negotiate_encoding('GZIP;q=bogus, deflate'), None)
+        self.assertIsNone(negotiate_encoding('gzip;q=0'))
+        self.assertIsNone(negotiate_encoding('identity'))
+        self.assertIsNone(negotiate_encoding(None))
+
+    def test_catalog_body_is_cached_by_etag(self):
+        calls = []
+
+        def compress(data):
+            calls.append(data)
+            return compress_gzip(data)
+
+        with mock.patch.dict(CODECS, {'gzip': (compress, GzipStream)}):
+            first = self.client.get('/api/exercises/', HTTP_ACCEPT_ENCODING='gzip')
+            second = self.client.get('/api/exercises/', HTTP_ACCEPT_ENCODING='gzip')
+            self.assertEqual(len(calls), 1)
+            self.assertEqual(second.content, first.content)
+            self.assertEqual(first['Content-Encoding'], 'gzip')
+            self.assertIn('Accept-Encoding', first['Vary'])
+            self.assertTrue(first['ETag'].startswith('W/"catalog-'))
+            self.assertEqual(json.loads(gzip.decompress(first.content)), self.client.get('/api/exercises/').json())
+
+            # A catalog change is a new ETag, so the body is compressed again
+            with self.captureOnCommitCallbacks(execute=True):
+                ExerciseList.objects.create(name='Exercise 30', primary_muscle='Lats')
+            third = self.client.get('/api/exercises/', HTTP_ACCEPT_ENCODING='gzip')
+            self.assertEqual(len(calls), 2)
+            self.assertNotEqual(third['ETag'], first['ETag'])
+            self.assertIn('Exercise 30', gzip.decompress(third.content).decode())
+
+    def test_only_api_json_is_compressed(self):
+        self.assertEqual(self.respond('/api/workouts/', 'application/json')['Content-Encoding'], 'gzip')
+        for path, content_type in (
+            ('/api/workouts/', 'text/html; charset=utf-8'),
+            ('/admin/', 'text/html; charset=utf-8'),
+            ('/api/auth/user/', 'application/json'),
+        ):
+            with self.subTest(path=path, content_type=content_type):
+                self.assertFalse(self.respond(path, content_type).has_header('Content-Encoding'))
+        self.assertFalse(self.respond('/api/workouts/', 'application/json', b'{}').has_header('Content-Encoding'))
+        # Not smaller compressed
+        incompressible = random.Random(0).randbytes(2000)
+        self.assertFalse(self.respond('/api/workouts/', 'application/json', incompressible).has_header('Content-Encoding'))
+
+    def test_streams_flush_every_chunk(self):
+        decompressors = {'gzip': lambda: zlib.decompressobj(16 + zlib.MAX_WBITS).decompress}
+        if brotli:
+            decompressors['br'] = lambda: brotli.Decompressor().process
+        if zstandard:
+            decompressors['zstd'] = lambda: zstandard.ZstdDecompressor().decompressobj().decompress
+        events = [f'event: set_logged\ndata: {{"position": {number}}}\n\n'.encode() for number in range(3)]
+
+        for encoding, decompressor in decompressors.items():
+            with self.subTest(encoding=encoding):
+                request = RequestFactory().get('/api/events/', HTTP_ACCEPT_ENCODING=encoding)
+                response = CompressionMiddleware(
+                    lambda request: StreamingHttpResponse(iter(events), content_type='text/event-stream')
+                )(request)
+                self.assertEqual(response['Content-Encoding'], encoding)
+                self.assertFalse(response.has_header('Content-Length'))
+                decompress = decompressor()
+                chunks = iter(response.streaming_content)
+                # Each event can be decoded before the next one is produced
+                for event in events:
+                    self.assertEqual(decompress(next(chunks)), event)
+                self.assertEqual(decompress(b''.join(chunks)), b'')
+
+
+class WorkoutSessionTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.bench = ExerciseList.objects.create(
+            name='Bench Press', primary_muscle='Middle Chest', exercise_type='Barbell Exercises'
+        )
+        self.user, self.client = self.login('session@example.com')
+
+    def start(self, client=None):
+        response = (client or self.client).post('/api/sessions/', {'name': 'Push'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()['id']
+
+    def log_set(self, session_id, reps, weight):
+        return self.client.post(
+            f'/api/sessions/{session_id}/sets/', {'exercise_id': self.bench.id, 'reps': reps, 'weight': weight},
+            format='json'
+        )
+
+    def test_log_sets_and_finish(self):
+        session_id = self.start()
+        with mock.patch('api.events.broker.publish') as published:
+            with self.captureOnCommitCallbacks() as callbacks:
+                response = self.log_set(session_id, 5, 100)
+            self.assertEqual(response.status_code, 201)
+            published.assert_not_called()
+            for callback in callbacks:
+                callback()
+            self.assertEqual(published.call_args.args[:2], (self.user.pk, 'set_logged'))
+
+        second = self.log_set(session_id, 4, 100).json()
+        self.assertEqual((second['position'], second['set_number'], second['total_volume']), (2, 2, 900))
+        session = self.client.get(f'/api/sessions/{session_id}/').json()
+        self.assertEqual([set_data['reps'] for set_data in session['exercises']], [5, 4])
+        self.assertEqual([item['id'] for item in self.client.get('/api/sessions/').json()], [session_id])
+
+        with mock.patch('api.events.broker.publish') as published:
+            with self.captureOnCommitCallbacks() as callbacks:
+                response = self.client.post(f'/api/sessions/{session_id}/finish/')
+            self.assertEqual(response.status_code, 201)
+            # Nothing leaves the transaction before it commits
+            published.assert_not_called()
+            self.assertFalse(Job.objects.exists())
+            for callback in callbacks:
+                callback()
+            self.assertIn('workout_finished', [call.args[1] for call in published.call_args_list])
+        self.assertTrue(Job.objects.filter(name='process_workout').exists())
+
+        workout = response.json()
+        self.assertEqual([set_data['set_number'] for set_data in workout['exercises']], [1, 2])
+        self.assertEqual(User.objects.get(pk=self.user.pk).workouts, [workout])
+        self.assertEqual(self.client.get(f'/api/sessions/{session_id}/').status_code, 404)
+        self.assertEqual(self.client.post(f'/api/sessions/{session_id}/finish/').status_code, 404)
+        self.assertEqual(len(User.objects.get(pk=self.user.pk).workouts), 1)
+
+    def test_finish_needs_a_set(self):
+        session_id = self.start()
+        self.assertEqual(self.client.post(f'/api/sessions/{session_id}/finish/').status_code, 400)
+        # Validated like a set of a posted workout
+        self.assertEqual(self.log_set(session_id, None, None).status_code, 400)
+        self.assertEqual(self.client.post(f'/api/sessions/{session_id}/sets/', {}, format='json').status_code, 400)
+        self.assertEqual(self.client.get(f'/api/sessions/{session_id}/').json()['exercises'], [])
+
+    def test_other_users_sessions_are_not_found(self):
+        _, other = self.login('other@example.com')
+        session_id = self.start(other)
+        for method, url in (
+            ('get', f'/api/sessions/{session_id}/'),
+            ('post', f'/api/sessions/{session_id}/sets/'),
+            ('post', f'/api/sessions/{session_id}/finish/'),
+            ('delete', f'/api/sessions/{session_id}/'),
+            ('get', '/api/sessions/999999/'),
+        ):
+            with self.subTest(method=method, url=url):
+                data = {'exercise_id': self.bench.id, 'reps': 5, 'weight': 100} if url.endswith('sets/') else None
+                self.assertEqual(getattr(self.client, method)(url, data, format='json').status_code, 404)
+        self.assertEqual(self.client.get('/api/sessions/').json(), [])
+
+        self.assertEqual(other.delete(f'/api/sessions/{session_id}/').status_code, 204)
+        self.assertEqual(other.get(f'/api/sessions/{session_id}/').status_code, 404)
+
+
+async def empty_stream():
+    return
+    yield
+
+
+class EventStreamPermissionTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.coach = User.objects.create_user(username='coach@example.com', email='coach@example.com')
+        self.athletes = [
+            User.objects.create_user(username=f'athlete{number}@example.com', email=f'athlete{number}@example.com')
+            for number in range(2)
+        ]
+        for athlete in self.athletes:
+            athlete.coaches.add(self.coach)
+        self.stranger = User.objects.create_user(username='stranger@example.com', email='stranger@example.com')
+
+    async def stream(self, user, **params):
+        """(response, user ids the stream follows) of an ASGI request"""
+        followed = []
+
+        def event_stream(user_ids):
+            followed.append(sorted(user_ids))
+            return empty_stream()
+
+        client = AsyncClient()
+        if user is not None:
+            await client.aforce_login(user)
+        with mock.patch('api.async_views.event_stream', event_stream):
+            response = await client.get('/api/events/', params)
+        return response, (followed[0] if followed else None)
+
+    async def test_own_stream(self):
+        response, followed = await self.stream(self.stranger)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(followed, [self.stranger.pk])
+
+    async def test_coach_streams_only_their_athletes(self):
+        athlete_ids = sorted(athlete.pk for athlete in self.athletes)
+        response, followed = await self.stream(self.coach, athlete=str(athlete_ids[0]))
+        self.assertEqual((response.status_code, followed), (200, [athlete_ids[0]]))
+        response, followed = await self.stream(self.coach, athlete='all')
+        self.assertEqual((response.status_code, followed), (200, athlete_ids))
+
+        for user, athlete in (
+            (self.coach, self.stranger.pk),
+            (self.stranger, athlete_ids[0]),
+            # Coaching is one way
+            (self.athletes[0], self.coach.pk),
+            (self.coach, 'abc'),
+        ):
+            with self.subTest(user=user.email, athlete=athlete):
+                response, followed = await self.stream(user, athlete=str(athlete))
+                self.assertEqual((response.status_code, followed), (404, None))
+
+    async def test_anonymous_and_wsgi_requests(self):
+        response, followed = await self.stream(None)
+        self.assertIn(response.status_code, (401, 403))
+        self.assertIsNone(followed)
+
+        client = APIClient()
+        client.force_authenticate(self.stranger)
+        self.assertEqual((await sync_to_async(client.get)('/api/events/')).status_code, 501)
+
+
+@receiver(setting_changed)
+def reload_api_urls(setting, **kwargs):
+    # api/urls.py picks the async views when it is imported, and the root
+    # URLconf keeps the patterns it included
+    if setting == 'ASYNC_VIEWS':
+        importlib.reload(api_urls)
+        importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+        clear_url_caches()
+
+
+@override_settings(ASYNC_VIEWS=True)
+class AsyncViewTests(APITestCase):
+    """The async variants answer exactly like the synchronous views"""
+
+    def setUp(self):
+        super().setUp()
+        for name, primary, secondary, exercise_type in (
+            ('Squat', 'Quadriceps', 'Glutes', 'Barbell Exercises'),
+            ('Leg Press', 'Quadriceps', 'Glutes', 'Machine-Based Workouts'),
+            ('Bench Press', 'Middle Chest', 'Front Delts', 'Barbell Exercises'),
+        ):
+            ExerciseList.objects.create(
+                name=name, primary_muscle=primary, secondary_muscle=secondary, exercise_type=exercise_type
+            )
+        self.user, _ = self.login('async@example.com')
+        squat, bench = ExerciseList.objects.get(name='Squat'), ExerciseList.objects.get(name='Bench Press')
+        custom = CustomExercise.objects.create(user=self.user, name='Landmine Press', primary_muscle='Front Delts')
+        self.user.personal_records = {
+            str(squat.id): {'max_weight': 140}, str(bench.id): {'max_weight': 100},
+            f'custom_{custom.id}': {'max_weight': 40},
+        }
+        self.user.save(update_fields=['personal_records'])
+        self.squat = squat
+
+    def add_exercise(self, name):
+        with self.captureOnCommitCallbacks(execute=True):
+            ExerciseList.objects.create(name=name, primary_muscle='Calves')
+
+    async def get_both(self, user, path, params=None, headers=None):
+        """(synchronous, async) responses to the same GET"""
+        client, async_client = Client(), AsyncClient()
+        if user is not None:
+            await sync_to_async(client.force_login)(user)
+            await async_client.aforce_login(user)
+        with self.settings(ASYNC_VIEWS=False):
+            expected = await sync_to_async(client.get)(path, params, headers=headers)
+            # resolver_match is resolved lazily
+            self.assertFalse(expected.resolver_match.func.view_class.view_is_async)
+        response = await async_client.get(path, params, headers=headers)
+        self.assertTrue(response.resolver_match.func.view_class.view_is_async)
+
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.json(), expected.json())
+        return expected, response
+
+    async def test_exercise_list(self):
+        for params in (
+            None,
+            {'primary_muscle': 'Quadriceps'},
+            {'muscle': 'Glutes', 'exercise_type': 'Barbell Exercises'},
+            {'primary_muscle': ['Quadriceps', 'Quads']},
+        ):
+            with self.subTest(params=params):
+                expected, response = await self.get_both(self.user, '/api/exercises/', params)
+                self.assertEqual(response.get('ETag'), expected.get('ETag'))
+
+        _, response = await self.get_both(self.user, '/api/exercises/', {'exercise_type': 'Yoga'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('exercise_type', response.json())
+
+    async def test_exercise_list_etag(self):
+        _, response = await self.get_both(self.user, '/api/exercises/')
+        self.assertTrue(response['ETag'].startswith('"catalog-'))
+        expected, response = await self.get_both(
+            self.user, '/api/exercises/', headers={'If-None-Match': response['ETag']}
+        )
+        self.assertEqual(response['ETag'], expected['ETag'])
+
+        await sync_to_async(self.add_exercise)('Calf Raise')
+        _, changed = await self.get_both(self.user, '/api/exercises/')
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+
+    async def test_personal_records(self):
+        _, response = await self.get_both(self.user, '/api/personal-records/')
+        self.assertEqual(len(response.json()), 3)
+
+        _, response = await self.get_both(self.user, '/api/personal-records/', {'exercise': str(self.squat.id)})
+        self.assertEqual(list(response.json()), [str(self.squat.id)])
+        _, response = await self.get_both(self.user, '/api/personal-records/', {'exercise': '999999'})
+        self.assertEqual(response.json(), {})
+
+        for key in ('squat', 'custom_', '1;2'):
+            with self.subTest(exercise=key):
+                _, response = await self.get_both(self.user, '/api/personal-records/', {'exercise': key})
+                self.assertEqual(response.status_code, 400)
+
+    async def test_errors_raised_before_the_handler(self):
+        # Authentication runs in a thread; its exceptions still become responses
+        _, response = await self.get_both(None, '/api/personal-records/')
+        self.assertIn(response.status_code, (401, 403))
+
+        # Synchronous handlers (writes) run in a thread
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        response = await client.post('/api/exercises/', {'name': 'Hack Squat'}, content_type='application/json')
+        self.assertIn(response.status_code, (401, 403))
+
+
+@override_settings(REST_FRAMEWORK={
+    **settings.REST_FRAMEWORK,
+    'DEFAULT_THROTTLE_RATES': {'read': '3/min', 'expensive_read': '2/min', 'write': '2/min'},
+})
+class ThrottleTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user, self.client = self.login('throttle@example.com')
+        self.clock = mock.Mock(return_value=1000.0)
+        patcher = mock.patch.object(TokenBucketThrottle, 'timer', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write(self, client=None):
+        # Invalid, but it still takes a token
+        return (client or self.client).post('/api/templates/', {}, format='json')
+
+    def advance(self, seconds):
+        self.clock.return_value += seconds
+
+    def test_burst_then_429_with_retry_after(self):
+        self.assertEqual([self.write().status_code for _ in range(2)], [400, 400])
+        response = self.write()
+        self.assertEqual(response.status_code, 429)
+        # 2/min refills a token every 30 seconds
+        self.assertEqual(response['Retry-After'], '30')
+
+        _, other = self.login('other@example.com')
+        self.assertEqual(self.write(other).status_code, 400)
+
+    def test_refill(self):
+        for _ in range(2):
+            self.write()
+        self.advance(29)
+        self.assertEqual(self.write().status_code, 429)
+        self.assertEqual(self.write()['Retry-After'], '1')
+        self.advance(1)
+        self.assertEqual(self.write().status_code, 400)
+        self.assertEqual(self.write().status_code, 429)
+
+        # An idle bucket fills up to its capacity, no further
+        self.advance(600)
+        self.assertEqual([self.write().status_code for _ in range(3)], [400, 400, 429])
+
+    def test_read_and_write_budgets_are_separate(self):
+        for _ in range(2):
+            self.write()
+        self.assertEqual(self.write().status_code, 429)
+
+        # Reads of the same endpoint have their own bucket
+        self.assertEqual([self.client.get('/api/templates/').status_code for _ in range(4)], [200, 200, 200, 429])
+        # So does every endpoint
+        self.assertEqual(self.client.get('/api/sessions/').status_code, 200)
+        # The whole-history endpoints use the smaller expensive_read budget
+        self.assertEqual([self.client.get('/api/workouts/').status_code for _ in range(3)], [200, 200, 429])
+
+
+class TrainingAggregateTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.bench = ExerciseList.objects.create(
+            name='Bench Press', primary_muscle='Middle Chest', secondary_muscle='Front Delts',
+            tertiary_muscle='Long Head of Triceps', exercise_type='Barbell Exercises'
+        )
+        self.squat = ExerciseList.objects.create(
+            name='Squat', primary_muscle='Quadriceps', secondary_muscle='Glutes', exercise_type='Barbell Exercises'
+        )
+        self.user, self.client = self.login('calendar@example.com')
+
+    def calendar(self, year=2024):
+        response = self.client.get('/api/stats/calendar/', {'year': year})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def muscles(self, day):
+        response = self.client.get('/api/stats/muscles/', {'date': day})
+        self.assertEqual(response.status_code, 200)
+        return {muscle['muscle']: muscle for muscle in response.json()['muscles']}
+
+    def latest_workout_id(self):
+        return User.objects.get(pk=self.user.pk).workouts[-1]['id']
+
+    def test_calendar_totals_per_day(self):
+        self.log_workout(
+            self.client, [(self.bench, 5, 100), (self.bench, 5, 100)],
+            time_completed='2024-03-05T12:00:00Z', workout_duration='00:45:00'
+        )
+        self.log_workout(self.client, [(self.squat, 5, 140)], time_completed='2024-03-05T18:00:00Z')
+        self.log_workout(self.client, [(self.squat, 3, 150)], time_completed='2024-03-07T12:00:00Z')
+        self.log_workout(self.client, [(self.squat, 3, 150)], time_completed='2023-12-31T12:00:00Z')
+
+        data = self.calendar()
+        self.assertEqual(data['days'], [
+            {'date': '2024-03-05', 'sessions': 2, 'sets': 3, 'volume': 1700.0, 'duration_minutes': 45.0},
+            {'date': '2024-03-07', 'sessions': 1, 'sets': 1, 'volume': 450.0, 'duration_minutes': 0.0},
+        ])
+        self.assertEqual(
+            data['totals'], {'active_days': 2, 'sessions': 3, 'sets': 4, 'volume': 2150.0, 'duration_minutes': 45.0}
+        )
+        self.assertEqual([day['date'] for day in self.calendar(2023)['days']], ['2023-12-31'])
+        self.assertEqual(self.client.get('/api/stats/calendar/', {'year': 'last'}).status_code, 400)
+
+    def test_muscle_dashboard(self):
+        # Monday 2024-03-04 to Sunday 2024-03-10
+        self.log_workout(self.client, [(self.squat, 5, 140)], time_completed='2024-03-01T12:00:00Z')
+        self.log_workout(
+            self.client, [(self.bench, 5, 100), (self.bench, 5, 100)], time_completed='2024-03-05T12:00:00Z'
+        )
+        self.log_workout(self.client, [(self.squat, 5, 140)], time_completed='2024-03-07T12:00:00Z')
+
+        muscles = self.muscles('2024-03-07')
+        self.assertEqual(
+            {name: muscle['sets'] for name, muscle in muscles.items() if muscle['sets']},
+            {'Middle Chest': 2.0, 'Front Delts': 1.0, 'Long Head of Triceps': 0.5, 'Quadriceps': 1.0, 'Glutes': 0.5},
+        )
+        self.assertEqual(muscles['Middle Chest']['last_trained'], '2024-03-05')
+        self.assertEqual(muscles['Middle Chest']['days_since'], 2)
+        self.assertFalse(muscles['Middle Chest']['recovering'])
+        self.assertEqual(muscles['Quadriceps']['last_trained'], '2024-03-07')
+        self.assertTrue(muscles['Quadriceps']['recovering'])
+        self.assertIsNone(muscles['Lats']['last_trained'])
+
+        # Sets are the whole week's, recovery only looks back from the date
+        muscles = self.muscles('2024-03-04')
+        self.assertEqual(muscles['Quadriceps']['sets'], 1.0)
+        self.assertEqual(muscles['Quadriceps']['last_trained'], '2024-03-01')
+        self.assertEqual(muscles['Quadriceps']['days_since'], 3)
+        self.assertEqual(self.muscles('2024-03-11')['Quadriceps']['sets'], 0)
+        self.assertEqual(self.client.get('/api/stats/muscles/', {'date': '7 March'}).status_code, 400)
+
+    def test_moving_a_workout_to_another_day(self):
+        self.log_workout(
+            self.client, [(self.bench, 5, 100), (self.bench, 5, 100)],
+            time_completed='2024-03-05T12:00:00Z', workout_duration='00:45:00'
+        )
+        self.log_workout(self.client, [(self.squat, 5, 140)], time_completed='2024-03-05T18:00:00Z')
+        workout_id = self.latest_workout_id()
+
+        response = self.client.patch(
+            f'/api/workouts/{workout_id}/', {'time_completed': '2024-03-12T12:00:00Z'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(day['date'], day['sessions'], day['sets'], day['volume']) for day in self.calendar()['days']],
+            [('2024-03-05', 1, 2, 1000.0), ('2024-03-12', 1, 1, 700.0)],
+        )
+        muscles = self.muscles('2024-03-12')
+        self.assertEqual(muscles['Middle Chest']['sets'], 0)
+        self.assertEqual(muscles['Quadriceps']['sets'], 1.0)
+        self.assertEqual(muscles['Quadriceps']['last_trained'], '2024-03-12')
+        muscles = self.muscles('2024-03-05')
+        self.assertEqual(muscles['Middle Chest']['sets'], 2.0)
+        self.assertEqual(muscles['Quadriceps']['sets'], 0)
+
+        # Emptied days are removed
+        self.assertEqual(self.client.delete(f'/api/workouts/{workout_id}/').status_code, 204)
+        self.assertEqual([day['date'] for day in self.calendar()['days']], ['2024-03-05'])
+        self.assertEqual(self.muscles('2024-03-12')['Quadriceps']['sets'], 0)
+
+    def test_finished_session_is_dated_and_timed(self):
+        session_id = self.client.post('/api/sessions/', {'name': 'Push'}, format='json').json()['id']
+        self.client.post(
+            f'/api/sessions/{session_id}/sets/', {'exercise_id': self.bench.id, 'reps': 5, 'weight': 100},
+            format='json'
+        )
+        started_at = timezone.now() - timedelta(minutes=50)
+        self.user.workout_sessions.filter(pk=session_id).update(started_at=started_at)
+
+        before = timezone.now()
+        workout = self.client.post(f'/api/sessions/{session_id}/finish/').json()
+        completed = datetime.fromisoformat(workout['time_completed'])
+        self.assertLessEqual(before, completed)
+        self.assertLessEqual(completed, timezone.now())
+        self.assertAlmostEqual(
+            parse_duration(workout['workout_duration']).total_seconds(),
+            (completed - started_at).total_seconds(), places=3
+        )
+
+        today = timezone.localdate()
+        [day] = self.calendar(today.year)['days']
+        self.assertEqual(day['date'], today.isoformat())
+        self.assertAlmostEqual(day['duration_minutes'], 50, places=1)
+
+    def test_edit_uses_the_muscles_of_the_day_it_rebuilds(self):
+        self.log_workout(
+            self.client, [(self.bench, 5, 100), (self.bench, 5, 100)], time_completed='2024-03-05T12:00:00Z'
+        )
+        self.log_workout(self.client, [(self.squat, 5, 140)], time_completed='2024-03-05T18:00:00Z')
+        workout_id = User.objects.get(pk=self.user.pk).workouts[0]['id']
+
+        # Subtracting with the exercise's new muscles would leave -2 Upper Chest and 2 Middle Chest
+        self.bench.primary_muscle = 'Upper Chest'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bench.save()
+        response = self.client.patch(f'/api/workouts/{workout_id}/', {'name': 'Bench'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        muscles = self.muscles('2024-03-05')
+        self.assertEqual(
+            {name: muscle['sets'] for name, muscle in muscles.items() if muscle['sets']},
+            {'Upper Chest': 2.0, 'Front Delts': 1.0, 'Long Head of Triceps': 0.5, 'Quadriceps': 1.0, 'Glutes': 0.5},
+        )
+        self.assertEqual(self.calendar()['days'][0]['sets'], 3)
+
+    def test_deleted_custom_exercise_leaves_the_day(self):
+        exercise = self.client.post('/api/custom-exercises/', {
+            'name': 'Band Pull Apart', 'primary_muscle': 'Rear Delts', 'exercise_type': 'Resistance Band Training',
+        }, format='json').json()
+        response = self.client.post('/api/workouts/', {
+            'name': 'Shoulders', 'time_completed': '2024-03-05T12:00:00Z',
+            'exercises': [{'exercise_id': exercise['id'], 'is_custom': True, 'reps': 15, 'weight': 10}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.log_workout(self.client, [(self.squat, 5, 140)], time_completed='2024-03-05T18:00:00Z')
+        self.assertEqual(self.muscles('2024-03-05')['Rear Delts']['sets'], 1.0)
+
+        self.assertEqual(self.client.delete(f"/api/custom-exercises/{exercise['id']}/").status_code, 204)
+        workout_id = User.objects.get(pk=self.user.pk).workouts[0]['id']
+        self.assertEqual(self.client.delete(f'/api/workouts/{workout_id}/').status_code, 204)
+
+        muscles = self.muscles('2024-03-05')
+        self.assertEqual(muscles['Rear Delts']['sets'], 0)
+        self.assertEqual(muscles['Quadriceps']['sets'], 1.0)
+        self.assertEqual(
+            [(day['date'], day['sessions'], day['sets']) for day in self.calendar()['days']], [('2024-03-05', 1, 1)]
+        )
+
+
+def progress_session(top_weight, reps, e1rm, missed_reps=0, workout_id=1):
+    """ExerciseProgress session summary with every set at the top weight"""
+    return {
+        'workout_id': workout_id, 'timestamp': workout_id, 'top_weight': top_weight, 'reps': reps,
+        'best_reps': reps + missed_reps, 'sets': 3, 'missed_reps': missed_reps, 'e1rm': e1rm,
+    }
+
+
+class SuggestTests(SimpleTestCase):
+    def test_no_history(self):
+        self.assertIsNone(suggest([], 5))
+
+    def test_increase_weight(self):
+        suggestion = suggest([progress_session(100, 5, 116)], 5)
+        self.assertEqual(
+            (suggestion['weight'], suggestion['reps'], suggestion['reason']), (102.5, 5, 'increase_weight')
+        )
+        # At least one plate step on light weights
+        self.assertEqual(suggest([progress_session(10, 5, 12)], 5)['weight'], 10.5)
+        # The target defaults to the best reps of the last session
+        self.assertEqual(suggest([progress_session(100, 5, 116)])['reason'], 'increase_weight')
+
+    def test_missed_reps_do_not_increase(self):
+        suggestion = suggest([progress_session(100, 4, 116, missed_reps=1)], 5)
+        self.assertEqual((suggestion['weight'], suggestion['reps'], suggestion['reason']), (100, 5, 'add_reps'))
+
+    def test_add_reps(self):
+        sessions = [progress_session(95, 5, 110, workout_id=1), progress_session(100, 3, 110, workout_id=2)]
+        suggestion = suggest(sessions, 5)
+        self.assertEqual((suggestion['weight'], suggestion['reps'], suggestion['reason']), (100, 4, 'add_reps'))
+        self.assertEqual((suggestion['last_weight'], suggestion['last_reps']), (100, 3))
+
+    def test_deload_on_declining_e1rm(self):
+        sessions = [
+            progress_session(100, 4, 120, workout_id=1),
+            progress_session(97.5, 4, 118, workout_id=2),
+            progress_session(100, 3, 113, workout_id=3),
+        ]
+        suggestion = suggest(sessions, 5)
+        self.assertEqual((suggestion['weight'], suggestion['reps'], suggestion['reason']), (90, 5, 'deload'))
+        self.assertEqual(suggestion['e1rm_trend'], -3.5)
+
+    def test_deload_on_stall(self):
+        sessions = [progress_session(100, 4, 116, workout_id=1), progress_session(100, 4, 116, workout_id=2)]
+        suggestion = suggest(sessions, 5)
+        self.assertEqual((suggestion['weight'], suggestion['reps'], suggestion['reason']), (90, 5, 'deload'))
+        # Falling short at different weights is not a stall
+        sessions[0]['top_weight'] = 95
+        self.assertEqual(suggest(sessions, 5)['reason'], 'add_reps')
+
+
+class ProgressionTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.squat = ExerciseList.objects.create(
+            name='Squat', primary_muscle='Quadriceps', exercise_type='Barbell Exercises'
+        )
+        self.user, self.client = self.login('progress@example.com')
+
+    def session_weights(self):
+        return [session['top_weight'] for session in ExerciseProgress.objects.get(user=self.user).sessions]
+
+    def workout_ids(self):
+        return [workout['id'] for workout in User.objects.get(pk=self.user.pk).workouts]
+
+    def test_removing_a_session_from_a_full_window_rebuilds_it(self):
+        for day, weight in enumerate([100, 102.5, 105, 107.5, 110, 112.5], start=1):
+            self.log_workout(self.client, [(self.squat, 5, weight)], time_completed=f'2024-03-{day:02}T12:00:00Z')
+        self.assertEqual(self.session_weights(), [102.5, 105, 107.5, 110, 112.5])
+
+        ids = self.workout_ids()
+        self.assertEqual(self.client.delete(f'/api/workouts/{ids[-1]}/').status_code, 204)
+        # The oldest session moves back into the window
+        self.assertEqual(self.session_weights(), [100, 102.5, 105, 107.5, 110])
+
+        response = self.client.patch(
+            f'/api/workouts/{ids[2]}/', {'exercises': [{'exercise_id': self.squat.id, 'reps': 5, 'weight': 90}]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.session_weights(), [100, 102.5, 90, 107.5, 110])
+
+        # Moving a session out of the window's order keeps it sorted by completion
+        response = self.client.patch(
+            f'/api/workouts/{ids[0]}/', {'time_completed': '2024-03-20T12:00:00Z'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.session_weights(), [102.5, 90, 107.5, 110, 100])
+
+    def test_template_suggestion_from_the_top_set(self):
+        self.log_workout(
+            self.client, [(self.squat, 5, 100), (self.squat, 5, 100)], time_completed='2024-03-01T12:00:00Z'
+        )
+        template_id = self.client.post('/api/templates/', {
+            'name': 'Legs',
+            'exercises': [
+                {'exercise_id': self.squat.id, 'reps': 8, 'weight': 60},
+                {'exercise_id': self.squat.id, 'reps': 5, 'weight': 100},
+                {'exercise_id': self.squat.id, 'reps': 5, 'weight': 100},
+                {'exercise_id': self.squat.id, 'reps': 8, 'weight': 80},
+            ],
+        }, format='json').json()['id']
+
+        suggestions = self.client.get(f'/api/templates/{template_id}/').json()['suggestions']
+        # The warm-up and back-off sets are not judged against their own reps
+        self.assertEqual(
+            [(item['index'], item['weight'], item['reps'], item['reason']) for item in suggestions],
+            [(0, 61.5, 8, 'increase_weight'), (1, 102.5, 5, 'increase_weight'),
+             (2, 102.5, 5, 'increase_weight'), (3, 82.0, 8, 'increase_weight')],
+        )
+
+        response = self.client.post(
+            f'/api/templates/{template_id}/instantiate/', {'apply_suggestions': True}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            [(set_data['weight'], set_data['reps']) for set_data in response.json()['exercises']],
+            [(61.5, 8), (102.5, 5), (102.5, 5), (82.0, 8)],
+        )
+
+
+class LeaderboardTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.squat = ExerciseList.objects.create(
+            name='Squat', primary_muscle='Quadriceps', exercise_type='Barbell Exercises'
+        )
+        self.user, self.client = self.login('leader@example.com')
+
+    def join(self, client, name=''):
+        response = client.put('/api/leaderboards/membership/', {'name': name}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def board(self, **params):
+        response = self.client.get(f'/api/leaderboards/{self.squat.id}/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def entry(self, **params):
+        [entry] = self.board(**params)['results']
+        return entry['value'], datetime.fromisoformat(entry['achieved_at'])
+
+    def workout_ids(self):
+        return [workout['id'] for workout in User.objects.get(pk=self.user.pk).workouts]
+
+    def test_records_are_dated_by_the_workout_that_set_them(self):
+        for day, weight in ((1, 100), (5, 110), (8, 105)):
+            self.log_workout(self.client, [(self.squat, 5, weight)], time_completed=f'2024-03-{day:02}T12:00:00Z')
+        self.join(self.client)
+        value, achieved_at = self.entry()
+        self.assertEqual(achieved_at, datetime(2024, 3, 5, 12, tzinfo=dt_timezone.utc))
+
+        # Broken by a new workout
+        self.log_workout(self.client, [(self.squat, 5, 120)], time_completed='2024-03-10T12:00:00Z')
+        self.assertEqual(self.entry()[1], datetime(2024, 3, 10, 12, tzinfo=dt_timezone.utc))
+
+        # Deleting it brings back the previous record and its date
+        self.assertEqual(self.client.delete(f'/api/workouts/{self.workout_ids()[-1]}/').status_code, 204)
+        self.assertEqual(self.entry(), (value, datetime(2024, 3, 5, 12, tzinfo=dt_timezone.utc)))
+
+        # A tie completed later changes nothing, one completed earlier takes over
+        self.log_workout(self.client, [(self.squat, 5, 110)], time_completed='2024-03-12T12:00:00Z')
+        self.assertEqual(self.entry()[1], datetime(2024, 3, 5, 12, tzinfo=dt_timezone.utc))
+        self.log_workout(self.client, [(self.squat, 5, 110)], time_completed='2024-03-02T12:00:00Z')
+        self.assertEqual(self.entry(), (value, datetime(2024, 3, 2, 12, tzinfo=dt_timezone.utc)))
+
+        # Moving the record's workout later dates the record by the next one holding it
+        response = self.client.patch(
+            f'/api/workouts/{self.workout_ids()[-1]}/', {'time_completed': '2024-03-20T12:00:00Z'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.entry()[1], datetime(2024, 3, 5, 12, tzinfo=dt_timezone.utc))
+
+    def test_cursor_pages_through_equal_values(self):
+        clients = [self.client] + [self.login(f'athlete{number}@example.com')[1] for number in range(5)]
+        for number, client in enumerate(clients):
+            weight = 120 if number == 3 else 100
+            self.log_workout(client, [(self.squat, 5, weight)], time_completed='2024-03-05T12:00:00Z')
+            self.join(client, f'Athlete {number}')
+
+        results = []
+        cursor = None
+        for _ in range(3):
+            page = self.board(limit=2, **({'cursor': cursor} if cursor else {}))
+            self.assertEqual(len(page['results']), 2)
+            results += page['results']
+            cursor = page['next_cursor']
+        self.assertIsNone(cursor)
+
+        self.assertEqual([result['rank'] for result in results], [1, 2, 3, 4, 5, 6])
+        self.assertEqual(results[0]['name'], 'Athlete 3')
+        # Equal values and times are ordered by entry, each shown once
+        self.assertEqual(len({result['user_id'] for result in results}), 6)
+        self.assertEqual(len({result['value'] for result in results[1:]}), 1)
+        self.assertEqual(
+            self.client.get(f'/api/leaderboards/{self.squat.id}/', {'cursor': 'not-a-cursor'}).status_code, 400
+        )
+
+    def test_leaving_removes_entries(self):
+        self.log_workout(self.client, [(self.squat, 5, 100)], time_completed='2024-03-05T12:00:00Z')
+        self.join(self.client, 'Leader')
+        self.assertEqual(len(self.board()['results']), 1)
+
+        self.assertEqual(self.client.delete('/api/leaderboards/membership/').status_code, 204)
+        self.assertEqual(self.client.get('/api/leaderboards/membership/').json(), {'opted_in': False, 'name': 'Leader'})
+        self.assertFalse(LeaderboardEntry.objects.exists())
+        # Workouts logged while out are not ranked until joining again
+        self.log_workout(self.client, [(self.squat, 5, 120)], time_completed='2024-03-06T12:00:00Z')
+        self.assertEqual(self.board()['results'], [])
+        self.assertEqual(self.board(metric='weekly_volume', week='2024-03-06')['results'], [])
+
+        self.join(self.client)
+        self.assertEqual(self.entry(metric='weekly_volume', week='2024-03-06')[0], 1100)
+
+    def test_weekly_volume_follows_its_workouts(self):
+        self.join(self.client)
+        self.log_workout(self.client, [(self.squat, 5, 100)], time_completed='2024-03-05T12:00:00Z')
+        self.log_workout(self.client, [(self.squat, 5, 140)], time_completed='2024-03-07T12:00:00Z')
+        self.log_workout(self.client, [(self.squat, 5, 120)], time_completed='2024-03-12T12:00:00Z')
+
+        self.assertEqual(
+            self.entry(metric='weekly_volume', week='2024-03-10'),
+            (1200, datetime(2024, 3, 7, 12, tzinfo=dt_timezone.utc))
+        )
+        self.assertEqual(self.entry(metric='weekly_volume', week='2024-03-11')[0], 600)
+
+        # Moved to the next week, the workout's volume goes with it
+        workout_id = self.workout_ids()[1]
+        response = self.client.patch(
+            f'/api/workouts/{workout_id}/', {'time_completed': '2024-03-11T12:00:00Z'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.entry(metric='weekly_volume', week='2024-03-04'),
+            (500, datetime(2024, 3, 5, 12, tzinfo=dt_timezone.utc))
+        )
+        self.assertEqual(
+            self.entry(metric='weekly_volume', week='2024-03-17'),
+            (1300, datetime(2024, 3, 12, 12, tzinfo=dt_timezone.utc))
+        )
+
+        # An emptied week leaves the leaderboard
+        self.assertEqual(self.client.delete(f'/api/workouts/{self.workout_ids()[0]}/').status_code, 204)
+        self.assertEqual(self.board(metric='weekly_volume', week='2024-03-04')['results'], [])
+
+
+@skipUnless(orjson, 'orjson is not installed')
+class FastJSONTests(SimpleTestCase):
+    def assertRendersLikeDRF(self, data):
+        fast = FastJSONRenderer().render(data)
+        self.assertEqual(fast, JSONRenderer().render(data))
+        return fast
+
+    def parse(self, parser, body):
+        return parser.parse(BytesIO(body), 'application/json', {})
+
+    def test_renders_like_drf(self):
+        self.assertRendersLikeDRF({
+            'aware': datetime(2024, 3, 5, 12, 30, 15, 123456, tzinfo=dt_timezone.utc),
+            'offset': datetime(2024, 3, 5, 12, 30, tzinfo=dt_timezone(timedelta(hours=2))),
+            'naive': datetime(2024, 3, 5, 12, 30, 15, 500),
+            'date': date(2024, 3, 5),
+            'duration': timedelta(minutes=45),
+            'decimal': Decimal('102.50'),
+            'lazy': gettext_lazy('This field is required.'),
+            # Per-set error indexes
+            'errors': {0: ['Exercise not found'], 3: {'reps': ['Too many']}},
+            'text': 'Жим лёжа ',
+            'numbers': [0, -1, 2.5, 0.1, 2 ** 63 - 1, None, True],
+        })
+
+    def test_integers_beyond_64_bits(self):
+        fast = self.assertRendersLikeDRF({'reps': 2 ** 70, 'sets': [-(2 ** 64)]})
+        self.assertEqual(json.loads(fast), {'reps': 2 ** 70, 'sets': [-(2 ** 64)]})
+
+    def test_same_values_as_drf(self):
+        # Exponents are written differently (1e16 vs 1e+16) but read back the same
+        data = {'volume': 1e16, 'one_rm': 1.5e-7}
+        self.assertEqual(json.loads(FastJSONRenderer().render(data)), json.loads(JSONRenderer().render(data)))
+
+    def test_parses_like_drf(self):
+        for body in (
+            '{"name": "Жим лёжа", "exercises": [{"exercise_id": 1, "reps": 5, "weight": 102.5}]}'.encode(),
+            b'{"reps": 1180591620717411303424, "weight": 1e400}',
+            b'[1, 2.0, null, true, "\\u2028"]',
+        ):
+            with self.subTest(body=body):
+                self.assertEqual(self.parse(FastJSONParser(), body), self.parse(JSONParser(), body))
+        self.assertEqual(self.parse(FastJSONParser(), b'{"reps": 1180591620717411303424}'), {'reps': 2 ** 70})
+
+    def test_parse_errors_like_drf(self):
+        for body in (b'{"reps": NaN}', b'{"reps": 5,}', b'', b'\xff'):
+            with self.subTest(body=body):
+                with self.assertRaises(ParseError) as expected:
+                    self.parse(JSONParser(), body)
+                with self.assertRaises(ParseError) as fast:
+                    self.parse(FastJSONParser(), body)
+                self.assertEqual(str(fast.exception), str(expected.exception))
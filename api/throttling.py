@@ -0,0 +1,70 @@
+"""
+Token-bucket rate limiting for the API.
+
+Every user (or client IP when anonymous) has one bucket per endpoint and
+budget. A bucket holds up to N tokens for a rate of "N/period" and refills
+continuously at N per period; each request takes a token, so a client can
+burst N requests and then sustain the rate. Budgets (REST_FRAMEWORK
+DEFAULT_THROTTLE_RATES):
+
+- ``read``: safe requests
+- ``expensive_read``: safe requests to views with
+  ``read_throttle_scope = 'expensive_read'`` (whole training history)
+- ``write``: everything else
+
+A bucket is two numbers in the default cache, which the worker processes of
+a host share. Concurrent requests of one client may race on the same
+bucket and occasionally let a request too many through. That is accepted
+(see DEFAULT_THROTTLE_RATES in settings.py): the limits are for misbehaving
+clients, not billing.
+"""
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    cache_format = 'throttle:%(scope)s:%(endpoint)s:%(ident)s'
+
+    def __init__(self):
+        # The rate depends on the request, see allow_request
+        pass
+
+    def get_scope(self, request, view):
+        if request.method in SAFE_METHODS:
+            return getattr(view, 'read_throttle_scope', 'read')
+        return 'write'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {
+            'scope': self.scope,
+            'endpoint': view.__class__.__name__,
+            'ident': ident,
+        }
+
+    def allow_request(self, request, view):
+        self.scope = self.get_scope(request, view)
+        # Read per request so tests can override the rates
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+        if rate is None:
+            return True
+        self.capacity, self.duration = self.parse_rate(rate)
+        self.refill_rate = self.capacity / self.duration
+
+        self.key = self.get_cache_key(request, view)
+        self.now = self.timer()
+        tokens, updated_at = self.cache.get(self.key, (self.capacity, self.now))
+        self.tokens = min(self.capacity, tokens + (self.now - updated_at) * self.refill_rate)
+        if self.tokens < 1:
+            return False
+        # A bucket left alone for a whole period is full again, like a missing one
+        self.cache.set(self.key, (self.tokens - 1, self.now), self.duration)
+        return True
+
+    def wait(self):
+        """Seconds until the next token, sent as Retry-After"""
+        return (1 - self.tokens) / self.refill_rate
@@ -1,10 +1,21 @@
+from django.conf import settings
 from django.urls import path, include
 from .views import (
     RegisterView, LoginView, ExerciseListView, 
-    UserProfileView, WorkoutView, TemplateView, CustomExerciseView, CustomExerciseDetailView,
-    PersonalRecordsView
+    UserProfileView, WorkoutView, WorkoutDetailView, TemplateView, CustomExerciseView, CustomExerciseDetailView,
+    PersonalRecordsView, ExerciseTrendView, JobQueueMetricsView, TemplateInstantiateView,
+    ExerciseSearchView, SimilarExercisesView, WorkoutSessionView, SessionSetView, SessionFinishView,
+    CalendarView, MuscleDashboardView, LeaderboardView, LeaderboardMembershipView
 )
 
+from .async_views import EventStreamView
+
+# Async variants of the read-heavy endpoints for ASGI deployments
+if settings.ASYNC_VIEWS:
+    from .async_views import (
+        AsyncExerciseListView as ExerciseListView, AsyncPersonalRecordsView as PersonalRecordsView
+    )
+
 urlpatterns = [
     path('auth/login/', LoginView.as_view(), name='rest_login'),
     # logout using a post method at 
@@ -12,13 +23,28 @@ urlpatterns = [
     path('auth/', include('dj_rest_auth.urls')),  #Automatically does the token handling, session management, pass reset
     path('auth/registration/', RegisterView.as_view(), name='rest_register'),
     path('exercises/', ExerciseListView.as_view(), name='exercise-list'),
+    path('exercises/search/', ExerciseSearchView.as_view(), name='exercise-search'),
+    path('exercises/<str:exercise_key>/similar/', SimilarExercisesView.as_view(), name='exercise-similar'),
     path('profile/', UserProfileView.as_view(), name='user-profile'),
     path('workouts/', WorkoutView.as_view(), name='workouts'),
+    path('workouts/<int:workout_id>/', WorkoutDetailView.as_view(), name='workout-detail'),
+    path('sessions/', WorkoutSessionView.as_view(), name='sessions'),
+    path('sessions/<int:session_id>/', WorkoutSessionView.as_view(), name='session-detail'),
+    path('sessions/<int:session_id>/sets/', SessionSetView.as_view(), name='session-sets'),
+    path('sessions/<int:session_id>/finish/', SessionFinishView.as_view(), name='session-finish'),
     path('templates/', TemplateView.as_view(), name='templates'),
     path('templates/<int:template_id>/', TemplateView.as_view(), name='template-detail'),
+    path('templates/<int:template_id>/instantiate/', TemplateInstantiateView.as_view(), name='template-instantiate'),
     path('custom-exercises/', CustomExerciseView.as_view(), name='custom-exercises'),
     path('custom-exercises/<int:exercise_id>/', CustomExerciseDetailView.as_view(), name='custom-exercise-detail'),
     # as_view() is a method that converts the class into a view which means it can be accessed in the URL
     # which will return a response from the API
     path('personal-records/', PersonalRecordsView.as_view(), name='personal-records'),
+    path('stats/exercise/<str:exercise_key>/trend/', ExerciseTrendView.as_view(), name='exercise-trend'),
+    path('events/', EventStreamView.as_view(), name='events'),
+    path('stats/calendar/', CalendarView.as_view(), name='training-calendar'),
+    path('stats/muscles/', MuscleDashboardView.as_view(), name='muscle-dashboard'),
+    path('leaderboards/membership/', LeaderboardMembershipView.as_view(), name='leaderboard-membership'),
+    path('leaderboards/<int:exercise_id>/', LeaderboardView.as_view(), name='leaderboard'),
+    path('jobs/metrics/', JobQueueMetricsView.as_view(), name='job-metrics'),
 ] 
\ No newline at end of file
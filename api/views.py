@@ -1,24 +1,51 @@
+# Python imports
+import re
+from datetime import datetime, time, timedelta
+
 # Django imports
+from django.db import transaction
 from django.shortcuts import render
 from django.utils import timezone
-from django.http import Http404
+from django.utils.dateparse import parse_date, parse_datetime
 
 # Rest Framework imports
-from rest_framework import generics, status
-from rest_framework.permissions import IsAuthenticated, BasePermission
+from rest_framework import generics, serializers, status
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, BasePermission
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.generics import ListCreateAPIView
+from rest_framework.pagination import PageNumberPagination
 
 # Third party imports
 from dj_rest_auth.registration.views import RegisterView as BaseRegisterView
 from dj_rest_auth.views import LoginView as BaseLoginView
 
 # Local imports
-from .models import ExerciseList
+from .models import ExerciseList, Template, WorkoutSession, MUSCLE_CHOICES, EXERCISE_TYPE_CHOICES
+from .aggregates import calendar, muscle_dashboard
+from .catalog import get_catalog_version, muscle_index
+from .history import personal_records_for, workouts_in_range
+from .jobs import queue_metrics
+from .leaderboards import (
+    DEFAULT_LEADERBOARD_LIMIT, MAX_LEADERBOARD_LIMIT, METRICS, join_leaderboards, leaderboard,
+    leave_leaderboards
+)
+from .progression import template_suggestions
+from .search import DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT, search_exercises
+from .similarity import DEFAULT_SIMILAR_LIMIT, MAX_SIMILAR_LIMIT, similar_exercises
+from .workouts import (
+    delete_workout, find_workout, finish_session, log_session_set, record_workout,
+    resolve_exercise_types, stored_set, template_set, update_workout, workout_details
+)
 from .serializers import (
     LoginSerializer, UserSerializer, ExerciseListSerializer,
-    TemplateSerializer, WorkoutSerializer, CustomExerciseSerializer
+    TemplateSerializer, WorkoutSerializer, CustomExerciseSerializer,
+    TemplateInstantiateSerializer, WorkoutExerciseSerializer, WorkoutSessionSerializer,
+    LeaderboardMembershipSerializer, calculate_set_metrics, accumulate_set_totals
+)
+from .stats import (
+    DEFAULT_TREND_WINDOW, MAX_TREND_WINDOW, exercise_trend, get_exercise_series,
+    set_exercise_key
 )
 
 # Create your views here.
@@ -39,6 +66,8 @@ class RegisterView(BaseRegisterView):
 class LoginView(BaseLoginView):
     serializer_class = LoginSerializer
 
+MUSCLE_VALUES = {muscle for muscle, _ in MUSCLE_CHOICES}
+
 # Custom permission to check if user is admin
 class IsAdminOrReadOnly(BasePermission):
     def has_permission(self, request, view):
@@ -49,16 +78,109 @@ class IsAdminOrReadOnly(BasePermission):
         return request.user and request.user.is_authenticated and request.user.is_staff
 
 class ExerciseListView(generics.ListCreateAPIView):
+    """
+    Exercise catalog. Supports filtering with ?primary_muscle=, ?secondary_muscle=,
+    ?tertiary_muscle=, ?exercise_type= and ?muscle= (any muscle slot). Each can be
+    repeated to match any of several values.
+    """
     queryset = ExerciseList.objects.all()
     serializer_class = ExerciseListSerializer
     permission_classes = [IsAdminOrReadOnly]
+    FILTER_CHOICES = {
+        'primary_muscle': MUSCLE_VALUES,
+        'secondary_muscle': MUSCLE_VALUES,
+        'tertiary_muscle': MUSCLE_VALUES,
+        'exercise_type': set(EXERCISE_TYPE_CHOICES),
+        'muscle': MUSCLE_VALUES,
+    }
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        filters = {}
+        for field, choices in self.FILTER_CHOICES.items():
+            values = self.request.query_params.getlist(field)
+            invalid = [value for value in values if value not in choices]
+            if invalid:
+                raise serializers.ValidationError({field: [f'"{value}" is not a valid choice.' for value in invalid]})
+            if values:
+                filters[field] = values
+
+        muscles = filters.pop('muscle', None)
+        for field, values in filters.items():
+            queryset = queryset.filter(**{f'{field}__in': values})
+        if muscles:
+            # Precomputed muscle -> exercise ids instead of OR-ing the three columns
+            any_slot = muscle_index.get()['any']
+            queryset = queryset.filter(id__in={
+                exercise_id for muscle in muscles for exercise_id in any_slot.get(muscle, ())
+            })
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        response['ETag'] = self.catalog_etag()
+        return response
+
+    def catalog_etag(self):
+        # Changes with the catalog, so CompressionMiddleware can reuse compressed bodies
+        return f'"catalog-{get_catalog_version()}"'
 
     def perform_create(self, serializer):
         # Add any additional logic before saving
         serializer.save()
 
+# Name search across the exercise catalog and the user's custom exercises
+class ExerciseSearchView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """Prefix, word and typo-tolerant matches for ?q=, best first"""
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"error": "q is required"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.query_params.get('limit', DEFAULT_SEARCH_LIMIT))
+        except ValueError:
+            return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, MAX_SEARCH_LIMIT))
+
+        return Response({
+            'query': query,
+            'results': search_exercises(request.user, query, limit),
+        })
+
+# Replacement suggestions for an exercise ("12" or "custom_3"), scored on
+# shared muscles and exercise type
+class SimilarExercisesView(APIView):
+    permission_classes = [IsAuthenticated]
+    EXERCISE_KEY_PATTERN = re.compile(r'^(custom_)?\d+$')
+
+    def get(self, request, exercise_key):
+        """
+        Top ?k= similar exercises. ?type=different only suggests other exercise
+        types (e.g. a dumbbell replacement for a barbell exercise), ?type=same
+        only the same type.
+        """
+        if not self.EXERCISE_KEY_PATTERN.match(exercise_key):
+            return Response({"error": "Exercise not found"}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            limit = int(request.query_params.get('k', DEFAULT_SIMILAR_LIMIT))
+        except ValueError:
+            return Response({"error": "k must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, MAX_SIMILAR_LIMIT))
+        type_filter = request.query_params.get('type')
+        if type_filter not in (None, 'same', 'different'):
+            return Response({"error": "type must be 'same' or 'different'"}, status=status.HTTP_400_BAD_REQUEST)
+
+        similar = similar_exercises(request.user, exercise_key, limit, type_filter)
+        if similar is None:
+            return Response({"error": "Exercise not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(similar)
+
 class UserProfileView(APIView):
     permission_classes = [IsAuthenticated]
+    # Serializes the whole history
+    read_throttle_scope = 'expensive_read'
     # request.user only returns the user object if the user is authenticated
     # Django does not allow unauthenticated users to access a specific user's profile
     def get(self, request):
@@ -104,12 +226,14 @@ class TemplateView(APIView):
     def get(self, request, template_id=None):
         """Get all templates or a specific template for the user"""
         if template_id is not None:
-            templates = request.user.templates or []
-            template = next((t for t in templates if t["id"] == template_id), None)
+            template = request.user.templates.filter(pk=template_id).first()
             if template is None:
                 return Response({"error": "Template not found"}, status=status.HTTP_404_NOT_FOUND)
-            return Response(template)
-        return Response(request.user.templates or [])
+            return Response({
+                **template.to_dict(),
+                'suggestions': template_suggestions(request.user, template.exercises),
+            })
+        return Response([template.to_dict() for template in request.user.templates.all()])
 
     def post(self, request, template_id=None):
         """Create a new template"""
@@ -119,180 +243,308 @@ class TemplateView(APIView):
                 status=status.HTTP_405_METHOD_NOT_ALLOWED
             )
             
-        serializer = TemplateSerializer(data=request.data)
+        serializer = TemplateSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
-            template_data = {
-                'id': len(request.user.templates or []) + 1,
-                'name': serializer.validated_data['name'],
-                'description': serializer.validated_data.get('description', ''),
-                'created_at': timezone.now().isoformat(),
-                'exercises': [{
-                    'exercise_id': exercise['exercise'].id if not exercise.get('is_custom') 
-                                else exercise['exercise']['id'],
-                    'name': exercise['exercise'].name if not exercise.get('is_custom')
-                            else exercise['exercise']['name'],
-                    'is_custom': exercise.get('is_custom', False),
-                    'set_number': exercise['set_number'],
-                    'reps': exercise.get('reps'),
-                    'weight': exercise.get('weight'),
-                    'duration_minutes': exercise.get('duration_minutes'),
-                    'distance_meters': exercise.get('distance_meters')
-                } for exercise in serializer.validated_data['exercises']]
-            }
-            
-            if request.user.templates is None:
-                request.user.templates = []
-            request.user.templates.append(template_data)
-            request.user.save()
-            return Response(template_data, status=status.HTTP_201_CREATED)
+            template = Template.objects.create(
+                user=request.user,
+                name=serializer.validated_data['name'],
+                description=serializer.validated_data.get('description', ''),
+                exercises=[template_set(exercise) for exercise in serializer.validated_data['exercises']]
+            )
+            return Response(template.to_dict(), status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def put(self, request, template_id):
         """Update a template"""
-        templates = request.user.templates or []
-        template_index = next((index for (index, d) in enumerate(templates) 
-                             if d["id"] == template_id), None)
-        
-        if template_index is None:
+        template = request.user.templates.filter(pk=template_id).first()
+        if template is None:
             return Response({"error": "Template not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        serializer = TemplateSerializer(data=request.data)
+        serializer = TemplateSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
-            template_data = {
-                'id': template_id,
-                'name': serializer.validated_data['name'],
-                'description': serializer.validated_data.get('description', ''),
-                'updated_at': timezone.now().isoformat(),
-                'exercises': [{
-                    'exercise_id': exercise['exercise'].id,
-                    'name': exercise['exercise'].name,
-                    'set_number': exercise['set_number'],
-                    'reps': exercise.get('reps'),
-                    'weight': exercise.get('weight'),
-                    'duration_minutes': exercise.get('duration_minutes'),
-                    'distance_meters': exercise.get('distance_meters')
-                } for exercise in serializer.validated_data['exercises']]
-            }
-            
-            templates[template_index] = template_data
-            request.user.templates = templates
-            request.user.save()
-            return Response(template_data)
+            template.name = serializer.validated_data['name']
+            template.description = serializer.validated_data.get('description', '')
+            template.exercises = [template_set(exercise) for exercise in serializer.validated_data['exercises']]
+            template.updated_at = timezone.now()
+            template.save()
+            return Response(template.to_dict())
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def delete(self, request, template_id):
         """Delete a template"""
-        templates = request.user.templates or []
-        template_index = next((index for (index, d) in enumerate(templates) 
-                             if d["id"] == template_id), None)
-        
-        if template_index is None:
+        deleted, _ = request.user.templates.filter(pk=template_id).delete()
+        if not deleted:
             return Response({"error": "Template not found"}, status=status.HTTP_404_NOT_FOUND)
-
-        templates.pop(template_index)
-        request.user.templates = templates
-        request.user.save()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+# Start a workout straight from a stored template
+# The template's sets were validated when it was saved, so only the exercise
+# types are looked up (one query) to recompute volume and 1RM
+class TemplateInstantiateView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, template_id):
+        """Log a workout from a template, optionally with the suggested loads and per-set overrides"""
+        template = request.user.templates.filter(pk=template_id).first()
+        if template is None:
+            return Response({"error": "Template not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        serializer = TemplateInstantiateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        template_sets = template.exercises
+        overrides = serializer.validated_data.get('overrides', {})
+        out_of_range = sorted(index for index in overrides if index >= len(template_sets))
+        if out_of_range:
+            return Response(
+                {"overrides": [f"Set {index} does not exist in this template" for index in out_of_range]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        suggested = {}
+        if serializer.validated_data.get('apply_suggestions'):
+            suggested = {
+                suggestion['index']: {'weight': suggestion['weight'], 'reps': suggestion['reps']}
+                for suggestion in template_suggestions(request.user, template_sets)
+            }
+
+        exercise_types = resolve_exercise_types(request.user, template_sets)
+        sets = []
+        errors = {}
+        for index, template_set in enumerate(template_sets):
+            set_data = {
+                'exercise_id': template_set['exercise_id'],
+                'name': template_set['name'],
+                'is_custom': template_set.get('is_custom', False),
+                'set_number': template_set.get('set_number'),
+                'reps': template_set.get('reps'),
+                'weight': template_set.get('weight'),
+                'duration_minutes': template_set.get('duration_minutes'),
+                'distance_meters': template_set.get('distance_meters'),
+                **suggested.get(index, {}),
+                **overrides.get(index, {}),
+            }
+            exercise_type = exercise_types.get(set_exercise_key(set_data))
+            if exercise_type is None:
+                errors[index] = ["Exercise not found"]
+                continue
+            try:
+                calculate_set_metrics(exercise_type, set_data)
+            except serializers.ValidationError as exc:
+                errors[index] = exc.detail
+                continue
+            sets.append(set_data)
+
+        if errors:
+            return Response({"exercises": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        workout_data = record_workout(
+            request.user,
+            name=serializer.validated_data.get('name', template.name),
+            description=serializer.validated_data.get('description', template.description),
+            sets=accumulate_set_totals(sets),
+            template_id=template_id
+        )
+        return Response(workout_data, status=status.HTTP_201_CREATED)
+
+class WorkoutPagination(PageNumberPagination):
+    """Pages only when ?page= or ?page_size= is given; the list is a plain array otherwise"""
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not {self.page_query_param, self.page_size_query_param} & set(request.query_params):
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
 # This view is used to create and list workouts for the user
 class WorkoutView(ListCreateAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = WorkoutSerializer
+    pagination_class = WorkoutPagination
+    read_throttle_scope = 'expensive_read'
 
     def get_queryset(self):
-        return self.request.user.workouts or []
+        """
+        All of the user's workouts including archived ones, or those completed
+        between ?start= and ?end= (dates or ISO 8601 datetimes; a date-only end
+        includes that whole day), reading only the archive months of the range
+        """
+        start = self.parse_bound('start')
+        end = self.parse_bound('end', end_of_day=True)
+        if start is None and end is None:
+            return self.request.user.workout_history()
+        return workouts_in_range(self.request.user, start, end)
+
+    def parse_bound(self, name, end_of_day=False):
+        value = self.request.query_params.get(name)
+        if not value:
+            return None
+        try:
+            parsed = parse_datetime(value)
+            day = None if parsed else parse_date(value)
+        except ValueError:
+            parsed = day = None
+        if day is not None:
+            parsed = datetime.combine(day + timedelta(days=1) if end_of_day else day, time.min)
+        if parsed is None:
+            raise serializers.ValidationError({name: ['Enter a valid date or ISO 8601 datetime.']})
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
 
     def perform_create(self, serializer):
-        workout_data = {
-            'id': len(self.request.user.workouts or []) + 1,
-            'name': serializer.validated_data['name'],
-            'description': serializer.validated_data.get('description', ''),
-            'created_at': timezone.now().isoformat(),
-            'exercises': [{
-                'exercise_id': (exercise['exercise'].id 
-                              if not exercise.get('is_custom') 
-                              else exercise['exercise']['id']),
-                'name': (exercise['exercise'].name 
-                        if not exercise.get('is_custom')
-                        else exercise['exercise']['name']),
-                'is_custom': exercise.get('is_custom', False),
-                'set_number': exercise['set_number'],
-                'reps': exercise.get('reps'),
-                'weight': exercise.get('weight'),
-                'duration_minutes': exercise.get('duration_minutes'),
-                'distance_meters': exercise.get('distance_meters'),
-                'volume': exercise.get('volume', 0),
-                'one_rm': exercise.get('one_rm', 0),
-                'total_volume': exercise.get('total_volume', 0),
-                'total_duration': exercise.get('total_duration', 0)
-            } for exercise in serializer.validated_data['exercises']]
-        }
-        
-        if self.request.user.workouts is None:
-            self.request.user.workouts = []
-
-        # PERSONAL RECORDS
-        # Update PERSONAL RECORDS for each exercise
-        for exercise in serializer.validated_data['exercises']:
-            # Get the correct exercise ID based on whether it's custom or not
-            exercise_id = (exercise['exercise'].id 
-                         if not exercise.get('is_custom') 
-                         else exercise['exercise']['id'])
-            
-            # Create a unique key for the PR that includes whether it's custom
-            pr_key = f"{'custom_' if exercise.get('is_custom') else ''}{exercise_id}"
-            
-            # Get exercise name based on type
-            exercise_name = (exercise['exercise'].name 
-                           if not exercise.get('is_custom')
-                           else exercise['exercise']['name'])
-            
-            self.request.user.update_personal_records(
-                pr_key,
-                {
-                    'exercise_id': exercise_id,
-                    'is_custom': exercise.get('is_custom', False),
-                    'name': exercise_name,
-                    'volume': exercise.get('volume', 0),
-                    'one_rm': exercise.get('one_rm', 0),
-                    'total_volume': exercise.get('total_volume', 0),
-                    'total_duration': exercise.get('total_duration', 0),
-                    'reps': exercise.get('reps', 0),
-                    'weight': exercise.get('weight', 0),
-                    'duration_minutes': exercise.get('duration_minutes', 0)
-                }
+        # Represented like the list, with the id and creation time of the stored workout
+        serializer.instance = record_workout(
+            self.request.user,
+            name=serializer.validated_data['name'],
+            description=serializer.validated_data.get('description', ''),
+            sets=[stored_set(exercise) for exercise in serializer.validated_data['exercises']],
+            **workout_details(serializer.validated_data)
+        )
+
+# Edit or delete one logged workout, archived or not
+class WorkoutDetailView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, workout_id):
+        workout, _ = find_workout(request.user, workout_id)
+        if workout is None:
+            return Response({"error": "Workout not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(WorkoutSerializer(workout).data)
+
+    def put(self, request, workout_id):
+        """Replace a workout's name, description and sets"""
+        return self.update(request, workout_id, partial=False)
+
+    def patch(self, request, workout_id):
+        """Change only the given fields of a workout"""
+        return self.update(request, workout_id, partial=True)
+
+    def update(self, request, workout_id, partial):
+        serializer = WorkoutSerializer(data=request.data, partial=partial, context={'request': request})
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        changes = {}
+        if 'name' in serializer.validated_data:
+            changes['name'] = serializer.validated_data['name']
+        if not partial or 'description' in serializer.validated_data:
+            changes['description'] = serializer.validated_data.get('description', '')
+        if 'exercises' in serializer.validated_data:
+            changes['exercises'] = [stored_set(exercise) for exercise in serializer.validated_data['exercises']]
+        if not partial:
+            changes.update(dict.fromkeys(['time_completed', 'workout_duration', 'workout_notes']))
+        changes.update(workout_details(serializer.validated_data))
+
+        workout_data = update_workout(request.user, workout_id, changes)
+        if workout_data is None:
+            return Response({"error": "Workout not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(WorkoutSerializer(workout_data).data)
+
+    def delete(self, request, workout_id):
+        """Delete a workout and the records it set"""
+        if not delete_workout(request.user, workout_id):
+            return Response({"error": "Workout not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+# Live workout sessions: sets are logged one at a time while training, each
+# stored as its own row, and the session is recorded as a workout at the end
+class WorkoutSessionView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, session_id=None):
+        """Get all open sessions or a specific session for the user"""
+        sessions = request.user.workout_sessions.prefetch_related('sets')
+        if session_id is not None:
+            session = sessions.filter(pk=session_id).first()
+            if session is None:
+                return Response({"error": "Session not found"}, status=status.HTTP_404_NOT_FOUND)
+            return Response(session.to_dict())
+        return Response([session.to_dict() for session in sessions])
+
+    def post(self, request, session_id=None):
+        """Start a new session"""
+        if session_id is not None:
+            return Response(
+                {"error": "POST not allowed on individual session"},
+                status=status.HTTP_405_METHOD_NOT_ALLOWED
             )
-        
-        self.request.user.workouts.append(workout_data)
-        self.request.user.save()
-        return workout_data
+
+        serializer = WorkoutSessionSerializer(data=request.data)
+        if serializer.is_valid():
+            session = WorkoutSession.objects.create(
+                user=request.user,
+                name=serializer.validated_data['name'],
+                description=serializer.validated_data.get('description', '')
+            )
+            return Response(session.to_dict(), status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    def delete(self, request, session_id):
+        """Discard a session without recording it"""
+        deleted, _ = request.user.workout_sessions.filter(pk=session_id).delete()
+        if not deleted:
+            return Response({"error": "Session not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class SessionSetView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, session_id):
+        """Log one set, validated and numbered like a set of a posted workout"""
+        serializer = WorkoutExerciseSerializer(data=request.data, context={'request': request})
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        # Lock the session so concurrent sets get consecutive positions
+        with transaction.atomic():
+            session = request.user.workout_sessions.select_for_update().filter(pk=session_id).first()
+            if session is None:
+                return Response({"error": "Session not found"}, status=status.HTTP_404_NOT_FOUND)
+            session_set = log_session_set(session, serializer.validated_data)
+        return Response(
+            {'position': session_set.position, **session_set.to_dict()},
+            status=status.HTTP_201_CREATED
+        )
+
+class SessionFinishView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, session_id):
+        """Record the session as a workout, updating personal records, and close it"""
+        session = request.user.workout_sessions.filter(pk=session_id).only('set_count').first()
+        if session is None:
+            return Response({"error": "Session not found"}, status=status.HTTP_404_NOT_FOUND)
+        if not session.set_count:
+            return Response({"error": "Log at least one set first"}, status=status.HTTP_400_BAD_REQUEST)
+
+        workout_data = finish_session(request.user, session_id)
+        if workout_data is None:
+            return Response({"error": "Session not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(workout_data, status=status.HTTP_201_CREATED)
 
 class CustomExerciseView(generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = CustomExerciseSerializer
 
     def get_queryset(self):
-        return self.request.user.custom_exercises or []
+        return self.request.user.custom_exercises.all()
 
     def perform_create(self, serializer):
-        exercise_data = {
-            'id': len(self.request.user.custom_exercises or []) + 1,
-            **serializer.validated_data,
-            'created_at': timezone.now().isoformat(),
-            'updated_at': timezone.now().isoformat()
-        }
-        
-        if self.request.user.custom_exercises is None:
-            self.request.user.custom_exercises = []
-        
-        self.request.user.custom_exercises.append(exercise_data)
-        self.request.user.save()
-        return exercise_data
+        serializer.save(user=self.request.user)
 
 class CustomExerciseDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = CustomExerciseSerializer
-    lookup_field = 'exercise_id'
+    lookup_field = 'pk'
+    lookup_url_kwarg = 'exercise_id'
+
+    def get_queryset(self):
+        return self.request.user.custom_exercises.all()
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -300,81 +552,211 @@ class CustomExerciseDetailView(generics.RetrieveUpdateDestroyAPIView):
             context['exercise_id'] = int(self.kwargs['exercise_id'])
         return context
 
-    def get_object(self):
-        exercise_id = int(self.kwargs['exercise_id'])
-        exercises = self.request.user.custom_exercises or []
-        exercise = next((ex for ex in exercises if ex['id'] == exercise_id), None)
-        if exercise is None:
-            raise Http404("Exercise not found")
-        return exercise
-
-    def perform_update(self, serializer):
-        exercise_id = int(self.kwargs['exercise_id'])
-        exercises = self.request.user.custom_exercises or []
-        exercise_index = next((index for (index, ex) in enumerate(exercises) 
-                             if ex['id'] == exercise_id), None)
-        
-        if exercise_index is None:
-            raise Http404("Exercise not found")
-
-        # Keep the existing created_at and id, update the rest
-        exercises[exercise_index].update({
-            **serializer.validated_data,
-            'updated_at': timezone.now().isoformat()
-        })
-        
-        self.request.user.custom_exercises = exercises
-        self.request.user.save()
-
-    def perform_destroy(self, instance):
-        exercise_id = int(self.kwargs['exercise_id'])
-        exercises = self.request.user.custom_exercises or []
-        exercise_index = next((index for (index, ex) in enumerate(exercises) 
-                             if ex['id'] == exercise_id), None)
-        
-        if exercise_index is None:
-            raise Http404("Exercise not found")
-
-        exercises.pop(exercise_index)
-        self.request.user.custom_exercises = exercises
-        self.request.user.save()
-
 # View for handling personal records endpoints
 # This function is accessible in URLs.py API
 class PersonalRecordsView(APIView):
     permission_classes = [IsAuthenticated]
+    EXERCISE_KEY_PATTERN = re.compile(r'^(custom_)?\d+$')
     
     def get(self, request):
+        """All personal records, or only one exercise's with ?exercise=12 / custom_3"""
+        exercise_key = request.query_params.get('exercise')
+        if exercise_key is not None and not self.EXERCISE_KEY_PATTERN.match(exercise_key):
+            return Response({"error": "Invalid exercise key"}, status=status.HTTP_400_BAD_REQUEST)
+        personal_records = self.load_personal_records(request.user, exercise_key)
+
+        # Get the regular and custom exercises that have a PR
+        exercises = ExerciseList.objects.filter(id__in=self.catalog_ids(personal_records))
+        custom_exercises = request.user.custom_exercises.filter(id__in=self.custom_ids(personal_records))
+        return Response(self.build_records(personal_records, exercises, custom_exercises))
+
+    def load_personal_records(self, user, exercise_key=None):
+        if exercise_key is None:
+            return user.personal_records
+        # Only that key is extracted from the JSON column
+        return personal_records_for(user, [exercise_key])
+
+    def catalog_ids(self, personal_records):
+        return [int(key) for key in personal_records if key.isdigit()]
+
+    def custom_ids(self, personal_records):
+        return [int(key[len('custom_'):]) for key in personal_records if key.startswith('custom_')]
+
+    def build_records(self, personal_records, exercises, custom_exercises):
         # Initialize records dictionary
         records = {}
-        
-        # Get all regular exercises
-        exercises = ExerciseList.objects.all()
-        
+
         # Process regular exercises
         for exercise in exercises:
             str_exercise_id = str(exercise.id)
-            # Check if there's a PR for this regular exercise
-            if str_exercise_id in request.user.personal_records:
-                records[str_exercise_id] = {
-                    'exercise_name': exercise.name,
-                    'exercise_type': exercise.exercise_type,
-                    'is_custom': False,
-                    **request.user.personal_records[str_exercise_id]
-                }
+            records[str_exercise_id] = {
+                'exercise_name': exercise.name,
+                'exercise_type': exercise.exercise_type,
+                'is_custom': False,
+                **personal_records[str_exercise_id]
+            }
 
         # Process custom exercises
-        custom_exercises = request.user.custom_exercises or []
         for custom_exercise in custom_exercises:
             # Create the same key format used when saving PRs
-            custom_key = f"custom_{custom_exercise['id']}"
-            # Check if there's a PR for this custom exercise
-            if custom_key in request.user.personal_records:
-                records[custom_key] = {
-                    'exercise_name': custom_exercise['name'],
-                    'exercise_type': custom_exercise['exercise_type'],
-                    'is_custom': True,
-                    **request.user.personal_records[custom_key]
-                }
-        
-        return Response(records)
+            custom_key = f"custom_{custom_exercise.id}"
+            records[custom_key] = {
+                'exercise_name': custom_exercise.name,
+                'exercise_type': custom_exercise.exercise_type,
+                'is_custom': True,
+                **personal_records[custom_key]
+            }
+
+        return records
+
+
+# Trend lines (estimated 1RM and volume) for a single exercise
+# The exercise key uses the same format as personal records, e.g. "12" or "custom_3"
+class ExerciseTrendView(APIView):
+    permission_classes = [IsAuthenticated]
+    EXERCISE_KEY_PATTERN = re.compile(r'^(custom_)?\d+$')
+
+    def get(self, request, exercise_key):
+        """
+        Per-session estimated 1RM and volume with trailing moving averages.
+        Timestamps are unix seconds; every list has one entry per session.
+        """
+        if not self.EXERCISE_KEY_PATTERN.match(exercise_key):
+            return Response({"error": "Invalid exercise key"}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            window = int(request.query_params.get('window', DEFAULT_TREND_WINDOW))
+        except ValueError:
+            return Response({"error": "window must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= window <= MAX_TREND_WINDOW:
+            return Response(
+                {"error": f"window must be between 1 and {MAX_TREND_WINDOW}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        series = get_exercise_series(request.user, exercise_key)
+        return Response({
+            'exercise_key': exercise_key,
+            'window': window,
+            **exercise_trend(series, window),
+        })
+
+
+# Training calendar (heatmap) of one year, from the daily aggregates
+class CalendarView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """Sessions, sets, volume and duration per training day of ?year= (default this year)"""
+        try:
+            year = int(request.query_params.get('year', timezone.now().year))
+        except ValueError:
+            return Response({"error": "year must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= year <= 9999:
+            return Response({"error": "year must be between 1 and 9999"}, status=status.HTTP_400_BAD_REQUEST)
+
+        days = calendar(request.user, year)
+        return Response({
+            'year': year,
+            'days': days,
+            'totals': {
+                'active_days': len(days),
+                **{
+                    field: sum(day[field] for day in days)
+                    for field in ('sessions', 'sets', 'volume', 'duration_minutes')
+                },
+            },
+        })
+
+
+# Weekly sets per muscle and recovery, from the daily aggregates
+class MuscleDashboardView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """Weighted sets per muscle this week and when each was last trained, as of ?date= (default today)"""
+        value = request.query_params.get('date')
+        if value:
+            try:
+                today = parse_date(value)
+            except ValueError:
+                today = None
+            if today is None:
+                return Response({"error": "date must be YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            today = timezone.localdate()
+        return Response(muscle_dashboard(request.user, today))
+
+
+# Ranking of opted-in users on a catalog exercise, one page at a time
+class LeaderboardView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, exercise_id):
+        """
+        Entries for ?metric= (one_rm, volume or weekly_volume), best first.
+        ?week= is any day of the week for weekly_volume (default this week),
+        ?cursor= the next_cursor of the previous page.
+        """
+        metric = request.query_params.get('metric', 'one_rm')
+        if metric not in METRICS:
+            return Response(
+                {"error": f"metric must be one of {', '.join(METRICS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = int(request.query_params.get('limit', DEFAULT_LEADERBOARD_LIMIT))
+        except ValueError:
+            return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, MAX_LEADERBOARD_LIMIT))
+
+        value = request.query_params.get('week')
+        if value:
+            try:
+                week = parse_date(value)
+            except ValueError:
+                week = None
+            if week is None:
+                return Response({"error": "week must be YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            week = timezone.localdate()
+
+        if not ExerciseList.objects.filter(pk=exercise_id).exists():
+            return Response({"error": "Exercise not found"}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            page = leaderboard(exercise_id, metric, week, limit, request.query_params.get('cursor'))
+        except ValueError:
+            return Response({"error": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(page)
+
+
+# Opting in to and out of the leaderboards
+class LeaderboardMembershipView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response(self.membership(request.user))
+
+    def put(self, request):
+        """Join the leaderboards with the current records and history"""
+        serializer = LeaderboardMembershipSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        join_leaderboards(request.user, serializer.validated_data.get('name', ''))
+        return Response(self.membership(request.user))
+
+    def delete(self, request):
+        """Leave the leaderboards and remove all entries"""
+        leave_leaderboards(request.user)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def membership(self, user):
+        return {'opted_in': user.leaderboard_opt_in, 'name': user.leaderboard_name}
+
+
+# Queue depth, lag and failures of the background job queue
+class JobQueueMetricsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(queue_metrics())
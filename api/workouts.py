@@ -0,0 +1,355 @@
+"""
+Writing workouts to a user's history.
+
+Every path that logs a workout (the workouts endpoint, starting from a
+template, finishing a live session) goes through ``record_workout``, and
+edits go through ``update_workout`` / ``delete_workout``, so personal
+records, caches and background processing stay consistent.
+
+These may run inside a caller's transaction (``finish_session``), so their
+side effects outside the database (stream events, jobs, cache invalidation)
+are all deferred with on_commit and never happen for a rolled back write.
+"""
+from functools import partial
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.duration import duration_iso_string
+
+from .aggregates import apply_workout_change
+from .events import publish
+from .jobs import enqueue
+from .leaderboards import update_leaderboards
+from .models import ExerciseList, SessionSet, User
+from .progression import update_progress
+from .stats import exercise_key, invalidate_exercise_series, set_exercise_key
+
+
+def next_workout_id(user):
+    """
+    Workout ids count up per user and are never reused, also after the
+    newest workout was deleted
+    """
+    newest = max((workout['id'] for workout in user.workouts), default=0)
+    return max(newest, user.last_workout_id) + 1
+
+
+def record_workout(user, name, sets, description='', **extra):
+    """
+    Append a workout to the user's history and update personal records.
+
+    ``sets`` are already validated sets in storage format (exercise_id, name,
+    is_custom, set_number, reps, weight, ..., total_volume, total_duration).
+    Extra keyword arguments are stored on the workout as is.
+    """
+    if user.workouts is None:
+        user.workouts = []
+
+    user.last_workout_id = next_workout_id(user)
+    workout_data = {
+        'id': user.last_workout_id,
+        'name': name,
+        'description': description,
+        'created_at': timezone.now().isoformat(),
+        **extra,
+        'exercises': sets,
+    }
+
+    # PERSONAL RECORDS
+    # Keyed by exercise id, prefixed with "custom_" for custom exercises
+    exercise_keys = sorted({set_exercise_key(set_data) for set_data in sets})
+    previous_records = {key: dict((user.personal_records or {}).get(key, {})) for key in exercise_keys}
+    for set_data in sets:
+        user.update_personal_records(set_exercise_key(set_data), set_data)
+
+    with transaction.atomic():
+        user.workouts.append(workout_data)
+        user.save()
+        apply_workout_change(user, new=workout_data)
+        update_progress(user, new=workout_data)
+        update_leaderboards(user, new=workout_data)
+
+    publish(user.pk, 'workout_finished', {'workout': workout_data})
+    for key in exercise_keys:
+        records = user.personal_records[key]
+        broken = {
+            record: value for record, value in records.items()
+            if value > previous_records[key].get(record, 0)
+        }
+        if broken:
+            publish(user.pk, 'pr_broken', {
+                'workout_id': workout_data['id'],
+                'exercise_key': key,
+                'records': broken,
+                'previous': {record: previous_records[key].get(record, 0) for record in broken},
+            })
+
+    # Cached trend series of the exercises in this workout are stale once it
+    # commits; dropped earlier, a concurrent read could cache the old series again
+    transaction.on_commit(partial(invalidate_exercise_series, user.pk, exercise_keys))
+
+    # Everything else derived from the workout is done by the job worker
+    enqueue('process_workout', {
+        'user_id': user.pk,
+        'workout_id': workout_data['id'],
+        'exercise_keys': exercise_keys,
+    })
+    return workout_data
+
+
+def workout_details(data):
+    """
+    Completion time, duration and notes from WorkoutSerializer data, in
+    storage format (ISO 8601 strings), for the fields that were given
+    """
+    details = {}
+    if data.get('time_completed') is not None:
+        details['time_completed'] = data['time_completed'].isoformat()
+    if data.get('workout_duration') is not None:
+        details['workout_duration'] = duration_iso_string(data['workout_duration'])
+    if 'workout_notes' in data:
+        details['workout_notes'] = data['workout_notes']
+    return details
+
+
+def template_set(exercise):
+    """Storage format of a validated set from TemplateExerciseSerializer"""
+    return {
+        'exercise_id': exercise['exercise'].id,
+        'name': exercise['exercise'].name,
+        'is_custom': exercise.get('is_custom', False),
+        'set_number': exercise['set_number'],
+        'reps': exercise.get('reps'),
+        'weight': exercise.get('weight'),
+        'duration_minutes': exercise.get('duration_minutes'),
+        'distance_meters': exercise.get('distance_meters')
+    }
+
+
+def stored_set(exercise):
+    """Storage format of a validated set from WorkoutExerciseSerializer"""
+    return {
+        **template_set(exercise),
+        'volume': exercise.get('volume', 0),
+        'one_rm': exercise.get('one_rm', 0),
+        'total_volume': exercise.get('total_volume', 0),
+        'total_duration': exercise.get('total_duration', 0)
+    }
+
+
+def resolve_exercise_types(user, sets):
+    """
+    Exercise type of every exercise referenced by ``sets``, keyed like personal
+    records. Catalog exercises are fetched with a single query; exercises that
+    no longer exist are missing from the result.
+    """
+    catalog_ids = {s['exercise_id'] for s in sets if not s.get('is_custom')}
+    types = {
+        exercise_key(exercise_id): exercise_type
+        for exercise_id, exercise_type in ExerciseList.objects.filter(
+            id__in=catalog_ids
+        ).values_list('id', 'exercise_type')
+    }
+    custom_ids = {s['exercise_id'] for s in sets if s.get('is_custom')}
+    if custom_ids:
+        types.update(
+            (exercise_key(exercise_id, True), exercise_type)
+            for exercise_id, exercise_type in user.custom_exercises.filter(
+                id__in=custom_ids
+            ).values_list('id', 'exercise_type')
+        )
+    return types
+
+
+def log_session_set(session, exercise):
+    """
+    Append a validated set from WorkoutExerciseSerializer to a live session.
+
+    The set number and running totals continue from the previous set of the
+    same exercise in the session (one indexed lookup), so logging a set costs
+    the same however many sets came before it. The caller holds a lock on the
+    session row; the set_logged event is sent when its transaction commits.
+    """
+    exercise_id = exercise['exercise'].id
+    is_custom = exercise.get('is_custom', False)
+    previous = session.sets.filter(
+        is_custom=is_custom, exercise_id=exercise_id
+    ).order_by('-position').first()
+
+    volume = exercise.get('volume')
+    duration = exercise.get('duration_minutes')
+    session_set = SessionSet.objects.create(
+        session=session,
+        position=session.set_count + 1,
+        exercise_id=exercise_id,
+        is_custom=is_custom,
+        name=exercise['exercise'].name,
+        set_number=previous.set_number + 1 if previous else 1,
+        reps=exercise.get('reps'),
+        weight=exercise.get('weight'),
+        duration_minutes=duration,
+        distance_meters=exercise.get('distance_meters'),
+        volume=volume or 0,
+        one_rm=exercise.get('one_rm', 0),
+        total_volume=(previous.total_volume if previous else 0) + (volume or 0),
+        total_duration=(previous.total_duration if previous else 0) + (duration or 0),
+    )
+
+    session.set_count = session_set.position
+    session.updated_at = timezone.now()
+    session.save(update_fields=['set_count', 'updated_at'])
+
+    publish(session.user_id, 'set_logged', {
+        'session_id': session.pk,
+        'session_name': session.name,
+        'position': session_set.position,
+        'set': session_set.to_dict(),
+    })
+    return session_set
+
+
+def finish_session(user, session_id):
+    """
+    Record a live session as a workout completed now, lasting from the
+    session's start, and delete it. Returns the workout, or None when the
+    session does not exist (or was finished already).
+    Events, the processing job and cache invalidation of ``record_workout``
+    wait for the commit, so a failed finish leaves no trace outside the
+    database.
+    """
+    with transaction.atomic():
+        session = user.workout_sessions.select_for_update().filter(pk=session_id).first()
+        if session is None:
+            return None
+        sets = [session_set.to_dict() for session_set in session.sets.all()]
+        now = timezone.now()
+        workout_data = record_workout(
+            user, session.name, sets, session.description,
+            time_completed=now.isoformat(),
+            workout_duration=duration_iso_string(now - session.started_at),
+        )
+        session.delete()
+    return workout_data
+
+
+def personal_records_from(sets):
+    """Personal records of the exercises in ``sets``, computed from them alone"""
+    scratch = User(personal_records={})
+    for set_data in sets:
+        scratch.update_personal_records(set_exercise_key(set_data), set_data)
+    return scratch.personal_records
+
+
+def find_workout(user, workout_id):
+    """
+    (workout, archive) for one of the user's workouts; archive is None for a
+    workout still in the user row and (None, None) when there is no such workout
+    """
+    for workout in user.workouts or []:
+        if workout['id'] == workout_id:
+            return workout, None
+    for archive in user.workout_archives.all():
+        for workout in archive.workouts:
+            if workout['id'] == workout_id:
+                return workout, archive
+    return None, None
+
+
+def update_workout(user, workout_id, changes):
+    """
+    Apply ``changes`` (name, description, exercises as stored sets, details)
+    to a workout; a None value removes the field. Returns the updated
+    workout, or None if it does not exist.
+    """
+    workout, archive = find_workout(user, workout_id)
+    if workout is None:
+        return None
+    updated = {
+        field: value for field, value in {**workout, **changes}.items() if value is not None
+    }
+    updated['updated_at'] = timezone.now().isoformat()
+    replace_workout(user, workout, updated, archive)
+    return updated
+
+
+def delete_workout(user, workout_id):
+    """Remove a workout from the history. Returns False if it does not exist."""
+    workout, archive = find_workout(user, workout_id)
+    if workout is None:
+        return False
+    replace_workout(user, workout, None, archive)
+    return True
+
+
+def replace_workout(user, workout, updated, archive=None):
+    """
+    Swap ``workout`` for ``updated`` (None deletes it) in the user row or in
+    its archive row, then bring the derived data of the exercises involved up
+    to date.
+
+    Personal records are maintained incrementally: an exercise is rebuilt
+    from its sets in the history only when the old version of the workout
+    holds one of its current records. Otherwise the records cannot have gone
+    down and the new sets are merged like a newly logged workout.
+    """
+    old_sets = workout.get('exercises', [])
+    new_sets = updated.get('exercises', []) if updated else []
+    old_records = personal_records_from(old_sets)
+    current_records = user.personal_records or {}
+    stale = {
+        key for key, records in old_records.items()
+        if not any(current_records.get(key, {}).values()) or any(
+            value and value >= current_records.get(key, {}).get(record, 0)
+            for record, value in records.items()
+        )
+    }
+
+    with transaction.atomic():
+        if archive is None:
+            user.workouts = [
+                updated if item['id'] == workout['id'] else item
+                for item in user.workouts
+                if updated or item['id'] != workout['id']
+            ]
+        else:
+            archive.workouts = [
+                updated if item['id'] == workout['id'] else item
+                for item in archive.workouts
+                if updated or item['id'] != workout['id']
+            ]
+            archive.workout_count = len(archive.workouts)
+            if archive.workouts:
+                archive.save()
+            else:
+                archive.delete()
+
+        if user.personal_records is None:
+            user.personal_records = {}
+        if stale:
+            rebuilt = personal_records_from(
+                set_data
+                for item in user.workout_history()
+                for set_data in item.get('exercises', [])
+                if set_exercise_key(set_data) in stale
+            )
+            for key in stale:
+                user.personal_records.pop(key, None)
+            user.personal_records.update(rebuilt)
+        for set_data in new_sets:
+            key = set_exercise_key(set_data)
+            if key not in stale:
+                user.update_personal_records(key, set_data)
+
+        update_fields = ['personal_records'] if archive is not None else ['workouts', 'personal_records']
+        user.save(update_fields=update_fields)
+        apply_workout_change(user, old=workout, new=updated)
+        update_progress(user, old=workout, new=updated)
+        update_leaderboards(user, old=workout, new=updated)
+
+    exercise_keys = sorted({set_exercise_key(set_data) for set_data in old_sets + new_sets})
+    transaction.on_commit(partial(invalidate_exercise_series, user.pk, exercise_keys))
+    enqueue('process_workout', {
+        'user_id': user.pk,
+        'workout_id': workout['id'],
+        'exercise_keys': exercise_keys,
+    })
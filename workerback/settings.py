@@ -79,6 +79,9 @@ ACCOUNT_SESSION_REMEMBER = True
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "api.middleware.CompressionMiddleware",
+    # Before anything that queries the database
+    "api.middleware.ReplicaPinningMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -108,18 +111,114 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "workerback.wsgi.application"
 
+# Serve the read-heavy endpoints with async views (api/async_views.py). Only
+# useful under ASGI (e.g. uvicorn workerback.asgi:application); under WSGI
+# every async request needs its own event loop.
+# Benchmark: python manage.py bench_concurrency
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "False") == "True"
+
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-# TODO: Hook up to an online database instead of SQLite
-DATABASES = {
+# SQLite by default for development. Set DB_ENGINE=postgresql (and DB_NAME,
+# DB_USER, DB_PASSWORD, DB_HOST, DB_PORT) to run on PostgreSQL; this needs
+# the psycopg package.
+DB_ENGINE = os.getenv("DB_ENGINE", "sqlite3")
+
+if DB_ENGINE == "postgresql":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.getenv("DB_NAME", "workerback"),
+            "USER": os.getenv("DB_USER", "postgres"),
+            "PASSWORD": os.getenv("DB_PASSWORD", ""),
+            "HOST": os.getenv("DB_HOST", "localhost"),
+            "PORT": os.getenv("DB_PORT", "5432"),
+            "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", "600")),
+            "CONN_HEALTH_CHECKS": True,
+        }
+    }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.getenv("DB_NAME", BASE_DIR / "db.sqlite3"),
+        }
+    }
+
+# Production SQLite profile, enabled with DB_PROFILE=production.
+# WAL lets readers run alongside the single writer, IMMEDIATE transactions take
+# the write lock up front (instead of failing with "database is locked" when a
+# read transaction tries to upgrade), and writers wait up to `timeout` seconds
+# for the lock. Connections are kept open between requests.
+# Benchmark: python manage.py bench_sqlite_writes
+SQLITE_PRODUCTION_OPTIONS = {
+    "timeout": 20,
+    "transaction_mode": "IMMEDIATE",
+    "init_command": (
+        "PRAGMA journal_mode=WAL;"
+        "PRAGMA synchronous=NORMAL;"
+        "PRAGMA mmap_size=134217728;"
+        "PRAGMA cache_size=-20000;"
+        "PRAGMA temp_store=MEMORY;"
+    ),
+}
+
+if DB_ENGINE == "sqlite3" and os.getenv("DB_PROFILE") == "production":
+    DATABASES["default"].update({
+        "OPTIONS": SQLITE_PRODUCTION_OPTIONS,
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", "600")),
+        "CONN_HEALTH_CHECKS": True,
+    })
+
+# Read replicas, as a comma separated list of hosts (PostgreSQL) or database
+# files (SQLite) holding copies of the primary. Safe (GET/HEAD/OPTIONS)
+# requests read from a replica; writes, everything outside requests, and the
+# requests of a client or authenticated user for DB_REPLICA_PIN_SECONDS after
+# it wrote use the primary (cookie per client, cache entry per user).
+DB_REPLICAS = [replica.strip() for replica in os.getenv("DB_REPLICAS", "").split(",") if replica.strip()]
+DB_REPLICA_PIN_SECONDS = int(os.getenv("DB_REPLICA_PIN_SECONDS", "10"))
+
+for number, replica in enumerate(DB_REPLICAS, start=1):
+    DATABASES[f"replica_{number}"] = {
+        **DATABASES["default"],
+        ("HOST" if DB_ENGINE == "postgresql" else "NAME"): replica,
+        # Tests read replicas through the primary's connection
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["api.routers.PrimaryReplicaRouter"] if DB_REPLICAS else []
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+# File based by default so cached data and invalidations are shared between
+# web workers and the job worker on the same host
+CACHES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", str(BASE_DIR / ".cache")),
+        "OPTIONS": {
+            "MAX_ENTRIES": 10000,
+        },
     }
 }
 
+# Response compression of API JSON and event streams (see api/middleware.py).
+# zstd and brotli are used when the zstandard / brotli packages are
+# installed, gzip otherwise.
+COMPRESSION = {
+    "MIN_SIZE": int(os.getenv("COMPRESSION_MIN_SIZE", "1024")),
+    "LEVELS": {"zstd": 3, "br": 4, "gzip": 6},
+    # Compressed bodies of responses with an ETag
+    "CACHE_TIMEOUT": 60 * 60,
+    # Responses with credentials (tokens, session cookies) are sent as is:
+    # compressed, their length can leak the secret to a BREACH attacker
+    "EXCLUDE_PATHS": ["/api/auth/"],
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -175,6 +274,30 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.TokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
+    # orjson backed JSON, see api/renderers.py (python manage.py bench_json)
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    # Token buckets per user, endpoint and budget, see api/throttling.py
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.TokenBucketThrottle',
+    ],
+    # Buckets are read and written back without a lock, so concurrent requests
+    # of one client can occasionally get a request or two past these rates.
+    # Accepted: they stop misbehaving clients, they are not quotas, and
+    # cache.add/incr would not close the race with the file cache, whose incr
+    # is a read and a write as well.
+    'DEFAULT_THROTTLE_RATES': {
+        'read': '300/min',
+        'expensive_read': '20/min',
+        'write': '60/min',
+    },
 }
 
 # dj-rest-auth settings
@@ -196,3 +319,31 @@ SIMPLE_JWT = {
 
 # Custom user model
 AUTH_USER_MODEL = 'api.User'
+
+# Workouts completed more than AFTER_DAYS ago are moved to the archive table
+# by `python manage.py archive_workouts` (see api/archive.py)
+WORKOUT_ARCHIVE = {
+    'AFTER_DAYS': int(os.getenv('WORKOUT_ARCHIVE_AFTER_DAYS', '180')),
+    'BATCH_SIZE': 100,
+}
+
+# Server-sent event streams (see api/events.py). The fanout is in process: a
+# stream only receives events published by the process serving it. Run the
+# ASGI server with a single worker process (or route /api/events/ and every
+# write endpoint to the same one); with several, streams miss the events of
+# writes handled elsewhere. Coaches are assigned in the Django admin
+# (User.coaches); there is no API to manage them.
+EVENT_STREAM = {
+    'QUEUE_SIZE': 100,
+    'KEEPALIVE_SECONDS': 15,
+}
+
+# Background job queue (see api/jobs.py)
+JOB_QUEUE = {
+    'ALWAYS_EAGER': os.getenv('JOB_QUEUE_ALWAYS_EAGER', 'False') == 'True',
+    'MAX_ATTEMPTS': 5,
+    'LOCK_TIMEOUT': 300,
+    'QUEUE_CONCURRENCY': {
+        'default': 4,
+    },
+}